@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Complaint, Suggestion, Review, ContactMessage, AchievementBlog
+from .models import Complaint, Suggestion, Review, ContactMessage, AchievementBlog, NotificationOutbox, EmailCampaign, \
+    BillingRun, RevenueRollup, ExportJob
 
 
 @admin.register(Complaint)
@@ -80,3 +81,45 @@ class ContactMessageAdmin(admin.ModelAdmin):
 class AchievementBlogAdmin(admin.ModelAdmin):
     list_display = ['id', 'title', 'description', 'images', 'posted_by', 'created_at']
     search_fields = ['title']
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'channel', 'template', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['channel', 'status', 'template']
+    search_fields = ['recipient']
+    readonly_fields = ['created_at', 'sent_at', 'claimed_at', 'claim_token']
+    ordering = ['-created_at']
+
+
+@admin.register(EmailCampaign)
+class EmailCampaignAdmin(admin.ModelAdmin):
+    list_display = ['id', 'subject', 'target_group', 'status', 'created_by', 'created_at', 'completed_at']
+    list_filter = ['status', 'target_group']
+    search_fields = ['subject']
+    readonly_fields = ['created_at', 'completed_at']
+    ordering = ['-created_at']
+
+
+@admin.register(BillingRun)
+class BillingRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'month', 'status', 'hostel_created', 'library_created', 'chunks', 'attempts',
+                    'duration_seconds', 'started_at', 'finished_at']
+    list_filter = ['status', 'month']
+    readonly_fields = ['started_at', 'finished_at']
+    ordering = ['-started_at']
+
+
+@admin.register(RevenueRollup)
+class RevenueRollupAdmin(admin.ModelAdmin):
+    list_display = ['vertical', 'month', 'paid_total', 'pending_total', 'paid_count', 'pending_count', 'refreshed_at']
+    list_filter = ['vertical']
+    ordering = ['-month', 'vertical']
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'dataset', 'output', 'status', 'row_count', 'created_by', 'created_at', 'expires_at']
+    list_filter = ['status', 'dataset', 'output']
+    readonly_fields = ['created_at', 'finished_at']
+    ordering = ['-created_at']
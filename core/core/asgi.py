@@ -10,14 +10,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
+from core.middleware import JWTAuthMiddlewareStack
+from core.routing import websocket_urlpatterns as admin_websocket_urlpatterns
 from hostel.routing import websocket_urlpatterns
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
-        URLRouter(websocket_urlpatterns)
+    "websocket": JWTAuthMiddlewareStack(
+        URLRouter(websocket_urlpatterns + admin_websocket_urlpatterns)
     ),
 })
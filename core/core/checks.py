@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# Backends whose data only the current process sees
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register(Tags.caches)
+def shared_cache_check(app_configs, **kwargs):
+    """
+    Seat-map sequence numbers and replay, live-map snapshots and report versions
+    are coordinated through the default cache, across web, Daphne and Celery
+    processes. A per-process cache silently splits them.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.TESTING or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    level = Warning if settings.DEBUG else Error
+    return [level(
+        f"The default cache ({backend}) is local to one process.",
+        hint="Set CACHE_BACKEND/CACHE_LOCATION to a shared cache such as Redis.",
+        id='core.E001' if level is Error else 'core.W001',
+    )]
@@ -1,14 +1,29 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 import json
+from core.middleware import accepted_subprotocol
+from core.services import metrics
+
+# Staff-only group: pending-seat alerts and export job progress
+ADMIN_GROUP_NAME = "admin_seat_map"
+
 
 # Rename class to match admin-seat-map use-case
 class AdminSeatMapConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        await self.channel_layer.group_add("admin_seat_map", self.channel_name)
-        await self.accept()
+        user = self.scope.get("user")
+        if not (user and user.is_authenticated and user.is_staff):
+            await self.close()
+            return
+        await self.channel_layer.group_add(ADMIN_GROUP_NAME, self.channel_name)
+        await self.accept(subprotocol=accepted_subprotocol(self.scope))
+        self.joined = True
+        metrics.WEBSOCKET_CONNECTIONS.inc(group=ADMIN_GROUP_NAME)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard("admin_seat_map", self.channel_name)
+        if not getattr(self, "joined", False):
+            return
+        metrics.WEBSOCKET_CONNECTIONS.dec(group=ADMIN_GROUP_NAME)
+        await self.channel_layer.group_discard(ADMIN_GROUP_NAME, self.channel_name)
 
     async def send_pending_seat(self, event):
         await self.send(text_data=json.dumps({
@@ -17,3 +32,5 @@ class AdminSeatMapConsumer(AsyncWebsocketConsumer):
             "seat_id": event["seat_id"]
         }))
 
+    async def send_admin_update(self, event):
+        await self.send(text_data=json.dumps(event["data"]))
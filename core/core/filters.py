@@ -0,0 +1,24 @@
+from rest_framework import filters
+
+from core.services import search_service
+
+
+class StudentSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter for querysets that reach a student through a relation. The
+    `search` term is matched against the student's indexed search_document
+    (see core.services.search_service) instead of OR-ing icontains over the
+    view's search_fields, and results come back best match first. The path to
+    the student is taken from the first search field, e.g.
+    'booking__student__username' -> 'booking__student__'.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        term = ' '.join(self.get_search_terms(request))
+        search_fields = self.get_search_fields(view, request)
+        if not term or not search_fields:
+            return queryset
+
+        path = search_fields[0].rsplit('__', 1)[0] + '__' if '__' in search_fields[0] else ''
+        ordering = queryset.query.order_by or queryset.model._meta.ordering or ['pk']
+        return search_service.search(queryset, term, prefix=path).order_by('-search_rank', *ordering)
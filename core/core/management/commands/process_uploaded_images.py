@@ -0,0 +1,26 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from core.services.image_pipeline import IMAGE_FIELDS, process
+
+
+class Command(BaseCommand):
+    help = 'Strip metadata from stored image uploads and write their WebP/JPEG derivatives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(IMAGE_FIELDS), help='Only process this model')
+
+    def handle(self, *args, **options):
+        labels = [options['model']] if options['model'] else list(IMAGE_FIELDS)
+
+        processed = 0
+        for label in labels:
+            model = apps.get_model(label)
+            for field in IMAGE_FIELDS[label]:
+                pks = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}) \
+                    .values_list('pk', flat=True)
+                for pk in pks.iterator():
+                    if process(label, pk, field):
+                        processed += 1
+            self.stdout.write(f"{label} done.")
+
+        self.stdout.write(self.style.SUCCESS(f"{processed} uploads processed; already processed ones skipped. ✅"))
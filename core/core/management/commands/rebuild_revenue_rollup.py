@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.services.revenue_rollup import VERTICALS, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the monthly revenue rollup from the hostel/library invoice tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vertical', choices=sorted(VERTICALS), help='Only rebuild this vertical')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        result = rebuild([options['vertical']] if options['vertical'] else None)
+        duration_ms = round((time.monotonic() - started) * 1000, 2)
+
+        months = ", ".join(f"{vertical}: {count}" for vertical, count in result.items())
+        self.stdout.write(self.style.SUCCESS(f"Revenue rollup rebuilt ({months} months) in {duration_ms}ms. ✅"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from core.services.occupancy_counters import VERTICALS, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the hostel/library occupancy counters and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vertical', choices=sorted(VERTICALS), help='Only reconcile this vertical')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drift without rewriting the counters')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        verticals = [options['vertical']] if options['vertical'] else None
+        result = reconcile(verticals, dry_run=dry_run)
+
+        drifted = 0
+        for vertical, drift in result.items():
+            for key, (stored, actual) in drift.items():
+                self.stdout.write(f"{vertical}.{key}: stored {stored}, actual {actual}")
+            drifted += len(drift)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Occupancy counters match the booking tables. ✅"))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING(f"Dry run: {drifted} counters drifted, nothing changed."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{drifted} drifted counters corrected."))
@@ -0,0 +1,58 @@
+"""
+WebSocket authentication with SimpleJWT access tokens.
+
+The API authenticates with JWT only, so browser sockets carry no session.
+JWTAuthMiddleware reads an access token from `?token=<jwt>` or from the
+`Sec-WebSocket-Protocol` header sent as ["bearer", "<jwt>"] and sets
+scope["user"]; without a valid token the user AuthMiddlewareStack found (a
+session user or AnonymousUser) is left alone. Consumers that let clients use
+the subprotocol form accept with accepted_subprotocol(scope).
+"""
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+BEARER_SUBPROTOCOL = 'bearer'
+
+
+def _raw_token(scope):
+    subprotocols = scope.get('subprotocols') or []
+    if len(subprotocols) >= 2 and subprotocols[0] == BEARER_SUBPROTOCOL:
+        return subprotocols[1]
+    tokens = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    return tokens[0] if tokens else None
+
+
+def accepted_subprotocol(scope):
+    """The subprotocol to echo in accept(), so browsers keep a socket opened with ["bearer", token]."""
+    return BEARER_SUBPROTOCOL if BEARER_SUBPROTOCOL in (scope.get('subprotocols') or []) else None
+
+
+@database_sync_to_async
+def _user_for(raw_token):
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+class JWTAuthMiddleware:
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        raw_token = _raw_token(scope)
+        if raw_token:
+            user = await _user_for(raw_token)
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await self.inner(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    """Session auth (Django admin) with a JWT access token taking precedence."""
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_emailcampaign'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=10)),
+                ('hostel_last_id', models.PositiveBigIntegerField(default=0)),
+                ('library_last_id', models.PositiveBigIntegerField(default=0)),
+                ('hostel_scanned', models.PositiveIntegerField(default=0)),
+                ('library_scanned', models.PositiveIntegerField(default=0)),
+                ('hostel_created', models.PositiveIntegerField(default=0)),
+                ('library_created', models.PositiveIntegerField(default=0)),
+                ('chunks', models.PositiveIntegerField(default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('duration_seconds', models.FloatField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_billingrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vertical', models.CharField(max_length=10)),
+                ('key', models.CharField(max_length=32)),
+                ('value', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('vertical', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:11
+
+from django.db import migrations, models
+from django.db.models import Count, DateField, Q, Sum
+from django.db.models.functions import Trunc
+
+
+def build_rollup(apps, schema_editor):
+    RevenueRollup = apps.get_model('core', 'RevenueRollup')
+    for vertical, invoice_model in (('hostel', apps.get_model('hostel', 'HostelMonthlyInvoice')),
+                                    ('library', apps.get_model('library', 'LibraryMonthlyInvoice'))):
+        rows = (invoice_model.objects.annotate(period=Trunc('generated_on', 'month', output_field=DateField()))
+                .values('period').order_by('period').annotate(
+                    paid_total=Sum('total', filter=Q(is_paid=True)),
+                    pending_total=Sum('total', filter=Q(is_paid=False)),
+                    paid_count=Count('id', filter=Q(is_paid=True)),
+                    pending_count=Count('id', filter=Q(is_paid=False)),
+                ))
+        RevenueRollup.objects.bulk_create(
+            RevenueRollup(vertical=vertical, month=row['period'], paid_total=row['paid_total'] or 0,
+                          pending_total=row['pending_total'] or 0, paid_count=row['paid_count'],
+                          pending_count=row['pending_count'])
+            for row in rows
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_occupancycounter'),
+        ('hostel', '0022_invoice_generated_on_index'),
+        ('library', '0023_invoice_generated_on_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vertical', models.CharField(max_length=10)),
+                ('month', models.DateField()),
+                ('paid_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('pending_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_count', models.PositiveIntegerField(default=0)),
+                ('pending_count', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['vertical', 'month'],
+                'unique_together': {('vertical', 'month')},
+            },
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
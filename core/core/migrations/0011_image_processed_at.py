@@ -0,0 +1,23 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='achievementblog',
+            name='images_processed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='complaint',
+            name='screenshot_processed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
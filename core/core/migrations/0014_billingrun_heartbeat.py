@@ -0,0 +1,36 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+def fail_duplicate_running_runs(apps, schema_editor):
+    """Keep only the newest running run per month, so the unique constraint can be added."""
+    BillingRun = apps.get_model('core', 'BillingRun')
+    newest = {}
+    for run in BillingRun.objects.filter(status='running').order_by('-id'):
+        if run.month in newest:
+            run.status = 'failed'
+            run.error = f"Superseded by billing run {newest[run.month]}."
+            run.save(update_fields=['status', 'error'])
+        else:
+            newest[run.month] = run.id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_emailcampaignrecipient_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingrun',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fail_duplicate_running_runs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='billingrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'running')), fields=('month',), name='one_running_billing_run_per_month'),
+        ),
+    ]
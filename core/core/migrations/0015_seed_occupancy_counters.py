@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# Frozen copy of core.services.occupancy_counters.compute(); later changes to it do not alter this migration
+TREND_DAYS = 7
+VERTICALS = {
+    'hostel': ('hostel', 'HostelBooking', 'HostelBed', 'bed_id'),
+    'library': ('library', 'LibraryBooking', 'LibrarySeat', 'seat_id'),
+}
+
+
+def seed_counters(apps, schema_editor):
+    OccupancyCounter = apps.get_model('core', 'OccupancyCounter')
+    today = timezone.localdate()
+    for vertical, (app_label, booking_name, resource_name, resource_field) in VERTICALS.items():
+        booking_model = apps.get_model(app_label, booking_name)
+        resource_model = apps.get_model(app_label, resource_name)
+
+        values = {f'booking:{status}': 0 for status, _ in booking_model._meta.get_field('status').choices}
+        values.update((f"booking:{row['status']}", row['n'])
+                      for row in booking_model.objects.values('status').annotate(n=Count('id')).order_by())
+        resources = resource_model.objects.aggregate(total=Count('id'),
+                                                     booked=Count('id', filter=Q(is_booked=True)))
+        values['resources:total'] = resources['total']
+        values['resources:booked'] = resources['booked']
+        values['resources:pending'] = (booking_model.objects
+                                       .filter(status='pending', **{f'{resource_field}__isnull': False})
+                                       .values(resource_field).distinct().count())
+        created = (booking_model.objects.filter(created_at__date__gte=today - timedelta(days=TREND_DAYS))
+                   .annotate(day=TruncDate('created_at')).values('day').annotate(n=Count('id')).order_by())
+        for row in created:
+            values[f"created:{row['day'].isoformat()}"] = row['n']
+
+        OccupancyCounter.objects.filter(vertical=vertical).delete()
+        OccupancyCounter.objects.bulk_create(
+            OccupancyCounter(vertical=vertical, key=key, value=value) for key, value in values.items()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_billingrun_heartbeat'),
+        ('hostel', '0024_image_processed_at'),
+        ('library', '0025_image_processed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -16,6 +17,8 @@ class Complaint(models.Model):
     description = models.TextField()
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     screenshot = models.ImageField(upload_to='complaints/', blank=True, null=True)
+    # Set by the image worker once the derivatives exist (core.services.image_pipeline)
+    screenshot_processed_at = models.DateTimeField(null=True, blank=True, editable=False)
     submitted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     submitted_on = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, default='pending')
@@ -54,8 +57,193 @@ class AchievementBlog(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     images = models.ImageField(upload_to='achievements/', blank=True, null=True)
+    images_processed_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     posted_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
 
     def __str__(self):
         return self.title
+
+
+class NotificationOutbox(models.Model):
+    """Outbound email/SMS, written in the caller's transaction and delivered by Celery."""
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=254)
+    template = models.CharField(max_length=50)
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.channel}:{self.template} → {self.recipient} ({self.status})"
+
+
+class EmailCampaign(models.Model):
+    """An admin broadcast email, sent per recipient in chunks by Celery."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('completed', 'Completed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    logo_url = models.URLField(blank=True)
+    target_group = models.CharField(max_length=10, default='both')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+
+class EmailCampaignRecipient(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    campaign = models.ForeignKey(EmailCampaign, on_delete=models.CASCADE, related_name='recipients')
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    email = models.EmailField()
+    first_name = models.CharField(max_length=150, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        unique_together = ('campaign', 'email')
+        indexes = [
+            models.Index(fields=['campaign', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.email} ({self.status})"
+
+
+class BillingRun(models.Model):
+    """One month-end invoicing pass over hostel and library bookings, checkpointed per chunk."""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    month = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    # Keyset cursors, kept across attempts: highest booking id walked in each vertical
+    hostel_last_id = models.PositiveBigIntegerField(default=0)
+    library_last_id = models.PositiveBigIntegerField(default=0)
+    hostel_scanned = models.PositiveIntegerField(default=0)
+    library_scanned = models.PositiveIntegerField(default=0)
+    hostel_created = models.PositiveIntegerField(default=0)
+    library_created = models.PositiveIntegerField(default=0)
+    chunks = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    duration_seconds = models.FloatField(default=0)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Bumped after every chunk; a running run without one for BILLING_RUN_TIMEOUT_MINUTES is taken over
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month'], condition=models.Q(status='running'),
+                                    name='one_running_billing_run_per_month'),
+        ]
+
+    def __str__(self):
+        return f"Billing {self.month:%Y-%m} ({self.status})"
+
+
+class OccupancyCounter(models.Model):
+    """
+    Denormalised dashboard counters, maintained by core.services.occupancy_counters.
+    Keys: booking:<status>, resources:total|booked|pending, created:<YYYY-MM-DD>.
+    """
+    vertical = models.CharField(max_length=10)
+    key = models.CharField(max_length=32)
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('vertical', 'key')
+
+    def __str__(self):
+        return f"{self.vertical}.{self.key} = {self.value}"
+
+
+class RevenueRollup(models.Model):
+    """
+    Invoice totals per vertical and calendar month of generated_on, maintained by
+    core.services.revenue_rollup so whole-month revenue reports skip the invoice tables.
+    """
+    vertical = models.CharField(max_length=10)
+    month = models.DateField()
+    paid_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pending_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_count = models.PositiveIntegerField(default=0)
+    pending_count = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('vertical', 'month')
+        ordering = ['vertical', 'month']
+
+    def __str__(self):
+        return f"{self.vertical} {self.month:%Y-%m}"
+
+
+class ExportJob(models.Model):
+    """An admin export produced off the request path by core.tasks.run_export_job."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    ]
+
+    dataset = models.CharField(max_length=30)
+    output = models.CharField(max_length=10, default='csv')
+    filters = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    file = models.FileField(upload_to='exports/', blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.dataset} export ({self.status})"
@@ -3,6 +3,7 @@ from users.models import User
 from .models import Complaint, Suggestion, Review,ContactMessage, AchievementBlog
 from hostel.models import HostelBooking
 from library.models import LibraryBooking
+from core.utils.image_utils import derivative_urls
 
 
 class StudentDetailSerializer(serializers.ModelSerializer):
@@ -25,6 +26,7 @@ class ComplaintSerializer(serializers.ModelSerializer):
     student_username = serializers.SerializerMethodField()
     student_email = serializers.SerializerMethodField()
     student_phone_number = serializers.SerializerMethodField()
+    screenshot_derivatives = serializers.SerializerMethodField()
 
     class Meta:
         model = Complaint
@@ -49,6 +51,9 @@ class ComplaintSerializer(serializers.ModelSerializer):
         user = obj.submitted_by
         return user.phone_number if user else None
 
+    def get_screenshot_derivatives(self, obj):
+        return derivative_urls(obj, 'screenshot', self.context.get('request'))
+
 
 class SuggestionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -102,10 +107,22 @@ class AdminSendEmailSerializer(serializers.Serializer):
         choices=['hostel', 'library', 'both'], default='both'
     )
 
+
+class ExportJobRequestSerializer(serializers.Serializer):
+    dataset = serializers.CharField()
+    output = serializers.ChoiceField(choices=['csv', 'gzip', 'xlsx'], default='csv')
+    filters = serializers.DictField(required=False, default=dict)
+
+
 # serializers.py
 
 class AchievementBlogSerializer(serializers.ModelSerializer):
+    images_derivatives = serializers.SerializerMethodField()
+
     class Meta:
         model = AchievementBlog
         fields = '__all__'
         read_only_fields = ['posted_by', 'created_at']
+
+    def get_images_derivatives(self, obj):
+        return derivative_urls(obj, 'images', self.context.get('request'))
@@ -0,0 +1,129 @@
+"""
+Month-end billing run for both verticals.
+
+Approved bookings without an invoice for the month are walked in keyset order
+(id > cursor, BILLING_RUN_CHUNK_SIZE at a time). Each chunk's invoices and the
+run's progress, cursor included, are committed together. A crashed run is
+picked up by the next run_billing() for the same month, which resumes after the
+stored cursor and then sweeps once below it, so bookings approved meanwhile are
+included even when their ids are below the point the crash stopped at.
+
+Only one run per month works at a time: the run row is claimed under
+select_for_update() and heartbeats after every chunk. A run that has not
+heartbeated for BILLING_RUN_TIMEOUT_MINUTES is taken over.
+"""
+import logging
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core.models import BillingRun
+from core.services.invoice_service import HostelInvoiceService, LibraryInvoiceService
+from hostel.models import HostelMonthlyFee
+from library.models import LibraryMonthlyFee
+
+logger = logging.getLogger(__name__)
+
+VERTICALS = (
+    ('hostel', HostelInvoiceService, HostelMonthlyFee),
+    ('library', LibraryInvoiceService, LibraryMonthlyFee),
+)
+
+
+def _run_vertical(run, name, service, fees, chunk_size):
+    last_id_field = f'{name}_last_id'
+    # Resume after the cursor an earlier attempt stored, then sweep once below it
+    # for bookings approved behind the walk
+    _walk(run, name, service, fees, chunk_size, after=getattr(run, last_id_field))
+    _walk(run, name, service, fees, chunk_size, upto=getattr(run, last_id_field))
+
+
+def _walk(run, name, service, fees, chunk_size, after=0, upto=None):
+    """
+    Invoice approved bookings without one for the month, id > `after` in keyset
+    order. The walk advances the run's cursor; a sweep (`upto` set) stays below it.
+    Bookings are counted once across attempts: a committed chunk is invoiced and
+    never selected again.
+    """
+    last_id_field, scanned_field, created_field = f'{name}_last_id', f'{name}_scanned', f'{name}_created'
+    invoiced = service.invoice_model.objects.filter(booking_id=OuterRef('pk'), month=run.month)
+    pending = service.booking_model.objects.filter(status='approved').exclude(Exists(invoiced))
+    if upto is not None:
+        pending = pending.filter(id__lte=upto)
+
+    while True:
+        chunk = list(pending.filter(id__gt=after).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not chunk:
+            return
+        after = chunk[-1]
+
+        with transaction.atomic():
+            result = service.generate(fees, run.month, bookings=service.booking_model.objects.filter(id__in=chunk))
+            update_fields = [scanned_field, created_field, 'chunks', 'heartbeat_at']
+            if upto is None:
+                setattr(run, last_id_field, after)
+                update_fields.append(last_id_field)
+            setattr(run, scanned_field, getattr(run, scanned_field) + len(chunk))
+            setattr(run, created_field, getattr(run, created_field) + result["created"])
+            run.chunks += 1
+            run.heartbeat_at = timezone.now()
+            run.save(update_fields=update_fields)
+
+
+def _claim(month):
+    """(run, claimed): the month's open run, marked running for this caller unless another one is alive."""
+    now = timezone.now()
+    stale = now - timedelta(minutes=settings.BILLING_RUN_TIMEOUT_MINUTES)
+    try:
+        with transaction.atomic():
+            run = (BillingRun.objects.select_for_update()
+                   .filter(month=month).exclude(status='completed').order_by('-id').first())
+            if run is None:
+                run = BillingRun(month=month)
+            elif run.status == 'running' and run.heartbeat_at and run.heartbeat_at >= stale:
+                return run, False
+            run.status = 'running'
+            run.attempts += 1
+            run.error = ''
+            run.heartbeat_at = now
+            run.save()
+    except IntegrityError:
+        # Another caller created the month's running run first; it may have finished since
+        return BillingRun.objects.filter(month=month).order_by('-id').first(), False
+    return run, True
+
+
+def run_billing(month=None, chunk_size=None):
+    """
+    Invoice every approved booking for `month` (default: this month). Returns the BillingRun;
+    when another run for the month is still alive, that run is returned untouched.
+    """
+    month = month or date.today().replace(day=1)
+    chunk_size = chunk_size or settings.BILLING_RUN_CHUNK_SIZE
+
+    run, claimed = _claim(month)
+    if not claimed:
+        logger.info("Billing run %s for %s is already %s", run.id, f"{month:%Y-%m}", run.status)
+        return run
+
+    started = time.monotonic()
+    try:
+        for name, service, fee_model in VERTICALS:
+            fees = fee_model.objects.last()
+            if not fees:
+                raise ValueError(f"{name.title()} fee settings not configured.")
+            _run_vertical(run, name, service, fees, chunk_size)
+        run.status = 'completed'
+    except Exception as e:
+        run.status = 'failed'
+        run.error = str(e) or repr(e)
+        logger.exception("Billing run %s failed", run.id)
+    finally:
+        run.duration_seconds += time.monotonic() - started
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'error', 'duration_seconds', 'finished_at'])
+    return run
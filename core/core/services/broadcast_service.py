@@ -0,0 +1,164 @@
+"""
+Coalesced, batched broadcasting of seat-map events.
+
+Views and serializers call queue_seat_event() instead of channel_layer.group_send.
+Events are held until their transaction commits (dropped on rollback), collected
+for the rest of the request by BroadcastScopeMiddleware (or a `with batch():`
+block in tasks and commands), and sent as one frame per group. Frames for the same group are further debounced so a burst (e.g. a
+bulk approval run) goes out at most once per SEAT_MAP_BROADCAST_DEBOUNCE_MS.
+A frame's deltas are read when it is sent (seat_map_stream.send_frame), so
+they always describe the state current at its seq.
+
+Only the request middleware leaves a frame to the debounce timer. A batch() in
+a task or command sends synchronously when it exits, since the process may end
+(Celery pool children exit without running atexit) before the timer fires.
+Frames still waiting when a process shuts down are flushed at exit.
+"""
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from core.services import seat_map_stream
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_counters_lock = threading.Lock()
+_counters = {"queued": 0, "coalesced": 0, "sent": 0}
+
+
+def _count(name, amount=1):
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def get_counters():
+    """Per-process totals: events queued, events folded into another frame, frames sent."""
+    with _counters_lock:
+        return dict(_counters)
+
+
+class _Debouncer:
+    """Merges frames for a group so at most one is sent per debounce interval."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.timers = {}
+        self.last_sent = {}
+
+    def submit(self, group, events, resources):
+        interval = getattr(settings, 'SEAT_MAP_BROADCAST_DEBOUNCE_MS', 0) / 1000
+        with self.lock:
+            pending_events, pending_resources = self.pending.setdefault(group, ([], []))
+            pending_events.extend(events)
+            pending_resources.extend(resources)
+            if group in self.timers:
+                return
+
+            wait = self.last_sent.get(group, 0) + interval - time.monotonic()
+            if wait > 0:
+                timer = threading.Timer(wait, self._flush_from_timer, [group])
+                timer.daemon = True
+                self.timers[group] = timer
+                timer.start()
+                return
+
+        self.flush(group)
+
+    def flush(self, group):
+        with self.lock:
+            self.timers.pop(group, None)
+            events, resources = self.pending.pop(group, ([], []))
+            if not events:
+                return
+            self.last_sent[group] = time.monotonic()
+
+        try:
+            seat_map_stream.send_frame(events, resources)
+            _count("sent")
+            _count("coalesced", len(events) - 1)
+        except Exception:
+            logger.exception("WebSocket broadcast failed")
+
+    def _flush_from_timer(self, group):
+        # send_frame() reads the beds/seats; the timer thread's connection is not reused
+        try:
+            self.flush(group)
+        finally:
+            connections.close_all()
+
+    def flush_all(self):
+        """Send every waiting frame now instead of when its timer fires."""
+        with self.lock:
+            groups = list(self.pending)
+            for group in groups:
+                timer = self.timers.pop(group, None)
+                if timer is not None:
+                    timer.cancel()
+        for group in groups:
+            self.flush(group)
+
+
+_debouncer = _Debouncer()
+atexit.register(_debouncer.flush_all)
+
+
+def _dispatch(items):
+    """Queue committed (data, resources) items as one frame for the seat-map group."""
+    resources = [resource for _, item_resources in items for resource in item_resources]
+    _debouncer.submit(seat_map_stream.GROUP_NAME, [data for data, _ in items], resources)
+
+
+def _committed(item):
+    scope = getattr(_local, 'scope', None)
+    if scope is not None:
+        scope.append(item)
+    else:
+        _dispatch([item])
+
+
+def queue_seat_event(data, resources):
+    """
+    Queue a live_seat_updates event. `data` is the event dict sent to clients and
+    `resources` a list of (seat_map_stream.BED | SEAT, id) whose status it changes.
+    """
+    _count("queued")
+    transaction.on_commit(partial(_committed, (data, list(resources))))
+
+
+@contextmanager
+def batch(debounce=False):
+    """
+    Send every event committed inside the block as one frame when it exits, right away
+    unless `debounce` lets it wait for the group's debounce interval.
+    """
+    if getattr(_local, 'scope', None) is not None:
+        yield
+        return
+
+    _local.scope = []
+    try:
+        yield
+    finally:
+        items, _local.scope = _local.scope, None
+        if items:
+            _dispatch(items)
+            if not debounce:
+                _debouncer.flush(seat_map_stream.GROUP_NAME)
+
+
+class BroadcastScopeMiddleware:
+    """Collects the events committed during a request and sends them once it finishes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with batch(debounce=True):
+            return self.get_response(request)
@@ -0,0 +1,146 @@
+"""
+Admin email campaigns.
+
+create_campaign() stores the campaign and one row per recipient in a single
+transaction. The core.tasks.send_email_campaign task then sends
+EMAIL_CAMPAIGN_CHUNK_SIZE recipients at a time over the worker's pooled SMTP
+connection and re-queues itself until none are pending, so a campaign survives
+worker restarts and is resumed by queueing the task again.
+
+Each run claims its chunk (status 'sending' plus a claim token) before sending,
+so two runs of the same campaign never mail the same recipient. A chunk whose
+worker died is claimed again after EMAIL_CAMPAIGN_CLAIM_TIMEOUT, and the
+core.tasks.resume_email_campaigns beat task re-queues campaigns that stopped
+making progress.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from core.models import EmailCampaign, EmailCampaignRecipient
+from core.utils.email_utils import send_email_messages
+
+
+def create_campaign(created_by, subject, message, logo_url, target_group, students):
+    """`students` is an iterable of users; one recipient row per distinct email."""
+    with transaction.atomic():
+        campaign = EmailCampaign.objects.create(
+            subject=subject, message=message, logo_url=logo_url,
+            target_group=target_group, created_by=created_by,
+        )
+        recipients = {}
+        for student in students:
+            if student.email and student.email not in recipients:
+                recipients[student.email] = EmailCampaignRecipient(
+                    campaign=campaign, student=student, email=student.email, first_name=student.first_name,
+                )
+        EmailCampaignRecipient.objects.bulk_create(recipients.values())
+    return campaign
+
+
+def render_email(campaign, recipient):
+    """Personalised HTML message; `{first_name}` in the campaign text is replaced per recipient."""
+    formatted_message = campaign.message.replace('{first_name}', recipient.first_name or 'Student')
+    formatted_message = formatted_message.replace('\n', '<br>')
+
+    html_message = f"""
+        <div style="font-family: Arial, sans-serif; padding: 10px;">
+            <img src="{campaign.logo_url}" alt="Bussiness Track Hostel & Library" style="max-width: 200px; margin-bottom: 20px;" />
+            <p>{formatted_message}</p>
+            <br>
+            <p>Thanks & Regards,<br>
+            Admin,<br>
+            <strong>Bussiness Track Hostel & Library</strong></p>
+        </div>
+    """
+
+    email = EmailMessage(
+        subject=campaign.subject,
+        body=html_message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient.email]
+    )
+    email.content_subtype = "html"
+    return email
+
+
+def _stale_cutoff(now):
+    return now - timedelta(seconds=settings.EMAIL_CAMPAIGN_CLAIM_TIMEOUT)
+
+
+def claim_chunk(campaign_id, chunk_size):
+    """Mark up to `chunk_size` unsent recipients as sending for this run and return them."""
+    now = timezone.now()
+    due = Q(status='pending') | Q(status='sending', claimed_at__lt=_stale_cutoff(now))
+
+    ids = list(EmailCampaignRecipient.objects.filter(due, campaign_id=campaign_id)
+               .order_by('id').values_list('id', flat=True)[:chunk_size])
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    EmailCampaignRecipient.objects.filter(due, id__in=ids).update(status='sending', claimed_at=now, claim_token=token)
+    return list(EmailCampaignRecipient.objects.filter(claim_token=token).order_by('id'))
+
+
+def send_chunk(campaign_id, chunk_size=None):
+    """Send the next chunk of pending recipients. Returns how many are still pending."""
+    chunk_size = chunk_size or settings.EMAIL_CAMPAIGN_CHUNK_SIZE
+    campaign = EmailCampaign.objects.get(id=campaign_id)
+    if campaign.status == 'completed':
+        return 0
+
+    recipients = claim_chunk(campaign.id, chunk_size)
+    if recipients:
+        EmailCampaign.objects.filter(id=campaign.id, status='queued').update(status='sending')
+
+        errors = send_email_messages([render_email(campaign, recipient) for recipient in recipients])
+
+        sent_ids = [recipient.id for recipient, error in zip(recipients, errors) if error is None]
+        EmailCampaignRecipient.objects.filter(id__in=sent_ids).update(status='sent', sent_at=timezone.now())
+
+        failed = []
+        for recipient, error in zip(recipients, errors):
+            if error is not None:
+                recipient.status = 'failed'
+                recipient.error = error
+                failed.append(recipient)
+        EmailCampaignRecipient.objects.bulk_update(failed, ['status', 'error'])
+
+    remaining = campaign.recipients.filter(status='pending').count()
+    # Chunks another run is still sending complete the campaign when they finish
+    if not remaining and not campaign.recipients.filter(status='sending').exists():
+        EmailCampaign.objects.filter(id=campaign.id).exclude(status='completed').update(
+            status='completed', completed_at=timezone.now())
+    return remaining
+
+
+def stalled_campaigns(now=None):
+    """Ids of unfinished campaigns with nothing claimed for EMAIL_CAMPAIGN_CLAIM_TIMEOUT."""
+    cutoff = _stale_cutoff(now or timezone.now())
+    recently_claimed = EmailCampaignRecipient.objects.filter(campaign=OuterRef('pk'), claimed_at__gte=cutoff)
+    return list(EmailCampaign.objects.filter(status__in=['queued', 'sending'], created_at__lt=cutoff)
+                .exclude(Exists(recently_claimed)).order_by('id').values_list('id', flat=True))
+
+
+def get_progress(campaign):
+    counts = campaign.recipients.aggregate(
+        total=Count('id'),
+        sent=Count('id', filter=Q(status='sent')),
+        failed=Count('id', filter=Q(status='failed')),
+        remaining=Count('id', filter=Q(status__in=['pending', 'sending'])),
+    )
+    return {
+        "id": campaign.id,
+        "subject": campaign.subject,
+        "target_group": campaign.target_group,
+        "status": campaign.status,
+        "created_at": campaign.created_at,
+        "completed_at": campaign.completed_at,
+        **counts,
+    }
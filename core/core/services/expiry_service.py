@@ -0,0 +1,90 @@
+"""
+Set-based release of approved bookings whose end_date has passed.
+
+Both verticals are handled in one transaction with a handful of UPDATEs: the
+bookings are marked expired, then every affected bed/seat that no longer has an
+approved booking is freed (the same rule HostelBooking.save() /
+LibraryBooking.save() apply one row at a time). One seat-map event per freed
+resource is queued and they go out together as a single frame after commit.
+update() sends no signals, so the occupancy counters are adjusted here and the
+affected students' profile reports are invalidated after commit.
+"""
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.services import broadcast_service, occupancy_counters, profile_report, seat_map_stream
+from core.services.occupancy_service import LibraryOccupancyService
+from hostel.models import HostelBed, HostelBooking
+from library.models import LibraryBooking, LibrarySeat
+
+VERTICALS = {
+    'hostel': (HostelBooking, HostelBed, 'bed_id', seat_map_stream.BED),
+    'library': (LibraryBooking, LibrarySeat, 'seat_id', seat_map_stream.SEAT),
+}
+
+
+def _seat_map_event(vertical, resource_id):
+    if vertical == 'hostel':
+        return {"type": "booking_expired", "bed_id": resource_id, "is_booked": False}
+    return {"type": "library_booking_expired", "seat_id": resource_id, "is_booked": False}
+
+
+def _release(vertical, today, dry_run):
+    booking_model, resource_model, resource_field, kind = VERTICALS[vertical]
+
+    expired = list(booking_model.objects.select_for_update()
+                   .filter(end_date__lt=today, status='approved')
+                   .values_list('id', resource_field, 'student_id'))
+    booking_ids = [booking_id for booking_id, _, _ in expired]
+    resource_ids = sorted({resource_id for _, resource_id, _ in expired if resource_id})
+    student_ids = sorted({student_id for _, _, student_id in expired if student_id})
+    if not booking_ids:
+        return {"bookings": 0, "released": 0, "booking_ids": [], "freed_ids": []}
+
+    # Resources that keep another approved booking stay booked
+    still_booked = (booking_model.objects.filter(status='approved', **{f'{resource_field}__isnull': False})
+                    .exclude(id__in=booking_ids).values(resource_field))
+    freed = list(resource_model.objects.filter(id__in=resource_ids)
+                 .exclude(id__in=still_booked)
+                 .values_list('id', flat=True))
+
+    result = {"bookings": len(booking_ids), "released": len(freed), "booking_ids": booking_ids, "freed_ids": freed}
+    if dry_run:
+        return result
+
+    changes = {'status': 'expired'}
+    if any(field.name == 'updated_at' for field in booking_model._meta.concrete_fields):
+        changes['updated_at'] = timezone.now()  # update() bypasses auto_now
+    booking_model.objects.filter(id__in=booking_ids).update(**changes)
+    unbooked = resource_model.objects.filter(id__in=freed, is_booked=True).update(is_booked=False)
+    occupancy_counters.adjust(vertical, {
+        occupancy_counters.booking_key('approved'): -len(booking_ids),
+        occupancy_counters.booking_key('expired'): len(booking_ids),
+        occupancy_counters.BOOKED: -unbooked,
+    })
+
+    for resource_id in freed:
+        broadcast_service.queue_seat_event(_seat_map_event(vertical, resource_id), [(kind, resource_id)])
+    transaction.on_commit(lambda: profile_report.invalidate_many(student_ids))
+    return result
+
+
+def release_expired_bookings(today=None, dry_run=False):
+    """
+    Expire bookings with end_date before `today` in both verticals. With
+    dry_run=True only the would-be changes are returned. Returns per-vertical
+    counts plus duration_ms.
+    """
+    today = today or timezone.now().date()
+    started = time.monotonic()
+
+    with broadcast_service.batch(), transaction.atomic():
+        result = {vertical: _release(vertical, today, dry_run) for vertical in VERTICALS}
+        if result['library']['bookings'] and not dry_run:
+            transaction.on_commit(LibraryOccupancyService.invalidate)
+
+    result["dry_run"] = dry_run
+    result["duration_ms"] = round((time.monotonic() - started) * 1000, 2)
+    return result
@@ -0,0 +1,278 @@
+"""
+Asynchronous admin exports.
+
+An admin submits a spec (dataset, filters, output) and gets an ExportJob back
+straight away; core.tasks.run_export_job streams the rows through the
+export_service writers into a file under MEDIA_ROOT/exports/, so generation
+never holds a web worker. When the job finishes, a small `export_job` frame
+(id and status only) is sent to the staff-only admin group
+(core.consumers.ADMIN_GROUP_NAME); the status endpoint has the details, and
+admins without a socket poll it instead. Artifacts live for
+EXPORT_JOB_TTL_HOURS and are removed by core.tasks.purge_expired_exports, which
+also fails jobs left `running` for EXPORT_JOB_TIMEOUT_MINUTES by a worker that
+died.
+"""
+import logging
+import secrets
+import tempfile
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+
+from core.consumers import ADMIN_GROUP_NAME
+from core.models import ExportJob
+from core.services import export_service, search_service, student_service
+from core.services.export_service import Column
+from hostel.models import HostelBooking, HostelMonthlyInvoice
+from library.models import LibraryBooking, LibraryMonthlyInvoice
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+
+class Dataset:
+    """An exportable dataset: base queryset, columns, accepted filters and the search path to the student."""
+
+    def __init__(self, queryset, columns, filters, search_prefix):
+        self.queryset = queryset
+        self.columns = columns
+        self.filters = filters
+        self.search_prefix = search_prefix
+
+
+def _booking_columns(resource_columns):
+    return [
+        Column('ID', 'id'),
+        Column('Username', 'student__username'),
+        Column('First Name', 'student__first_name'),
+        Column('Last Name', 'student__last_name'),
+        Column('Phone', 'student__phone_number'),
+        *resource_columns,
+        Column('Start Date', 'start_date'),
+        Column('End Date', 'end_date'),
+        Column('Status', 'status', export_service.upper),
+        Column('Approved By', 'approved_by__username'),
+        Column('Approved At', 'approved_at'),
+        Column('Remarks', 'remarks'),
+    ]
+
+
+INVOICE_COLUMNS = [
+    Column('Invoice ID', 'invoice_id'),
+    Column('Booking ID', 'booking_id'),
+    Column('Username', 'booking__student__username'),
+    Column('Month', 'month'),
+    Column('Amount', 'amount'),
+    Column('Deposit', 'deposit'),
+    Column('Total', 'total'),
+    Column('Paid', 'is_paid'),
+    Column('Expired', 'invoice_expired'),
+    Column('Generated On', 'generated_on'),
+]
+
+# filter name -> ORM lookup
+BOOKING_FILTERS = {
+    'status': 'status',
+    'student_id': 'student_id',
+    'start_date_from': 'start_date__gte',
+    'start_date_to': 'start_date__lte',
+}
+INVOICE_FILTERS = {
+    'is_paid': 'is_paid',
+    'student_id': 'booking__student_id',
+    'month_from': 'month__gte',
+    'month_to': 'month__lte',
+}
+
+DATASETS = {
+    'hostel_bookings': Dataset(
+        lambda: HostelBooking.objects.all(),
+        _booking_columns([Column('Room', 'bed__room__room_number'), Column('Bed', 'bed__bed_number')]),
+        BOOKING_FILTERS, 'student__',
+    ),
+    'library_bookings': Dataset(
+        lambda: LibraryBooking.objects.all(),
+        _booking_columns([Column('Seat', 'seat__seat_number')]),
+        BOOKING_FILTERS, 'student__',
+    ),
+    'hostel_invoices': Dataset(
+        lambda: HostelMonthlyInvoice.objects.all(), INVOICE_COLUMNS, INVOICE_FILTERS, 'booking__student__',
+    ),
+    'library_invoices': Dataset(
+        lambda: LibraryMonthlyInvoice.objects.all(), INVOICE_COLUMNS, INVOICE_FILTERS, 'booking__student__',
+    ),
+    'students': Dataset(
+        lambda: student_service.enrich(User.objects.filter(role='student')),
+        [
+            Column('ID', 'id'),
+            Column('Username', 'username'),
+            Column('First Name', 'first_name'),
+            Column('Middle Name', 'middle_name'),
+            Column('Last Name', 'last_name'),
+            Column('Email', 'email'),
+            Column('Phone', 'phone_number'),
+            Column('Education', 'education'),
+            Column('Address', 'address'),
+            Column('Active', 'is_active'),
+            Column('Date Joined', 'date_joined'),
+            Column('Hostel Booking', 'hostel_booking_id'),
+            Column('Library Booking', 'library_booking_id'),
+            Column('Latest Hostel Invoice Paid', 'latest_hostel_invoice_paid'),
+            Column('Latest Library Invoice Paid', 'latest_library_invoice_paid'),
+        ],
+        {
+            'is_active': 'is_active',
+            'education': 'education__iexact',
+            'joined_from': 'date_joined__date__gte',
+            'joined_to': 'date_joined__date__lte',
+        },
+        '',
+    ),
+}
+
+
+def build_queryset(dataset, filters):
+    """
+    The filtered queryset for `dataset`. Every dataset also accepts a `search`
+    term (see search_service). Raises ValueError for an unknown dataset,
+    unknown filter or a value the column cannot hold.
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"dataset must be one of {', '.join(DATASETS)}.")
+    spec = DATASETS[dataset]
+    filters = dict(filters or {})
+
+    qs = spec.queryset()
+    term = filters.pop('search', None)
+    unknown = set(filters) - set(spec.filters)
+    if unknown:
+        raise ValueError(f"Unknown filters for {dataset}: {', '.join(sorted(unknown))}. "
+                         f"Allowed: {', '.join(['search', *spec.filters])}.")
+    try:
+        qs = qs.filter(**{spec.filters[name]: value for name, value in filters.items()})
+    except (ValidationError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid filter value: {e}")
+    if term:
+        qs = search_service.search(qs, str(term), spec.search_prefix)
+    return qs.order_by('id')
+
+
+def create_job(user, dataset, output, filters):
+    """Validate the spec and record a queued job; the caller queues run_export_job on commit."""
+    if output not in export_service.WRITERS:
+        raise ValueError(f"output must be one of {', '.join(export_service.WRITERS)}.")
+    if not isinstance(filters or {}, dict):
+        raise ValueError("filters must be an object.")
+    build_queryset(dataset, filters)
+    return ExportJob.objects.create(created_by=user, dataset=dataset, output=output, filters=filters or {})
+
+
+def run(job_id):
+    """Produce the artifact for a queued job. A job already claimed by another worker is left alone."""
+    if not ExportJob.objects.filter(id=job_id, status='queued').update(status='running', started_at=timezone.now()):
+        return ExportJob.objects.filter(id=job_id).first()
+    job = ExportJob.objects.get(id=job_id)
+
+    writer, _, extension = export_service.WRITERS[job.output]
+    columns = DATASETS[job.dataset].columns
+    row_count = 0
+
+    def counted(rows):
+        nonlocal row_count
+        for row in rows:
+            row_count += 1
+            yield row
+
+    try:
+        rows = counted(export_service.iter_rows(build_queryset(job.dataset, job.filters), columns))
+        with tempfile.TemporaryFile() as artifact:
+            for chunk in writer([column.header for column in columns], rows):
+                artifact.write(chunk)
+            artifact.seek(0)
+            # Random suffix: MEDIA_ROOT may be served directly, so the path must not be guessable
+            job.file.save(f'{job.dataset}_{job.id}_{secrets.token_hex(8)}.{extension}', File(artifact), save=False)
+        job.status = 'completed'
+        job.row_count = row_count
+    except Exception as e:
+        logger.exception("Export job %s failed", job.id)
+        job.status = 'failed'
+        job.error = str(e)
+
+    _finish(job)
+    job.save(update_fields=['file', 'status', 'row_count', 'error', 'finished_at', 'expires_at'])
+    notify(job)
+    return job
+
+
+def _finish(job):
+    job.finished_at = timezone.now()
+    job.expires_at = job.finished_at + timedelta(hours=settings.EXPORT_JOB_TTL_HOURS)
+
+
+def describe(job):
+    return {
+        "job_id": job.id,
+        "dataset": job.dataset,
+        "output": job.output,
+        "filters": job.filters,
+        "status": job.status,
+        "row_count": job.row_count,
+        "error": job.error or None,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "expires_at": job.expires_at,
+    }
+
+
+def notify(job):
+    # Filters, search terms and errors stay behind the status endpoint
+    frame = {"type": "export_job", "job_id": job.id, "status": job.status}
+    try:
+        async_to_sync(get_channel_layer().group_send)(ADMIN_GROUP_NAME, {
+            "type": "send_admin_update",
+            "data": frame,
+        })
+    except Exception:
+        # Polling the status endpoint still works without the socket
+        logger.warning("Export job %s notification failed", job.id, exc_info=True)
+
+
+def fail_stalled(now=None):
+    """Fail jobs whose worker died while `running`, so they get an expiry and a final status. Returns how many."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(minutes=settings.EXPORT_JOB_TIMEOUT_MINUTES)
+    stalled = ExportJob.objects.filter(
+        Q(started_at__lt=cutoff) | Q(started_at__isnull=True, created_at__lt=cutoff), status='running')
+    failed = 0
+    for job in stalled.iterator():
+        job.status = 'failed'
+        job.error = f"Worker stopped before finishing (running over {settings.EXPORT_JOB_TIMEOUT_MINUTES} min)."
+        _finish(job)
+        # Conditional, in case the job finished meanwhile
+        if ExportJob.objects.filter(id=job.id, status='running').update(
+                status=job.status, error=job.error, finished_at=job.finished_at, expires_at=job.expires_at):
+            logger.warning("Export job %s marked failed: %s", job.id, job.error)
+            notify(job)
+            failed += 1
+    return failed
+
+
+def purge_expired(now=None):
+    """Delete the artifacts of jobs past their TTL; the rows stay as 'expired'. Returns how many."""
+    now = now or timezone.now()
+    expired = ExportJob.objects.filter(expires_at__lte=now).exclude(status='expired')
+    purged = 0
+    for job in expired.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.status = 'expired'
+        job.save(update_fields=['file', 'status'])
+        purged += 1
+    return purged
@@ -0,0 +1,115 @@
+"""
+Upload processing for the image fields listed in IMAGE_FIELDS.
+
+post_init remembers each image field's stored name. post_save compares it
+with the new one, and for every newly uploaded file queues
+core.tasks.process_uploaded_image once the transaction commits. The worker
+(core.utils.image_utils.process) strips the metadata from the original,
+re-encodes it under a fresh name, and writes WebP/JPEG thumb and preview
+derivatives next to it, using only storage.save()/delete() so any storage
+backend works. It then points the field at the new original, stamps the row's
+<field>_processed_at (which a new upload clears) and deletes the old file.
+Serializers expose the derivatives as `<field>_derivatives` through
+image_utils.derivative_urls(), which reads only that stamp; the profile report
+draws a placeholder until it is set, and is invalidated when it is. Uploads made before
+this existed, or processed before the stamp existed, are handled by the
+process_uploaded_images command.
+"""
+import logging
+
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+from core.utils import image_utils
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FIELDS = {
+    'hostel.HostelBooking': ('aadhaar_front_photo', 'aadhaar_back_photo'),
+    'library.LibraryBooking': ('aadhaar_front_photo', 'aadhaar_back_photo'),
+    'users.User': ('profile_photo',),
+    'core.Complaint': ('screenshot',),
+    'core.AchievementBlog': ('images',),
+}
+# Booking Aadhaar photos name users.KycDocument files, which are addressed by
+# their content: sanitised once when stored (kyc_service) and never rewritten
+KEEP_ORIGINAL = {'hostel.HostelBooking', 'library.LibraryBooking'}
+# Rows whose photos the student profile report embeds, and the column naming the student
+REPORT_STUDENT = {
+    'hostel.HostelBooking': 'student_id',
+    'library.LibraryBooking': 'student_id',
+    'users.User': 'pk',
+}
+
+
+def _fields(sender):
+    return IMAGE_FIELDS[sender._meta.label]
+
+
+def _name(value):
+    return getattr(value, 'name', value) or None
+
+
+def remember_images(sender, instance, **kwargs):
+    """post_init: the stored file names, read from __dict__ so deferred fields stay deferred."""
+    instance._image_names = {field: _name(instance.__dict__.get(field)) for field in _fields(sender)}
+
+
+def images_saved(sender, instance, raw=False, **kwargs):
+    """post_save: queue processing for each image field that now holds a new upload."""
+    if raw:
+        return
+    before = getattr(instance, '_image_names', {})
+    for field in _fields(sender):
+        if field not in instance.__dict__:
+            continue
+        name = _name(instance.__dict__[field])
+        if name and name != before.get(field):
+            processed = image_utils.processed_field(field)
+            if getattr(instance, processed, None):
+                # The stamp belonged to the replaced file
+                setattr(instance, processed, None)
+                sender.objects.filter(pk=instance.pk).update(**{processed: None})
+            transaction.on_commit(lambda field=field: enqueue(sender._meta.label, instance.pk, field), robust=True)
+    remember_images(sender, instance)
+
+
+def enqueue(label, pk, field):
+    from core.tasks import process_uploaded_image
+
+    process_uploaded_image.delay(label, pk, field)
+
+
+def process(label, pk, field):
+    """Process one stored upload; returns the names written (empty when missing or already done)."""
+    model = apps.get_model(label)
+    processed = image_utils.processed_field(field)
+    instance = model.objects.filter(pk=pk).only('pk', field, processed).first()
+    field_file = getattr(instance, field) if instance else None
+    if not field_file or getattr(instance, processed):
+        return []
+    try:
+        name, written = image_utils.process(field_file, rewrite_original=label not in KEEP_ORIGINAL)
+    except (OSError, ValueError) as e:
+        # Not an image Pillow can read, or the write failed; the original stays as uploaded
+        logger.warning("Image processing skipped for %s %s %s: %s", label, pk, field, e)
+        return []
+
+    # Only if the row still holds this file; a newer upload has its own task queued
+    if not model.objects.filter(pk=pk, **{field: field_file.name}).update(**{field: name, processed: timezone.now()}):
+        if name != field_file.name:
+            image_utils.discard(field_file.storage, written)
+        return []
+    if name != field_file.name:
+        field_file.storage.delete(field_file.name)
+    _refresh_report(model, label, pk)
+    return written
+
+
+def _refresh_report(model, label, pk):
+    """The cached profile report drew a placeholder for this photo; the stamp is an update(), which sends no signals."""
+    from core.services import profile_report
+
+    if label in REPORT_STUDENT:
+        profile_report.invalidate_many(model.objects.filter(pk=pk).values_list(REPORT_STUDENT[label], flat=True))
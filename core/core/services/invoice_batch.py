@@ -0,0 +1,78 @@
+"""
+Batch rendering of monthly invoice PDFs.
+
+The invoices are read in one joined query per vertical and reduced to plain
+field dicts (core.utils.invoice_utils.*_invoice_fields). Workers never touch
+the database. For ZIP output the dicts are rendered across a process pool
+(INVOICE_BATCH_WORKERS). Each worker builds the ReportLab styles once in its
+initializer. Finished PDFs are streamed into the archive in order, as they
+complete. A merged PDF is a single ReportLab document with one page per
+invoice, so it is rendered in the calling process; ReportLab cannot splice
+PDFs rendered elsewhere.
+"""
+import multiprocessing
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from core.services.export_service import ChunkBuffer, FLUSH_BYTES
+from core.utils import invoice_utils
+from hostel.models import HostelMonthlyInvoice
+from library.models import LibraryMonthlyInvoice
+
+ZIP = 'zip'
+PDF = 'pdf'
+OUTPUTS = (ZIP, PDF)
+
+VERTICALS = {
+    'hostel': (HostelMonthlyInvoice, ('booking__student', 'booking__bed__room'), invoice_utils.hostel_invoice_fields),
+    'library': (LibraryMonthlyInvoice, ('booking__student', 'booking__seat'), invoice_utils.library_invoice_fields),
+}
+
+
+def invoice_fields(verticals, month=None, is_paid=None, student_id=None):
+    """[(vertical, fields)] for the selected invoices, ordered by vertical then invoice id."""
+    selected = []
+    for vertical in verticals:
+        invoice_model, related, to_fields = VERTICALS[vertical]
+        qs = invoice_model.objects.select_related(*related)
+        if month is not None:
+            qs = qs.filter(month__year=month.year, month__month=month.month)
+        if is_paid is not None:
+            qs = qs.filter(is_paid=is_paid)
+        if student_id is not None:
+            qs = qs.filter(booking__student_id=student_id)
+        selected.extend((vertical, to_fields(invoice)) for invoice in qs.order_by('invoice_id', 'id'))
+    return selected
+
+
+def render_all(fields_list, workers=None):
+    """PDF bytes per field dict, in order; across a process pool when there is enough work for one."""
+    workers = workers or settings.INVOICE_BATCH_WORKERS
+    if workers <= 1 or len(fields_list) < 2 * workers:
+        yield from map(invoice_utils.render_invoice, fields_list)
+        return
+
+    # spawn: the children only import invoice_utils (ReportLab, no Django), not a copy of this
+    # process's connections and threads. The initializer builds the styles once per worker.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=invoice_utils.invoice_styles) as pool:
+        chunksize = max(1, len(fields_list) // (workers * 4))
+        yield from pool.map(invoice_utils.render_invoice, fields_list, chunksize=chunksize)
+
+
+def zip_chunks(selected, workers=None):
+    """Stream a ZIP with one <vertical>/<invoice_id>.pdf entry per invoice."""
+    buffer = ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        pdfs = render_all([fields for _, fields in selected], workers)
+        for (vertical, fields), pdf in zip(selected, pdfs):
+            archive.writestr(f"{vertical}/{fields['invoice_id']}.pdf", pdf)
+            if buffer.size >= FLUSH_BYTES:
+                yield buffer.drain()
+    yield buffer.drain()
+
+
+def merged_pdf(selected):
+    return invoice_utils.render_merged_invoices(fields for _, fields in selected)
@@ -0,0 +1,107 @@
+"""
+Content-addressed cache of monthly invoice PDFs.
+
+A rendered invoice depends only on the fields it prints (invoice number,
+month, student name and phone, bed or seat, amounts) and on is_paid, which
+picks the PAID/UNPAID watermark. content_key() is an HMAC of exactly those
+values plus RENDER_VERSION. The PDF is stored in default_storage as
+invoice_pdfs/<vertical>/<invoice pk>/<key>.pdf. The key is also the ETag, so
+a repeat download is a file read, and a client holding the current copy gets
+a 304.
+
+A change to any printed field (an is_paid flip included) gives a new key. The
+next download renders the new version and deletes the stale one. Saves and
+deletes through the ORM clear the invoice's directory straight away. Bulk
+updates such as the nightly payment reset rely on the key check instead.
+"""
+import hashlib
+import hmac
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import FileResponse, HttpResponseNotModified
+
+from core.utils.invoice_utils import generate_hostel_invoice_pdf, generate_library_invoice_pdf
+
+# Bump when the invoice layout in core.utils.invoice_utils changes, so cached files are re-rendered
+RENDER_VERSION = 1
+
+RENDERERS = {
+    'hostel': generate_hostel_invoice_pdf,
+    'library': generate_library_invoice_pdf,
+}
+
+
+def _place(vertical, invoice):
+    booking = invoice.booking
+    if vertical == 'hostel':
+        bed = booking.bed
+        return [bed.room.room_number, bed.bed_number] if bed else []
+    return [booking.seat.seat_number] if booking.seat else []
+
+
+def content_key(vertical, invoice):
+    student = invoice.booking.student
+    printed = [
+        RENDER_VERSION, vertical, invoice.invoice_id, invoice.month.isoformat(),
+        student.first_name, student.last_name, student.phone_number,
+        *_place(vertical, invoice),
+        invoice.amount, invoice.deposit, invoice.total, invoice.is_paid,
+    ]
+    # Keyed with SECRET_KEY so the storage path cannot be derived from the invoice contents
+    payload = '\x1f'.join(str(value) for value in printed).encode('utf-8')
+    return hmac.new(settings.SECRET_KEY.encode('utf-8'), payload, hashlib.sha256).hexdigest()
+
+
+def _directory(vertical, invoice_pk):
+    return f'invoice_pdfs/{vertical}/{invoice_pk}'
+
+
+def purge(vertical, invoice_pk, keep=None):
+    """Delete the cached PDFs of one invoice, except the file named `keep`."""
+    directory = _directory(vertical, invoice_pk)
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        if name != keep:
+            default_storage.delete(f'{directory}/{name}')
+
+
+def get_pdf(vertical, invoice, key=None):
+    """File object of the invoice's current PDF, rendered and stored on a cache miss."""
+    key = key or content_key(vertical, invoice)
+    name = f'{_directory(vertical, invoice.pk)}/{key}.pdf'
+    if default_storage.exists(name):
+        return default_storage.open(name, 'rb')
+
+    pdf = RENDERERS[vertical](invoice).getvalue()
+    default_storage.save(name, ContentFile(pdf))
+    purge(vertical, invoice.pk, keep=f'{key}.pdf')
+    return BytesIO(pdf)
+
+
+def invoice_response(request, vertical, invoice, filename):
+    """FileResponse of the cached PDF with an ETag; 304 when the client already has this version."""
+    key = content_key(vertical, invoice)
+    etag = f'"{key}"'
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(get_pdf(vertical, invoice, key), as_attachment=True, filename=filename,
+                                content_type='application/pdf')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def invoice_changed(sender, instance, raw=False, **kwargs):
+    """post_save/post_delete on an invoice: drop its cached PDFs once the change is committed."""
+    if raw or kwargs.get('created'):
+        return
+    vertical, pk = sender._meta.app_label, instance.pk
+    transaction.on_commit(lambda: purge(vertical, pk))
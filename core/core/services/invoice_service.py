@@ -0,0 +1,213 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from hostel.models import HostelBooking, HostelMonthlyInvoice
+from library.models import LibraryBooking, LibraryMonthlyInvoice
+from core.services import revenue_rollup
+from core.services.occupancy_service import LibraryOccupancyService
+from core.utils.invoice_utils import generate_invoice_id
+
+
+def hostel_first_month_fee(start_date):
+    """Joining-month slab: full fee up to the 10th, then 1000 up to the 20th, then 500."""
+    if start_date.day <= 10:
+        return Decimal(1500)
+    if start_date.day <= 20:
+        return Decimal(1000)
+    return Decimal(500)
+
+
+def library_first_month_fee(start_date):
+    """Joining-month slab: 600 up to the 15th, then 300."""
+    return Decimal(600) if start_date.day <= 15 else Decimal(300)
+
+
+class BookingInvoiceService:
+    """
+    Set-based month-end invoicing. Subclasses set the models, the invoice id
+    prefix and the first-month rules.
+    """
+    vertical = None
+    booking_model = None
+    invoice_model = None
+    prefix = None
+
+    @classmethod
+    def first_month_fee(cls, booking, fees):
+        """Fee for the month the booking starts in; the full monthly fee unless a subclass prorates it."""
+        return fees.monthly_fee
+
+    @classmethod
+    def first_month_deposit(cls, booking, fees, context):
+        return fees.deposit_amount
+
+    @classmethod
+    def load_context(cls, bookings):
+        """Extra per-run lookups needed by first_month_deposit(), loaded once."""
+        return {}
+
+    @classmethod
+    def plan(cls, fees, month, bookings=None):
+        """
+        Unsaved invoices for `month` for every booking in `bookings` (default: all
+        approved) that has none yet. Existing invoices are read as two id sets,
+        so the cost is a fixed number of queries regardless of booking count.
+        """
+        if bookings is None:
+            bookings = cls.booking_model.objects.filter(status='approved')
+        booking_ids = bookings.values('id')
+
+        invoiced_this_month = set(cls.invoice_model.objects.filter(
+            booking_id__in=booking_ids, month=month
+        ).values_list('booking_id', flat=True))
+        invoiced_ever = set(cls.invoice_model.objects.filter(
+            booking_id__in=booking_ids
+        ).values_list('booking_id', flat=True).distinct())
+        context = cls.load_context(bookings)
+
+        invoices = []
+        for booking in bookings.select_related('student').only('id', 'start_date', 'student__username'):
+            if booking.id in invoiced_this_month:
+                continue
+
+            if booking.id not in invoiced_ever:
+                monthly_fee = cls.first_month_fee(booking, fees)
+                deposit = cls.first_month_deposit(booking, fees, context)
+            else:
+                monthly_fee = fees.monthly_fee
+                deposit = Decimal(0)
+
+            invoices.append(cls.invoice_model(
+                booking=booking,
+                invoice_id=generate_invoice_id(cls.prefix, booking.id, month),
+                month=month,
+                amount=monthly_fee,
+                deposit=deposit,
+                total=monthly_fee + deposit,
+                invoice_expired=False
+            ))
+        return invoices
+
+    @staticmethod
+    def summarize(invoices):
+        return {
+            "count": len(invoices),
+            "amount": sum((invoice.amount for invoice in invoices), Decimal(0)),
+            "deposit": sum((invoice.deposit for invoice in invoices), Decimal(0)),
+            "total": sum((invoice.total for invoice in invoices), Decimal(0)),
+        }
+
+    @classmethod
+    def generate(cls, fees, month, bookings=None, dry_run=False):
+        """
+        Create the month's missing invoices in one transaction with a single
+        bulk INSERT (rows that appear concurrently are skipped, not duplicated).
+        `created` is how many rows the INSERT actually added; `totals` describe
+        the planned rows. With dry_run=True nothing is written and the planned
+        rows are returned.
+        """
+        invoices = cls.plan(fees, month, bookings)
+        result = {"dry_run": dry_run, "totals": cls.summarize(invoices)}
+
+        if dry_run:
+            result["invoices"] = [{
+                "booking_id": invoice.booking_id,
+                "student": invoice.booking.student.username,
+                "invoice_id": invoice.invoice_id,
+                "month": invoice.month,
+                "amount": invoice.amount,
+                "deposit": invoice.deposit,
+                "total": invoice.total,
+            } for invoice in invoices]
+            return result
+
+        result["created"] = 0
+        if not invoices:
+            return result
+
+        with transaction.atomic():
+            # bulk_create(ignore_conflicts=True) does not report skipped rows, so count around it
+            written = cls.invoice_model.objects.filter(
+                booking_id__in=[invoice.booking_id for invoice in invoices], month=month)
+            before = written.count()
+            cls.invoice_model.objects.bulk_create(invoices, batch_size=500, ignore_conflicts=True)
+            result["created"] = written.count() - before
+            if result["created"]:
+                revenue_rollup.refresh(cls.vertical, [timezone.now()])
+                transaction.on_commit(cls.after_bulk_write)
+        return result
+
+    @classmethod
+    def after_bulk_write(cls):
+        """Hook run after bulk invoice writes commit (bulk_create/update send no post_save)."""
+
+
+class HostelInvoiceService(BookingInvoiceService):
+    vertical = 'hostel'
+    booking_model = HostelBooking
+    invoice_model = HostelMonthlyInvoice
+    prefix = "HO"
+
+    @classmethod
+    def first_month_fee(cls, booking, fees):
+        return hostel_first_month_fee(booking.start_date)
+
+
+class LibraryInvoiceService(BookingInvoiceService):
+    vertical = 'library'
+    booking_model = LibraryBooking
+    invoice_model = LibraryMonthlyInvoice
+    prefix = "LI"
+
+    @classmethod
+    def first_month_fee(cls, booking, fees):
+        return library_first_month_fee(booking.start_date)
+
+    @classmethod
+    def load_context(cls, bookings):
+        # Students who also hold a hostel booking pay no library deposit
+        return {"hostel_students": set(HostelBooking.objects.filter(
+            student_id__in=bookings.values('student_id'), status__in=['approved', 'pending']
+        ).values_list('student_id', flat=True))}
+
+    @classmethod
+    def first_month_deposit(cls, booking, fees, context):
+        return Decimal(0) if booking.student_id in context["hostel_students"] else fees.deposit_amount
+
+    @classmethod
+    def after_bulk_write(cls):
+        LibraryOccupancyService.invalidate()
+
+
+PAYMENT_RESET_SERVICES = {
+    'hostel': HostelInvoiceService,
+    'library': LibraryInvoiceService,
+}
+
+
+def reset_expired_payments(verticals=('hostel', 'library'), grace_days=30, today=None):
+    """
+    Clear is_paid on invoices whose month started more than `grace_days` ago:
+    one UPDATE per table on the (is_paid, month) index, plus a refresh of the
+    revenue rollup for the generation months it touched. Returns affected rows
+    per vertical and the elapsed time in ms.
+    """
+    cutoff = (today or date.today()) - timedelta(days=grace_days)
+    started = time.monotonic()
+
+    result = {}
+    for vertical in verticals:
+        service = PAYMENT_RESET_SERVICES[vertical]
+        expired = service.invoice_model.objects.filter(is_paid=True, month__lt=cutoff)
+        with transaction.atomic():
+            months = list(expired.datetimes('generated_on', 'month'))
+            result[vertical] = expired.update(is_paid=False)
+            if result[vertical]:
+                revenue_rollup.refresh(vertical, months)
+                transaction.on_commit(service.after_bulk_write)
+
+    result["duration_ms"] = round((time.monotonic() - started) * 1000, 2)
+    return result
@@ -0,0 +1,79 @@
+"""
+Per-student Aadhaar document store.
+
+store() strips the upload's metadata first (image_utils.sanitise) and hashes
+the result, so the SHA-256 describes the bytes actually kept. If the student
+already has that document it is reused. Otherwise the bytes are saved once
+under kyc/<aa>/<sha256>.<ext>, so the same content always maps to the same
+file. The image worker only adds derivatives next to these files and never
+rewrites them, which keeps the name and KycDocument.sha256 true. Bookings reference the documents through aadhaar_front_document /
+aadhaar_back_document. Their aadhaar_*_photo fields name the same shared
+file, so existing URLs, exports and the image pipeline keep working. The
+"already uploaded" check is one indexed query on (student, kind).
+"""
+import hashlib
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from core.utils import image_utils
+from users.models import KycDocument
+
+# booking photo field -> (document kind, booking document FK)
+BOOKING_FIELDS = {
+    'aadhaar_front_photo': (KycDocument.AADHAAR_FRONT, 'aadhaar_front_document'),
+    'aadhaar_back_photo': (KycDocument.AADHAAR_BACK, 'aadhaar_back_document'),
+}
+
+
+# Pillow format -> extension of the stored file
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def storage_name(sha256, filename):
+    ext = os.path.splitext(filename or '')[1].lower() or '.jpg'
+    return f'kyc/{sha256[:2]}/{sha256}{ext}'
+
+
+def store(student, kind, upload):
+    """The student's document for this upload, saving the bytes only if no stored file has them."""
+    data, source_format = image_utils.sanitise(upload)
+    sha256 = hashlib.sha256(data).hexdigest()
+    document = KycDocument.objects.filter(student=student, kind=kind, sha256=sha256).first()
+    if document:
+        return document
+
+    filename = f'upload{EXTENSIONS[source_format]}' if source_format in EXTENSIONS else upload.name
+    name = storage_name(sha256, filename)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    document, _ = KycDocument.objects.get_or_create(student=student, kind=kind, sha256=sha256,
+                                                    defaults={'file': name})
+    return document
+
+
+def current_documents(student):
+    """{kind: latest document} for the student, in one query."""
+    documents = {}
+    for document in KycDocument.objects.filter(student=student).order_by('kind', '-id'):
+        documents.setdefault(document.kind, document)
+    return documents
+
+
+def has_aadhaar(documents):
+    return all(kind in documents for kind, _ in BOOKING_FIELDS.values())
+
+
+def attach(student, validated_data, documents):
+    """
+    Swap uploaded Aadhaar photos in booking `validated_data` for stored
+    documents; without an upload, the student's current document is used.
+    """
+    for field, (kind, document_field) in BOOKING_FIELDS.items():
+        upload = validated_data.pop(field, None)
+        document = store(student, kind, upload) if upload else documents.get(kind)
+        if document:
+            validated_data[document_field] = document
+            validated_data[field] = document.file.name
+    return validated_data
@@ -0,0 +1,375 @@
+"""
+Metrics in the Prometheus text format.
+
+Counters, gauges and histograms are recorded in this module's registry, per
+process. When METRICS_DIR is set, every process (gunicorn and Daphne workers,
+Celery prefork children) writes its values to METRICS_DIR/<pid>.json every
+METRICS_FLUSH_SECONDS and at exit, and render() sums all the files, so any
+one scrape sees the whole host. Gauges only count processes still alive;
+counters and histograms of exited processes keep counting until the
+directory is cleared, which is best done when the service is (re)deployed.
+METRICS_DIR must be local to the host, since liveness is checked by pid.
+
+/metrics requires `Authorization: Bearer <METRICS_TOKEN>` or a staff
+session. A Celery worker can serve the same text on CELERY_METRICS_PORT
+(core.signals), bound to CELERY_METRICS_BIND and behind the same token.
+
+Recorded:
+- http_request_duration_seconds / http_request_db_queries: per DRF view and
+  action, by MetricsMiddleware. Time is measured until the response is
+  returned, so a streaming body is not included.
+- celery_task_duration_seconds / celery_task_failures_total: per task, from
+  Celery's task signals.
+- websocket_connections: open seat-map sockets per channel-layer group.
+- notification_send_seconds / notification_delivery_seconds: time spent
+  sending one batch, and the time from queueing to delivery.
+"""
+import atexit
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+from core.services import query_inspector
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TASK_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 3600)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+DELIVERY_BUCKETS = (1, 5, 15, 30, 60, 300, 900, 3600, 21600)
+
+logger = logging.getLogger(__name__)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def dump(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, values, dumped):
+        """Add a dump() from another process into `values`."""
+        for key, value in dumped:
+            key = tuple(key)
+            values[key] = self._add(values[key], value) if key in values else value
+
+    def _add(self, a, b):
+        return a + b
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        lines.extend(line for key, value in sorted(values.items()) for line in self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        yield f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _changed()
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+        _changed()
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ((), 0))
+        return sum(counts)
+
+    def dump(self):
+        with self._lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+
+    def _add(self, a, b):
+        return [x + y for x, y in zip(a[0], b[0])], a[1] + b[1]
+
+    def _samples(self, key, value):
+        counts, total = value
+        cumulative = 0
+        for bound, n in zip((*self.buckets, float('inf')), counts):
+            cumulative += n
+            yield f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])} {cumulative}'
+        yield f'{self.name}_sum{_labels(self.labelnames, key)} {_number(float(total))}'
+        yield f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}'
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'API request latency.',
+                             ('view', 'method', 'status'))
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'Database queries per API request.',
+                            ('view', 'method'), buckets=QUERY_BUCKETS)
+TASK_DURATION = Histogram('celery_task_duration_seconds', 'Celery task run time.',
+                          ('task', 'state'), buckets=TASK_BUCKETS)
+TASK_FAILURES = Counter('celery_task_failures_total', 'Celery task runs that raised.', ('task', 'exception'))
+WEBSOCKET_CONNECTIONS = Gauge('websocket_connections', 'Open WebSocket connections per group.', ('group',))
+NOTIFICATION_SEND = Histogram('notification_send_seconds', 'Time to send one batch of notifications.',
+                              ('channel',))
+NOTIFICATION_DELIVERY = Histogram('notification_delivery_seconds',
+                                  'Time from queueing a notification to its delivery.', ('channel', 'result'),
+                                  buckets=DELIVERY_BUCKETS)
+
+
+# Shared store: one file per process under METRICS_DIR
+
+_flusher = {'pid': None, 'dirty': False}
+
+
+def _changed():
+    _flusher['dirty'] = True
+    if _flusher['pid'] != os.getpid() and settings.METRICS_DIR:
+        _start_flusher()
+
+
+def _start_flusher():
+    _flusher['pid'] = os.getpid()
+
+    def loop():
+        while True:
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            if _flusher['dirty']:
+                flush()
+
+    threading.Thread(target=loop, name='metrics-flush', daemon=True).start()
+    atexit.register(flush)
+
+
+def _forked():
+    # A forked child starts from its parent's numbers, which the parent already reports
+    for metric in _registry:
+        metric.clear()
+    _flusher.update(pid=None, dirty=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forked)
+
+
+def flush():
+    """Write this process's values to METRICS_DIR/<pid>.json (atomically, so readers never see half a file)."""
+    directory = settings.METRICS_DIR
+    if not directory:
+        return
+    _flusher['dirty'] = False
+    pid = os.getpid()
+    data = json.dumps({metric.name: metric.dump() for metric in _registry})
+    try:
+        os.makedirs(directory, exist_ok=True)
+        tmp = os.path.join(directory, f'{pid}.json.tmp')
+        with open(tmp, 'w') as fh:
+            fh.write(data)
+        os.replace(tmp, os.path.join(directory, f'{pid}.json'))
+    except OSError:
+        logger.exception("Could not write metrics to %s", directory)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _load_all(directory):
+    """[(pid, {metric name: dump})] for every process file in `directory`."""
+    loaded = []
+    for filename in os.listdir(directory):
+        stem, ext = os.path.splitext(filename)
+        if ext != '.json' or not stem.isdigit():
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as fh:
+                loaded.append((int(stem), json.load(fh)))
+        except (OSError, ValueError):
+            logger.warning("Skipping unreadable metrics file %s", filename)
+    return loaded
+
+
+def render():
+    if not settings.METRICS_DIR:
+        return '\n'.join(line for metric in _registry for line in metric.render()) + '\n'
+
+    flush()
+    processes = _load_all(settings.METRICS_DIR)
+    lines = []
+    for metric in _registry:
+        values = {}
+        for pid, dumps in processes:
+            if metric.kind == 'gauge' and not _alive(pid):
+                continue
+            metric.merge(values, dumps.get(metric.name, ()))
+        lines.extend(metric.render(values))
+    return '\n'.join(lines) + '\n'
+
+
+def authorized(request_token, user=None):
+    """A scrape is allowed with the METRICS_TOKEN bearer token or from a staff user; denied otherwise."""
+    token = settings.METRICS_TOKEN
+    if token and request_token and hmac.compare_digest(request_token.encode(), f'Bearer {token}'.encode()):
+        return True
+    return bool(user is not None and user.is_active and user.is_staff)
+
+
+def view_name(request):
+    """
+    'HostelBookingViewSet.list', 'MyHostelInvoicesView', 'create_export_job', ...
+    Unrouted requests share one label, so arbitrary URLs cannot grow the series.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return match.view_name or getattr(view, '__name__', 'unknown')
+    actions = getattr(view, 'actions', None)
+    if actions:
+        return f"{cls.__name__}.{actions.get(request.method.lower(), request.method.lower())}"
+    return cls.__name__
+
+
+class MetricsMiddleware:
+    """Records latency and query count of every request, labelled by view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with query_inspector.capture() as log:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view = view_name(request)
+        if view != 'metrics':
+            REQUEST_DURATION.observe(elapsed, view=view, method=request.method, status=response.status_code)
+            REQUEST_QUERIES.observe(log.count, view=view, method=request.method)
+        return response
+
+
+# Celery signal handlers, connected in core.signals
+
+_task_started = {}
+
+
+def task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.observe(time.perf_counter() - started, task=task.name, state=state or 'UNKNOWN')
+
+
+def task_failure(sender=None, exception=None, **kwargs):
+    TASK_FAILURES.inc(task=sender.name, exception=type(exception).__name__)
+
+
+class _ScrapeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if not authorized(self.headers.get('Authorization')):
+            self.send_response(401)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='127.0.0.1'):
+    """
+    Serve render() on `host`:`port` from a daemon thread (for processes without Django's URLconf, i.e.
+    workers). Every request needs the METRICS_TOKEN bearer token, so without one nothing is served.
+    """
+    if not settings.METRICS_TOKEN:
+        logger.error("Worker metrics not served: METRICS_TOKEN is not set")
+        return None
+    server = ThreadingHTTPServer((host, port), _ScrapeHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info("Metrics served on %s:%s", host, server.server_port)
+    return server
+
+
+def worker_ready(**kwargs):
+    if settings.CELERY_METRICS_PORT:
+        serve(settings.CELERY_METRICS_PORT, settings.CELERY_METRICS_BIND)
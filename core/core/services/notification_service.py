@@ -0,0 +1,209 @@
+"""
+Durable outbound notifications (email / SMS).
+
+Request code calls queue_notification() or notify_booking(), which only INSERT
+NotificationOutbox rows in the caller's transaction, so nothing is sent for a
+rolled-back change and nothing in flight is lost on restart. The
+core.tasks.drain_notification_outbox task (scheduled by Celery beat) claims due
+rows, delivers them per channel with send_batch() on a bounded, long-lived
+thread pool (so each thread reuses one SMTP connection and the shared Twilio
+session), and reschedules failures with exponential backoff. Each channel has
+a per-minute rate limit shared through the cache.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import NotificationOutbox
+from core.services import metrics
+from core.utils.email_utils import approval_email_content, rejection_email_content, send_email_messages
+from core.utils.sms_utils import deliver_sms
+
+EMAIL = 'email'
+SMS = 'sms'
+
+RATE_LIMIT_CACHE_KEY = 'notification_rate:{}:{}'
+MAX_RETRY_DELAY_SECONDS = 3600
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def approval_sms_text(student_name, booking_type):
+    return f"Hi {student_name}, your {booking_type.lower()} booking has been approved."
+
+
+def rejection_sms_text(student_name, booking_type):
+    return f"Hi {student_name}, your {booking_type.lower()} booking has been rejected."
+
+
+# template name -> builder(**context); email builders return (subject, message)
+EMAIL_TEMPLATES = {
+    'booking_approved': approval_email_content,
+    'booking_rejected': rejection_email_content,
+}
+SMS_TEMPLATES = {
+    'booking_approved': approval_sms_text,
+    'booking_rejected': rejection_sms_text,
+}
+
+
+def queue_notification(channel, recipient, template, context):
+    """Store one notification for delivery after the current transaction commits."""
+    if not recipient:
+        return None
+    return NotificationOutbox.objects.create(
+        channel=channel, recipient=recipient, template=template, context=context,
+    )
+
+
+def notify_booking(student, template, booking_type):
+    """Email the student, and SMS them when they have a phone number."""
+    context = {"student_name": student.username, "booking_type": booking_type}
+    queue_notification(EMAIL, student.email, template, context)
+    if student.phone_number:
+        queue_notification(SMS, student.phone_number, template, context)
+
+
+def _render(channel, template, context):
+    if channel == EMAIL:
+        return EMAIL_TEMPLATES[template](**context)
+    return SMS_TEMPLATES[template](**context)
+
+
+def send_batch(channel, items):
+    """
+    Send (recipient, template, context) tuples over one pooled SMTP connection
+    or the shared SMS session. Returns one error string (or None) per item.
+    """
+    start = time.perf_counter()
+    errors = [None] * len(items)
+    rendered = []
+    for i, (recipient, template, context) in enumerate(items):
+        try:
+            rendered.append((i, recipient, _render(channel, template, context)))
+        except Exception as e:
+            errors[i] = f"Template error: {e!r}"
+
+    if channel == EMAIL:
+        messages = [EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [recipient])
+                    for _, recipient, (subject, message) in rendered]
+        for (i, _, _), error in zip(rendered, send_email_messages(messages)):
+            errors[i] = error
+    else:
+        for i, recipient, text in rendered:
+            try:
+                deliver_sms(recipient, text)
+            except Exception as e:
+                errors[i] = str(e) or repr(e)
+    metrics.NOTIFICATION_SEND.observe(time.perf_counter() - start, channel=channel)
+    return errors
+
+
+def deliver(notification):
+    """Send one notification; raises on failure."""
+    error = send_batch(notification.channel, [(notification.recipient, notification.template, notification.context)])[0]
+    if error:
+        raise RuntimeError(error)
+
+
+def _get_executor():
+    # Long-lived so worker threads keep their SMTP connections between drains
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.NOTIFICATION_OUTBOX_CONCURRENCY,
+                                           thread_name_prefix='notification-outbox')
+        return _executor
+
+
+def _send_rows(rows):
+    return send_batch(rows[0].channel, [(n.recipient, n.template, n.context) for n in rows])
+
+
+def _take_rate_slot(channel):
+    limit = settings.NOTIFICATION_RATE_LIMITS.get(channel)
+    if not limit:
+        return True
+    key = RATE_LIMIT_CACHE_KEY.format(channel, int(time.time() // 60))
+    cache.add(key, 0, 120)
+    return cache.incr(key) <= limit
+
+
+def claim_due(batch_size):
+    """Mark up to `batch_size` due rows as sending for this worker and return them."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.NOTIFICATION_OUTBOX_CLAIM_TIMEOUT)
+    due = Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', claimed_at__lt=stale)
+
+    ids = list(NotificationOutbox.objects.filter(due)
+               .order_by('next_attempt_at', 'id')
+               .values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    NotificationOutbox.objects.filter(due, id__in=ids).update(status='sending', claimed_at=now, claim_token=token)
+    return list(NotificationOutbox.objects.filter(claim_token=token).order_by('id'))
+
+
+def drain(batch_size=None):
+    """Deliver one batch of due notifications. Returns counts per outcome."""
+    batch_size = batch_size or settings.NOTIFICATION_OUTBOX_BATCH_SIZE
+    claimed = claim_due(batch_size)
+    result = {"claimed": len(claimed), "sent": 0, "retried": 0, "failed": 0, "deferred": 0}
+
+    ready, deferred = [], []
+    for notification in claimed:
+        (ready if _take_rate_slot(notification.channel) else deferred).append(notification)
+
+    if deferred:
+        next_window = timezone.now() + timedelta(seconds=60 - time.time() % 60)
+        NotificationOutbox.objects.filter(id__in=[n.id for n in deferred]).update(
+            status='pending', next_attempt_at=next_window, claim_token='',
+        )
+        result["deferred"] = len(deferred)
+
+    # Emails go as one batch over a single connection; SMS is spread across the pool
+    workers = settings.NOTIFICATION_OUTBOX_CONCURRENCY
+    emails = [n for n in ready if n.channel == EMAIL]
+    texts = [n for n in ready if n.channel == SMS]
+    jobs = ([emails] if emails else []) + [texts[i::workers] for i in range(workers) if texts[i::workers]]
+    results = list(_get_executor().map(_send_rows, jobs))
+    outcomes = [(n, error) for job, errors in zip(jobs, results) for n, error in zip(job, errors)]
+
+    now = timezone.now()
+    for notification, error in outcomes:
+        notification.attempts += 1
+        notification.claim_token = ''
+        if error is None:
+            notification.status = 'sent'
+            notification.sent_at = now
+            notification.last_error = ''
+            result["sent"] += 1
+            metrics.NOTIFICATION_DELIVERY.observe((now - notification.created_at).total_seconds(),
+                                                  channel=notification.channel, result='sent')
+        elif notification.attempts >= settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS:
+            notification.status = 'failed'
+            notification.last_error = error
+            result["failed"] += 1
+            metrics.NOTIFICATION_DELIVERY.observe((now - notification.created_at).total_seconds(),
+                                                  channel=notification.channel, result='failed')
+        else:
+            delay = settings.NOTIFICATION_OUTBOX_RETRY_BASE_SECONDS * 2 ** (notification.attempts - 1)
+            notification.status = 'pending'
+            notification.next_attempt_at = now + timedelta(seconds=min(delay, MAX_RETRY_DELAY_SECONDS))
+            notification.last_error = error
+            result["retried"] += 1
+        notification.save(update_fields=['attempts', 'claim_token', 'status', 'sent_at',
+                                         'last_error', 'next_attempt_at'])
+
+    return result
@@ -0,0 +1,282 @@
+"""
+Denormalised occupancy counters behind the dashboard and booking stats endpoints.
+
+Each vertical keeps OccupancyCounter rows for bookings per status, total/booked
+beds or seats, resources with a pending booking and bookings created per day.
+The signal handlers below (connected in hostel/signals.py and
+library/signals.py) adjust them with F() updates inside the transaction that
+changes the booking or resource, so a rolled-back change never moves a counter.
+The previous values are read in pre_save, under a row lock when the save runs
+in a transaction, and a booking entering or leaving `pending` also locks its
+bed/seat row, so two transactions cannot both count the same resource. Saves in
+autocommit mode have no transaction to hold the lock; reconcile() corrects any
+drift they cause. Code that writes with queryset.update() sends no signals and
+must call adjust() itself. The counters are seeded once by migration (core
+0015); reconcile() (reconcile_occupancy_counters) recomputes everything from
+scratch and reports drift.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.models import OccupancyCounter
+from hostel.models import HostelBed, HostelBooking
+from library.models import LibraryBooking, LibrarySeat
+
+VERTICALS = {
+    'hostel': (HostelBooking, HostelBed, 'bed_id'),
+    'library': (LibraryBooking, LibrarySeat, 'seat_id'),
+}
+
+TOTAL = 'resources:total'
+BOOKED = 'resources:booked'
+PENDING = 'resources:pending'
+CREATED_PREFIX = 'created:'
+TREND_DAYS = 7  # weekly trend counts today and the 7 days before it
+
+
+def booking_key(status):
+    return f'booking:{status}'
+
+
+def created_key(day):
+    return f'{CREATED_PREFIX}{day.isoformat()}'
+
+
+def _in_trend_window(day, today=None):
+    today = today or timezone.localdate()
+    return day >= today - timedelta(days=TREND_DAYS)
+
+
+def compute(vertical, today=None):
+    """Every counter for `vertical` recomputed from the booking and resource tables."""
+    booking_model, resource_model, resource_field = VERTICALS[vertical]
+    today = today or timezone.localdate()
+
+    values = {booking_key(status): 0 for status, _ in booking_model._meta.get_field('status').choices}
+    values.update((booking_key(row['status']), row['n'])
+                  for row in booking_model.objects.values('status').annotate(n=Count('id')).order_by())
+
+    resources = resource_model.objects.aggregate(total=Count('id'), booked=Count('id', filter=Q(is_booked=True)))
+    values[TOTAL] = resources['total']
+    values[BOOKED] = resources['booked']
+    values[PENDING] = (booking_model.objects.filter(status='pending', **{f'{resource_field}__isnull': False})
+                       .values(resource_field).distinct().count())
+
+    created = (booking_model.objects.filter(created_at__date__gte=today - timedelta(days=TREND_DAYS))
+               .annotate(day=TruncDate('created_at')).values('day').annotate(n=Count('id')).order_by())
+    for row in created:
+        values[created_key(row['day'])] = row['n']
+    return values
+
+
+def _store(vertical, values):
+    """Replace the stored counters for `vertical` with `values`."""
+    with transaction.atomic():
+        OccupancyCounter.objects.filter(vertical=vertical).delete()
+        OccupancyCounter.objects.bulk_create(
+            OccupancyCounter(vertical=vertical, key=key, value=value) for key, value in values.items()
+        )
+
+
+def read(vertical):
+    """All counters for `vertical` as a dict, in one query. Missing keys are zero."""
+    return dict(OccupancyCounter.objects.filter(vertical=vertical).values_list('key', 'value'))
+
+
+def adjust(vertical, deltas):
+    """
+    Add `deltas` ({key: +/-n}) to the stored counters with one UPDATE. Keys without a row
+    yet (first booking of the day, a status never seen before) are inserted at zero and then
+    updated the same way, so two transactions creating the same key both count. The counters
+    are seeded by migration (core 0015) and re-seeded by reconcile(), never on this path.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    def shift(keys):
+        return Case(*(When(key=key, then=Value(deltas[key])) for key in keys), default=Value(0))
+
+    counters = OccupancyCounter.objects.filter(vertical=vertical, key__in=deltas)
+    if counters.update(value=F('value') + shift(deltas)) == len(deltas):
+        return
+    missing = set(deltas) - set(counters.values_list('key', flat=True))
+    OccupancyCounter.objects.bulk_create(
+        [OccupancyCounter(vertical=vertical, key=key, value=0) for key in sorted(missing)],
+        ignore_conflicts=True,
+    )
+    OccupancyCounter.objects.filter(vertical=vertical, key__in=missing).update(value=F('value') + shift(missing))
+
+
+def dashboard(vertical, today=None):
+    today = today or timezone.localdate()
+    counters = read(vertical)
+    total, booked, pending = counters.get(TOTAL, 0), counters.get(BOOKED, 0), counters.get(PENDING, 0)
+    return {
+        "total": total,
+        "booked": booked,
+        "pending": pending,
+        "available": total - booked - pending,
+        "today_bookings": counters.get(created_key(today), 0),
+        "weekly_bookings": sum(counters.get(created_key(today - timedelta(days=i)), 0)
+                               for i in range(TREND_DAYS + 1)),
+    }
+
+
+def booking_stats(vertical):
+    counters = read(vertical)
+    approved = counters.get(booking_key('approved'), 0)
+    return {
+        'total': approved,
+        'approved': approved,
+        'pending': counters.get(booking_key('pending'), 0),
+        'rejected': counters.get(booking_key('rejected'), 0),
+        'expired': counters.get(booking_key('expired'), 0),
+    }
+
+
+def reconcile(verticals=None, dry_run=False):
+    """
+    Recompute the counters and return the drift per vertical as
+    {key: (stored, actual)}. Unless dry_run, the stored counters are replaced
+    (which also prunes day counters older than the trend window).
+    """
+    today = timezone.localdate()
+    oldest_day = created_key(today - timedelta(days=TREND_DAYS))
+    result = {}
+    for vertical in verticals or VERTICALS:
+        with transaction.atomic():
+            stored = dict(OccupancyCounter.objects.select_for_update()
+                          .filter(vertical=vertical).values_list('key', 'value'))
+            actual = compute(vertical, today)
+            # Day counters that fell out of the trend window are pruned, not drift
+            stored = {key: value for key, value in stored.items()
+                      if not (key.startswith(CREATED_PREFIX) and key < oldest_day)}
+            result[vertical] = {
+                key: (stored.get(key, 0), actual.get(key, 0))
+                for key in sorted(set(stored) | set(actual))
+                if stored.get(key, 0) != actual.get(key, 0)
+            }
+            if not dry_run:
+                _store(vertical, actual)
+    return result
+
+
+# Signal handlers
+
+def _vertical_of(model):
+    for vertical, (booking_model, resource_model, resource_field) in VERTICALS.items():
+        if model in (booking_model, resource_model):
+            return vertical, model is booking_model, resource_field
+
+
+def _tracked_fields(model):
+    vertical, is_booking, resource_field = _vertical_of(model)
+    return ('status', resource_field) if is_booking else ('is_booked',)
+
+
+def _locked(queryset):
+    """select_for_update() inside a transaction; in autocommit there is nothing to hold the lock."""
+    return queryset.select_for_update() if transaction.get_connection(queryset.db).in_atomic_block else queryset
+
+
+def _has_pending(booking_model, resource_field, resource_id, exclude=None):
+    return (booking_model.objects.filter(status='pending', **{resource_field: resource_id})
+            .exclude(pk=exclude).exists())
+
+
+def capture_state(sender, instance, raw=False, **kwargs):
+    """
+    pre_save: read the stored values the save is about to replace. For a booking entering or
+    leaving `pending`, lock its bed/seat rows and note whether they hold other pending bookings.
+    """
+    if raw:
+        return
+    vertical, is_booking, resource_field = _vertical_of(sender)
+    fields = _tracked_fields(sender)
+    old = {}
+    if not instance._state.adding and instance.pk is not None:
+        old = _locked(sender.objects.filter(pk=instance.pk)).values(*fields).first() or {}
+    instance._occupancy_state = old
+    if not is_booking:
+        return
+
+    old_status, old_resource = old.get('status'), old.get(resource_field)
+    new_status, new_resource = instance.status, getattr(instance, resource_field)
+    touched = set()
+    if (old_status, old_resource) != (new_status, new_resource):
+        touched = {resource for status, resource in ((old_status, old_resource), (new_status, new_resource))
+                   if status == 'pending' and resource}
+    if touched:
+        resource_model = VERTICALS[vertical][1]
+        list(_locked(resource_model.objects.filter(id__in=touched).order_by('id')).values_list('id', flat=True))
+    instance._occupancy_other_pending = {resource: _has_pending(sender, resource_field, resource, exclude=instance.pk)
+                                         for resource in sorted(touched)}
+
+
+def booking_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    vertical, _, resource_field = _vertical_of(sender)
+    old = instance.__dict__.pop('_occupancy_state', {})
+    other_pending = instance.__dict__.pop('_occupancy_other_pending', {})
+    old_status, old_resource = old.get('status'), old.get(resource_field)
+    new_status, new_resource = instance.status, getattr(instance, resource_field)
+
+    deltas = Counter()
+    if old_status != new_status:
+        if old_status:
+            deltas[booking_key(old_status)] -= 1
+        deltas[booking_key(new_status)] += 1
+    if created and instance.created_at and _in_trend_window(timezone.localdate(instance.created_at)):
+        deltas[created_key(timezone.localdate(instance.created_at))] += 1
+
+    # resources:pending counts distinct resources with at least one pending booking
+    if (old_status, old_resource) != (new_status, new_resource):
+        if old_status == 'pending' and old_resource and not other_pending.get(old_resource, True):
+            deltas[PENDING] -= 1
+        if new_status == 'pending' and new_resource and not other_pending.get(new_resource, True):
+            deltas[PENDING] += 1
+
+    adjust(vertical, deltas)
+
+
+def lock_pending_resource(sender, instance, **kwargs):
+    """pre_delete: deleting a pending booking locks its bed/seat, as saves do."""
+    vertical, _, resource_field = _vertical_of(sender)
+    resource_id = getattr(instance, resource_field)
+    if instance.status == 'pending' and resource_id:
+        list(_locked(VERTICALS[vertical][1].objects.filter(id=resource_id)).values_list('id', flat=True))
+
+
+def booking_deleted(sender, instance, **kwargs):
+    vertical, _, resource_field = _vertical_of(sender)
+    resource_id = getattr(instance, resource_field)
+
+    deltas = Counter({booking_key(instance.status): -1})
+    if instance.created_at and _in_trend_window(timezone.localdate(instance.created_at)):
+        deltas[created_key(timezone.localdate(instance.created_at))] -= 1
+    if instance.status == 'pending' and resource_id and not _has_pending(sender, resource_field, resource_id):
+        deltas[PENDING] -= 1
+    adjust(vertical, deltas)
+
+
+def resource_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    vertical = _vertical_of(sender)[0]
+    if created:
+        adjust(vertical, {TOTAL: 1, BOOKED: int(instance.is_booked)})
+    else:
+        was_booked = instance.__dict__.pop('_occupancy_state', {}).get('is_booked')
+        if was_booked is not None and bool(was_booked) != bool(instance.is_booked):
+            adjust(vertical, {BOOKED: 1 if instance.is_booked else -1})
+
+
+def resource_deleted(sender, instance, **kwargs):
+    adjust(_vertical_of(sender)[0], {TOTAL: -1, BOOKED: -int(instance.is_booked)})
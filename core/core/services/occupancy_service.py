@@ -0,0 +1,167 @@
+import hashlib
+import json
+from calendar import monthrange
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.http import parse_etags
+from hostel.models import HostelBed, HostelBooking, HostelMonthlyInvoice
+from library.models import LibrarySeat, LibraryBooking, LibraryMonthlyInvoice
+
+
+def invoice_flags(invoice_month, invoice_paid, today=None):
+    """
+    Returns (is_paid, invoice_expired) for the latest invoice of a booking.
+    An invoice only counts while today is inside its calendar month.
+    """
+    if invoice_month is None:
+        return False, True
+
+    today = today or date.today()
+    last_day = monthrange(invoice_month.year, invoice_month.month)[1]
+    invoice_end = invoice_month.replace(day=last_day)
+
+    if today <= invoice_end:
+        return invoice_paid, not invoice_paid
+    return False, True
+
+
+def get_occupancy(obj, today=None):
+    """Live-map fields for a bed/seat annotated by get_beds()/get_seats()."""
+    status = "available"
+    booking_id = None
+    is_paid = False
+    invoice_expired = True
+
+    if obj.latest_booking_status == "pending":
+        status = "pending"
+        booking_id = obj.latest_booking_id
+    elif obj.latest_booking_status == "approved":
+        status = "booked"
+        booking_id = obj.latest_booking_id
+        is_paid, invoice_expired = invoice_flags(obj.latest_invoice_month, obj.latest_invoice_paid, today)
+
+    return {
+        "status": status,
+        "booking_id": booking_id,
+        "is_paid": is_paid,
+        "invoice_expired": invoice_expired,
+    }
+
+
+class HostelOccupancyService:
+    @staticmethod
+    def get_beds():
+        """
+        All beds annotated with their latest booking, that booking's latest invoice
+        and the pending request count, so the live map is built from one query.
+        """
+        latest_booking = HostelBooking.objects.filter(bed=OuterRef('pk')).order_by('-created_at', '-id')
+        latest_invoice = HostelMonthlyInvoice.objects.filter(
+            booking_id=OuterRef('latest_booking_id')
+        ).order_by('-month')
+        pending_count = (
+            HostelBooking.objects.filter(bed=OuterRef('pk'), status='pending')
+            .order_by().values('bed').annotate(c=Count('id')).values('c')
+        )
+
+        return (
+            HostelBed.objects.select_related('room')
+            .annotate(
+                latest_booking_id=Subquery(latest_booking.values('id')[:1]),
+                latest_booking_status=Subquery(latest_booking.values('status')[:1]),
+            )
+            .annotate(
+                latest_invoice_month=Subquery(latest_invoice.values('month')[:1]),
+                latest_invoice_paid=Subquery(latest_invoice.values('is_paid')[:1]),
+                pending_bookings=Coalesce(Subquery(pending_count), 0),
+            )
+            .order_by('id')
+        )
+
+    @staticmethod
+    def get_live_map(serializer):
+        """Serialized beds (a many=True serializer over get_beds()) extended with occupancy."""
+        extended_data = []
+        for bed, base in zip(serializer.instance, serializer.data):
+            base.update(get_occupancy(bed))
+            extended_data.append(base)
+        return extended_data
+
+
+class LibraryOccupancyService:
+    VERSION_CACHE_KEY = 'library_live_map:version'
+    SNAPSHOT_CACHE_KEY = 'library_live_map:snapshot:{}:{}'
+
+    @staticmethod
+    def get_seats():
+        """Seat counterpart of HostelOccupancyService.get_beds()."""
+        latest_booking = LibraryBooking.objects.filter(seat=OuterRef('pk')).order_by('-created_at', '-id')
+        latest_invoice = LibraryMonthlyInvoice.objects.filter(
+            booking_id=OuterRef('latest_booking_id')
+        ).order_by('-month')
+        pending_count = (
+            LibraryBooking.objects.filter(seat=OuterRef('pk'), status='pending')
+            .order_by().values('seat').annotate(c=Count('id')).values('c')
+        )
+
+        return (
+            LibrarySeat.objects
+            .annotate(
+                latest_booking_id=Subquery(latest_booking.values('id')[:1]),
+                latest_booking_status=Subquery(latest_booking.values('status')[:1]),
+            )
+            .annotate(
+                latest_invoice_month=Subquery(latest_invoice.values('month')[:1]),
+                latest_invoice_paid=Subquery(latest_invoice.values('is_paid')[:1]),
+                pending_bookings=Coalesce(Subquery(pending_count), 0),
+            )
+            .order_by('id')
+        )
+
+    @staticmethod
+    def get_live_map(serializer):
+        extended_data = []
+        for seat, base in zip(serializer.instance, serializer.data):
+            base.update(get_occupancy(seat))
+            extended_data.append(base)
+        return extended_data
+
+    @classmethod
+    def get_snapshot(cls, build_serializer):
+        """
+        Shared live-map snapshot: {"etag", "data"}.
+        Cached per version and day (paid/expired flags depend on today's date). A seat, booking
+        or invoice change bumps the version (see invalidate()); LIVE_MAP_SNAPSHOT_SECONDS bounds
+        how long an entry can outlive a missed invalidation.
+        """
+        # Read the version before the data, so a change made meanwhile is never cached under it
+        key = cls.SNAPSHOT_CACHE_KEY.format(cache.get(cls.VERSION_CACHE_KEY, 0), date.today().isoformat())
+        snapshot = cache.get(key)
+        if snapshot:
+            return snapshot
+
+        data = cls.get_live_map(build_serializer(cls.get_seats()))
+        payload = json.dumps(data, sort_keys=True, default=str)
+        snapshot = {
+            "etag": '"%s"' % hashlib.md5(payload.encode()).hexdigest(),
+            "data": data,
+        }
+        cache.set(key, snapshot, settings.LIVE_MAP_SNAPSHOT_SECONDS)
+        return snapshot
+
+    @staticmethod
+    def is_not_modified(request, snapshot):
+        if_none_match = request.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        etags = parse_etags(if_none_match)
+        return '*' in etags or snapshot['etag'] in etags
+
+    @classmethod
+    def invalidate(cls):
+        cache.add(cls.VERSION_CACHE_KEY, 0, None)
+        cache.incr(cls.VERSION_CACHE_KEY)
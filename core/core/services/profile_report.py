@@ -0,0 +1,91 @@
+"""
+Student profile report (download_student_profile_pdf).
+
+load() reads everything the report shows in a fixed five queries: the
+student, bookings with their bed/room or seat joined in, complaints and
+reviews. The photos are embedded as the upload worker's pre-scaled
+thumbnails (core.utils.image_utils), with a placeholder until it has run.
+The rendered PDF is cached per student under a version number, kept in the
+shared default cache. Any change to the student's bookings, complaints,
+reviews or profile bumps the version after commit; bulk updates call
+invalidate_many() themselves. The next request renders afresh
+and the old entry simply ages out of the cache.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.models import Complaint, Review
+from core.utils.pdf_utils import generate_student_profile_pdf
+from hostel.models import HostelBooking
+from library.models import LibraryBooking
+from users.models import User
+
+VERSION_KEY = 'profile_report:version:{}'
+PDF_KEY = 'profile_report:pdf:{}:{}'
+
+
+def version(student_id):
+    return cache.get(VERSION_KEY.format(student_id), 0)
+
+
+def invalidate(student_id):
+    key = VERSION_KEY.format(student_id)
+    cache.add(key, 0, None)
+    cache.incr(key)
+
+
+def invalidate_many(student_ids):
+    """For set-based changes (queryset.update()), which send no signals."""
+    for student_id in student_ids:
+        invalidate(student_id)
+
+
+def load(student):
+    return {
+        'hostel_bookings': list(HostelBooking.objects.filter(student=student)
+                                .select_related('bed__room').order_by('id')),
+        'library_bookings': list(LibraryBooking.objects.filter(student=student)
+                                 .select_related('seat').order_by('id')),
+        'complaints': list(Complaint.objects.filter(submitted_by=student).order_by('id')),
+        'reviews': list(Review.objects.filter(name=student.username).order_by('id')),
+    }
+
+
+def get_pdf(student):
+    """PDF bytes of the student's profile report, rendered only when something changed."""
+    # Read the version before the data, so a change made meanwhile is never cached under it
+    key = PDF_KEY.format(student.pk, version(student.pk))
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = generate_student_profile_pdf(student, **load(student)).getvalue()
+        cache.set(key, pdf, settings.PROFILE_REPORT_CACHE_SECONDS)
+    return pdf
+
+
+def _invalidate_on_commit(student_id):
+    if student_id:
+        transaction.on_commit(lambda: invalidate(student_id))
+
+
+def booking_changed(sender, instance, raw=False, **kwargs):
+    """post_save/post_delete on a hostel or library booking."""
+    if not raw:
+        _invalidate_on_commit(instance.student_id)
+
+
+def complaint_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_on_commit(instance.submitted_by_id)
+
+
+def review_changed(sender, instance, raw=False, **kwargs):
+    # Reviews name their author by username
+    if not raw:
+        _invalidate_on_commit(User.objects.filter(username=instance.name).values_list('id', flat=True).first())
+
+
+def student_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logins only touch last_login, which the report does not show
+    if not raw and set(update_fields or ()) != {'last_login'}:
+        _invalidate_on_commit(instance.pk)
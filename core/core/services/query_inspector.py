@@ -0,0 +1,123 @@
+"""
+Per-request database instrumentation.
+
+capture() puts an execute wrapper on the current thread's database
+connections and records each statement's shape and duration. The shape is
+the SQL as Django sends it, with parameters still as placeholders and
+IN (%s, %s, ...) lists collapsed. A lookup repeated once per row, such as a
+SerializerMethodField reaching through a foreign key, therefore shows up as
+one shape with a high count. That is the N+1 signature.
+
+QueryInspectorMiddleware runs when QUERY_INSPECTOR is on (default: DEBUG).
+It adds X-DB-Queries and Server-Timing headers to every response. Requests
+that repeat a shape QUERY_REPEAT_THRESHOLD times or more also get
+X-DB-Repeated-Queries, and the shapes are logged as a warning. Queries run while a
+streaming response is consumed happen after the headers are sent, so they
+are not counted.
+
+Tests declare per-endpoint budgets with query_budget().
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def shape(sql):
+    return IN_LIST.sub('IN (...)', sql)
+
+
+class QueryLog:
+    """Execute wrapper that records (shape, seconds) for every statement."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((shape(sql), time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration_ms(self):
+        return sum(seconds for _, seconds in self.queries) * 1000
+
+    def repeated(self, threshold):
+        """[(shape, times)] for shapes run at least `threshold` times, most frequent first."""
+        counts = Counter(sql for sql, _ in self.queries)
+        return [(sql, times) for sql, times in counts.most_common() if times >= threshold]
+
+
+@contextmanager
+def capture():
+    log = QueryLog()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
+
+
+def describe(repeated, width=200):
+    return '\n'.join(f"  {times}x {sql[:width]}" for sql, times in repeated)
+
+
+@contextmanager
+def query_budget(max_queries, max_repeats=None):
+    """
+    Fail with AssertionError when the block runs more than `max_queries`
+    statements, or one shape more than `max_repeats` times (default: just
+    under QUERY_REPEAT_THRESHOLD). Unlike assertNumQueries the budget is a
+    ceiling, so it does not need updating each time a query is saved.
+    """
+    if max_repeats is None:
+        max_repeats = settings.QUERY_REPEAT_THRESHOLD - 1
+    with capture() as log:
+        yield log
+
+    problems = []
+    if log.count > max_queries:
+        problems.append(f"{log.count} queries, budget is {max_queries}")
+    repeated = log.repeated(max_repeats + 1)
+    if repeated:
+        problems.append(f"repeated queries (N+1?), at most {max_repeats} allowed:\n{describe(repeated)}")
+    if problems:
+        raise AssertionError('\n'.join(problems))
+
+
+class QueryInspectorMiddleware:
+    """Adds the query count and DB time of each request to its response headers."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_INSPECTOR:
+            return self.get_response(request)
+
+        with capture() as log:
+            response = self.get_response(request)
+
+        response['X-DB-Queries'] = str(log.count)
+        timing = f'db;dur={log.duration_ms:.1f};desc="{log.count} queries"'
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = f"{existing}, {timing}" if existing else timing
+
+        repeated = log.repeated(settings.QUERY_REPEAT_THRESHOLD)
+        if repeated:
+            response['X-DB-Repeated-Queries'] = str(sum(times for _, times in repeated))
+            logger.warning("Repeated queries in %s %s:\n%s", request.method, request.path, describe(repeated))
+        return response
@@ -0,0 +1,135 @@
+"""
+Monthly revenue rollup.
+
+RevenueRollup keeps paid/pending totals and counts per vertical and calendar
+month of invoice generation. Rows are refreshed for just the months touched by
+a write, inside the writing transaction: invoice post_save/post_delete signals
+(hostel/signals.py, library/signals.py) cover single saves, and the bulk paths
+in invoice_service call refresh() themselves. rebuild() (and the
+rebuild_revenue_rollup command) recomputes the whole table.
+"""
+import calendar
+from datetime import date, datetime
+
+from django.db import transaction
+from django.db.models import Count, DateField, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from core.models import RevenueRollup
+from hostel.models import HostelMonthlyInvoice
+from library.models import LibraryMonthlyInvoice
+
+VERTICALS = {
+    'hostel': HostelMonthlyInvoice,
+    'library': LibraryMonthlyInvoice,
+}
+
+ROLLUP_AGGREGATES = {
+    "paid_total": Sum('total', filter=Q(is_paid=True)),
+    "pending_total": Sum('total', filter=Q(is_paid=False)),
+    "paid_count": Count('id', filter=Q(is_paid=True)),
+    "pending_count": Count('id', filter=Q(is_paid=False)),
+}
+
+
+def month_of(value):
+    """First day of the local calendar month of a datetime or date."""
+    if hasattr(value, 'tzinfo') and timezone.is_aware(value):
+        value = timezone.localdate(value)
+    return date(value.year, value.month, 1)
+
+
+def whole_months(start_date=None, end_date=None):
+    """
+    (first_month, last_month) when the range is made of whole calendar months,
+    (None, None) when no full range is given (reports ignore half-open ranges),
+    or None when the rollup cannot answer it.
+    """
+    if not (start_date and end_date):
+        return None, None
+    try:
+        start, end = date.fromisoformat(str(start_date)), date.fromisoformat(str(end_date))
+    except ValueError:
+        return None
+    if start.day != 1 or end.day != calendar.monthrange(end.year, end.month)[1] or start > end:
+        return None
+    return start, month_of(end)
+
+
+def _month_bounds(month):
+    following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return tuple(timezone.make_aware(datetime(day.year, day.month, 1)) for day in (month, following))
+
+
+def _monthly_rows(invoice_model, months=None):
+    qs = invoice_model.objects.all()
+    if months is not None:
+        # Plain ranges so the generated_on index is used
+        in_months = Q()
+        for month in months:
+            start, end = _month_bounds(month)
+            in_months |= Q(generated_on__gte=start, generated_on__lt=end)
+        qs = qs.filter(in_months)
+    return (qs.annotate(period=Trunc('generated_on', 'month', output_field=DateField()))
+            .values('period').annotate(**ROLLUP_AGGREGATES).order_by('period'))
+
+
+def refresh(vertical, months):
+    """
+    Recompute the rollup rows of `vertical` for the given month starts. The month rows are
+    created if missing and locked before the invoices are aggregated, so concurrent refreshes
+    of one month run one after the other and the later one sees the earlier one's invoices.
+    """
+    months = sorted({month_of(month) for month in months})
+    if not months:
+        return
+    with transaction.atomic(savepoint=False):
+        RevenueRollup.objects.bulk_create([RevenueRollup(vertical=vertical, month=month) for month in months],
+                                          ignore_conflicts=True)
+        rollups = {rollup.month: rollup for rollup in RevenueRollup.objects.select_for_update()
+                   .filter(vertical=vertical, month__in=months).order_by('month')}
+
+        for row in _monthly_rows(VERTICALS[vertical], months):
+            RevenueRollup.objects.filter(id=rollups.pop(row['period']).id).update(
+                refreshed_at=timezone.now(), **{key: row[key] or 0 for key in ROLLUP_AGGREGATES})
+        if rollups:
+            RevenueRollup.objects.filter(id__in=[rollup.id for rollup in rollups.values()]).delete()
+
+
+def rebuild(verticals=None):
+    """Recompute the whole rollup. Returns the number of rows written per vertical."""
+    result = {}
+    for vertical in verticals or VERTICALS:
+        with transaction.atomic():
+            RevenueRollup.objects.filter(vertical=vertical).delete()
+            rows = [RevenueRollup(vertical=vertical, month=row['period'],
+                                  **{key: row[key] or 0 for key in ROLLUP_AGGREGATES})
+                    for row in _monthly_rows(VERTICALS[vertical])]
+            RevenueRollup.objects.bulk_create(rows)
+        result[vertical] = len(rows)
+    return result
+
+
+def read(verticals, first_month=None, last_month=None):
+    """Rollup rows per vertical, month-ordered, for the given month range, in one query."""
+    qs = RevenueRollup.objects.filter(vertical__in=verticals)
+    if first_month and last_month:
+        qs = qs.filter(month__range=[first_month, last_month])
+    rows = {vertical: [] for vertical in verticals}
+    for rollup in qs.order_by('month'):
+        rows[rollup.vertical].append(rollup)
+    return rows
+
+
+# Signal handlers
+
+def _vertical_of(model):
+    return next(vertical for vertical, invoice_model in VERTICALS.items() if invoice_model is model)
+
+
+def invoice_changed(sender, instance, raw=False, **kwargs):
+    """post_save/post_delete on an invoice: refresh its month in the same transaction."""
+    if raw or not instance.generated_on:
+        return
+    refresh(_vertical_of(sender), [instance.generated_on])
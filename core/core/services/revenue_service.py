@@ -1,46 +1,143 @@
-from django.db.models import Sum
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Count, DateField, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from core.services import revenue_rollup
 from hostel.models import HostelMonthlyInvoice
 from library.models import LibraryMonthlyInvoice
 
-class HostelRevenueService:
-    @staticmethod
-    def get_summary(start_date=None, end_date=None):
-        qs = HostelMonthlyInvoice.objects.all()
+GROUP_BY_CHOICES = ('month', 'week', 'day')
+SUMMARY_KEYS = ("total_paid", "total_pending", "count_paid", "count_pending")
+
+
+def _empty_summary():
+    return dict.fromkeys(SUMMARY_KEYS, 0)
+
+
+def _add(target, summary):
+    for key in SUMMARY_KEYS:
+        target[key] += summary[key]
+    return target
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def use_rollup(months, group_by):
+    """Whole-month (or unbounded) ranges without a finer grouping are served from RevenueRollup."""
+    return months is not None and group_by in (None, 'month')
+
+
+class InvoiceRevenueService:
+    """
+    Paid/pending totals for one invoice table. Whole-month ranges are read from
+    the monthly RevenueRollup; anything else is computed with conditional
+    aggregation: the summary is one query, and with `group_by` the per-period
+    series and the summary come from the same grouped query.
+    """
+    vertical = None
+    invoice_model = None
+
+    AGGREGATES = {
+        "total_paid": Sum('total', filter=Q(is_paid=True)),
+        "total_pending": Sum('total', filter=Q(is_paid=False)),
+        "count_paid": Count('id', filter=Q(is_paid=True)),
+        "count_pending": Count('id', filter=Q(is_paid=False)),
+    }
+
+    @classmethod
+    def get_queryset(cls, start_date=None, end_date=None):
+        qs = cls.invoice_model.objects.all()
         if start_date and end_date:
-            qs = qs.filter(generated_on__range=[start_date, end_date])
-        return {
-            "total_paid": qs.filter(is_paid=True).aggregate(Sum('total'))['total__sum'] or 0,
-            "total_pending": qs.filter(is_paid=False).aggregate(Sum('total'))['total__sum'] or 0,
-            "count_paid": qs.filter(is_paid=True).count(),
-            "count_pending": qs.filter(is_paid=False).count(),
-        }
+            # Plain bounds so the generated_on index is used; __date would wrap the column
+            start, end = date.fromisoformat(str(start_date)), date.fromisoformat(str(end_date))
+            qs = qs.filter(generated_on__gte=_day_start(start), generated_on__lt=_day_start(end + timedelta(days=1)))
+        return qs
 
-class LibraryRevenueService:
     @staticmethod
-    def get_summary(start_date=None, end_date=None):
-        qs = LibraryMonthlyInvoice.objects.all()
-        if start_date and end_date:
-            qs = qs.filter(generated_on__range=[start_date, end_date])
-        return {
-            "total_paid": qs.filter(is_paid=True).aggregate(Sum('total'))['total__sum'] or 0,
-            "total_pending": qs.filter(is_paid=False).aggregate(Sum('total'))['total__sum'] or 0,
-            "count_paid": qs.filter(is_paid=True).count(),
-            "count_pending": qs.filter(is_paid=False).count(),
-        }
+    def _clean(row):
+        return {key: row[key] or 0 for key in SUMMARY_KEYS}
+
+    @classmethod
+    def get_summary(cls, start_date=None, end_date=None, group_by=None):
+        """
+        {"total_paid", "total_pending", "count_paid", "count_pending"}; with
+        group_by (month | week | day) a "series" list of the same figures per
+        period is added.
+        """
+        months = revenue_rollup.whole_months(start_date, end_date)
+        if use_rollup(months, group_by):
+            return cls.summary_from_rollup(revenue_rollup.read([cls.vertical], *months)[cls.vertical], group_by)
+
+        qs = cls.get_queryset(start_date, end_date)
+        if not group_by:
+            return cls._clean(qs.aggregate(**cls.AGGREGATES))
+
+        if group_by not in GROUP_BY_CHOICES:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY_CHOICES)}.")
+        rows = (qs.annotate(period=Trunc('generated_on', group_by, output_field=DateField()))
+                .values('period').annotate(**cls.AGGREGATES).order_by('period'))
+
+        return cls._with_series([{"period": row['period'], **cls._clean(row)} for row in rows])
+
+    @staticmethod
+    def _with_series(series):
+        summary = _empty_summary()
+        for point in series:
+            _add(summary, point)
+        summary["series"] = series
+        return summary
+
+    @classmethod
+    def summary_from_rollup(cls, rollups, group_by=None):
+        series = [{
+            "period": rollup.month,
+            "total_paid": rollup.paid_total,
+            "total_pending": rollup.pending_total,
+            "count_paid": rollup.paid_count,
+            "count_pending": rollup.pending_count,
+        } for rollup in rollups]
+        summary = cls._with_series(series)
+        if not group_by:
+            del summary["series"]
+        return summary
+
+
+class HostelRevenueService(InvoiceRevenueService):
+    vertical = 'hostel'
+    invoice_model = HostelMonthlyInvoice
+
+
+class LibraryRevenueService(InvoiceRevenueService):
+    vertical = 'library'
+    invoice_model = LibraryMonthlyInvoice
+
 
 class CombinedRevenueService:
     @staticmethod
-    def get_summary(start_date=None, end_date=None):
-        hostel = HostelRevenueService.get_summary(start_date, end_date)
-        library = LibraryRevenueService.get_summary(start_date, end_date)
+    def get_summary(start_date=None, end_date=None, group_by=None):
+        months = revenue_rollup.whole_months(start_date, end_date)
+        if use_rollup(months, group_by):
+            # Both verticals in one rollup read
+            rollups = revenue_rollup.read(['hostel', 'library'], *months)
+            hostel = HostelRevenueService.summary_from_rollup(rollups['hostel'], group_by)
+            library = LibraryRevenueService.summary_from_rollup(rollups['library'], group_by)
+        else:
+            hostel = HostelRevenueService.get_summary(start_date, end_date, group_by)
+            library = LibraryRevenueService.get_summary(start_date, end_date, group_by)
+
+        combined = _add(_add(_empty_summary(), hostel), library)
+        if group_by:
+            periods = defaultdict(_empty_summary)
+            for point in hostel["series"] + library["series"]:
+                _add(periods[point["period"]], point)
+            combined["series"] = [{"period": period, **periods[period]} for period in sorted(periods)]
 
         return {
             "hostel": hostel,
             "library": library,
-            "combined": {
-                "total_paid": hostel['total_paid'] + library['total_paid'],
-                "total_pending": hostel['total_pending'] + library['total_pending'],
-                "count_paid": hostel['count_paid'] + library['count_paid'],
-                "count_pending": hostel['count_pending'] + library['count_pending'],
-            }
+            "combined": combined,
         }
@@ -0,0 +1,49 @@
+"""
+Student search over User.search_document.
+
+The document is a lower-cased copy of the searchable columns kept up to date
+by User.save(). On PostgreSQL it carries a pg_trgm GIN index (users migration
+0002), so the LIKE '%term%' lookups below are index scans and latency stays
+flat as the table grows. SQLite runs the same queries as a plain scan. Every
+token must occur in the document. Results rank exact matches (id, username,
+email) first, then rows where every token starts a word, then the rest.
+"""
+from functools import reduce
+from operator import and_
+
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from users.models import build_search_document
+
+EXACT, PREFIX, PARTIAL = 3, 2, 1
+
+
+def tokens(term):
+    return build_search_document([term]).split()
+
+
+def search(queryset, term, prefix=''):
+    """
+    Filter `queryset` to rows matching `term` and annotate `search_rank`.
+    `prefix` is the lookup path to the user (e.g. 'booking__student__') when
+    the queryset is not of users.
+    """
+    words = tokens(term)
+    if not words:
+        return queryset.annotate(search_rank=Value(PARTIAL, output_field=IntegerField()))
+
+    document = f'{prefix}search_document'
+    matches = reduce(and_, (Q(**{f'{document}__contains': word}) for word in words))
+    word_prefixes = reduce(and_, (Q(**{f'{document}__contains': f' {word}'}) for word in words))
+
+    normalized = ' '.join(words)
+    exact = Q(**{f'{prefix}username__iexact': normalized}) | Q(**{f'{prefix}email__iexact': normalized})
+    if normalized.isdigit():
+        exact |= Q(**{f'{prefix}id': int(normalized)})
+
+    return queryset.filter(matches | exact).annotate(search_rank=Case(
+        When(exact, then=Value(EXACT)),
+        When(word_prefixes, then=Value(PREFIX)),
+        default=Value(PARTIAL),
+        output_field=IntegerField(),
+    ))
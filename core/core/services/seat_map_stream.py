@@ -0,0 +1,167 @@
+"""
+Versioned seat-map stream for the `live_seat_updates` WebSocket group.
+
+Every broadcast is stamped with a monotonically increasing `seq` and a list of
+typed deltas ({"kind": "bed"|"seat", "id", "from", "to", "booking_id"}), using the
+live-map status vocabulary (available / pending / booked). The last
+REPLAY_BUFFER_SIZE events are kept in the cache so a reconnecting client can send
+its last seen `seq` and receive only what it missed, or a compact snapshot when
+the gap is too old.
+
+Clients should ignore events with a `seq` they have already applied; deltas carry
+the target status, so re-applying one is harmless.
+
+The seq counter, last published statuses and replay buffer must be visible to
+every web, Daphne and Celery process, so the default cache has to be shared
+(Redis by default; core.checks flags a process-local one). Loading the
+resources, replacing their last published statuses, allocating the seq and
+sending the frame all happen under one cache lock, so two processes publishing
+the same resource cannot both report the same `from`, and seq order matches
+the order the states were read in.
+"""
+import logging
+import secrets
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from core.services.occupancy_service import HostelOccupancyService, LibraryOccupancyService, get_occupancy
+
+logger = logging.getLogger(__name__)
+
+GROUP_NAME = 'live_seat_updates'
+REPLAY_BUFFER_SIZE = 500
+
+SEQ_CACHE_KEY = 'seat_map:seq'
+EVENT_CACHE_KEY = 'seat_map:event:{}'
+STATUS_CACHE_KEY = 'seat_map:status:{}:{}'
+STATUS_LOCK_KEY = 'seat_map:status_lock'
+STATUS_LOCK_SECONDS = 5
+
+BED = 'bed'
+SEAT = 'seat'
+
+
+def current_seq():
+    return cache.get(SEQ_CACHE_KEY, 0)
+
+
+def next_seq():
+    cache.add(SEQ_CACHE_KEY, 0, None)
+    return cache.incr(SEQ_CACHE_KEY)
+
+
+def _occupancy_queryset(kind):
+    return HostelOccupancyService.get_beds() if kind == BED else LibraryOccupancyService.get_seats()
+
+
+@contextmanager
+def _status_lock():
+    """Cross-process mutex (cache.add is atomic on a shared cache); held for one frame's queries and send."""
+    token = secrets.token_hex(8)
+    deadline = time.monotonic() + STATUS_LOCK_SECONDS
+    while not cache.add(STATUS_LOCK_KEY, token, STATUS_LOCK_SECONDS):
+        if time.monotonic() > deadline:
+            # The holder died; its key expires by itself, so go ahead rather than drop the frame
+            logger.warning("Seat-map status lock not acquired in %ss", STATUS_LOCK_SECONDS)
+            break
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        if cache.get(STATUS_LOCK_KEY) == token:
+            cache.delete(STATUS_LOCK_KEY)
+
+
+def _deltas(resources):
+    """
+    [(kind, id)] -> one delta per distinct resource, in first-seen order, against
+    the last published statuses, which are replaced. One query per kind; the
+    caller holds _status_lock() so the read, compare and replace are one step.
+    """
+    resources = list(dict.fromkeys(resources))
+    if not resources:
+        return []
+    loaded = {}
+    for kind in dict.fromkeys(kind for kind, _ in resources):
+        ids = [resource_id for k, resource_id in resources if k == kind]
+        loaded.update({(kind, obj.pk): obj for obj in _occupancy_queryset(kind).filter(pk__in=ids)})
+
+    states = [(kind, resource_id, get_occupancy(loaded[kind, resource_id]) if (kind, resource_id) in loaded
+               else {"status": None, "booking_id": None}) for kind, resource_id in resources]
+    keys = [STATUS_CACHE_KEY.format(kind, resource_id) for kind, resource_id, _ in states]
+    old = cache.get_many(keys)
+    cache.set_many({key: state['status'] for key, (_, _, state) in zip(keys, states)}, None)
+
+    return [{
+        "kind": kind,
+        "id": resource_id,
+        "from": old.get(key),
+        "to": state['status'],
+        "booking_id": state['booking_id'],
+    } for key, (kind, resource_id, state) in zip(keys, states)]
+
+
+def build_delta(kind, resource_id):
+    """Current live-map state of one bed/seat, diffed against the last published state."""
+    with _status_lock():
+        return _deltas([(kind, resource_id)])[0]
+
+
+def send_frame(events, resources):
+    """
+    Send one frame to the group. A single event keeps the legacy shape the
+    frontend already consumes; several become {"type": "batch", "events": [...]}.
+    The deltas for `resources` are computed and the seq allocated under one
+    status lock, and the frame is sent before it is released, so frames reach
+    the group in seq order and a later seq never carries an older state.
+    """
+    frame = dict(events[0]) if len(events) == 1 else {"type": "batch", "events": events}
+    with _status_lock():
+        try:
+            frame['deltas'] = _deltas(resources)
+        except Exception:
+            logger.exception("Seat-map delta build failed")
+            frame['deltas'] = []
+        frame['seq'] = next_seq()
+
+        cache.set(EVENT_CACHE_KEY.format(frame['seq']), frame, None)
+        cache.delete(EVENT_CACHE_KEY.format(frame['seq'] - REPLAY_BUFFER_SIZE))
+
+        async_to_sync(get_channel_layer().group_send)(GROUP_NAME, {"type": "send_seat_update", "data": frame})
+    return frame
+
+
+def publish(data, resources):
+    """
+    Broadcast `data` right away with a sequence number and one delta per (kind, id)
+    in `resources`. Request/transaction code should use
+    core.services.broadcast_service.queue_seat_event() instead.
+    """
+    return send_frame([data], resources)
+
+
+def replay_since(last_seq):
+    """Events after `last_seq`, or None when they are no longer all in the replay buffer."""
+    seq = current_seq()
+    if last_seq > seq or seq - last_seq > REPLAY_BUFFER_SIZE:
+        return None
+
+    keys = [EVENT_CACHE_KEY.format(n) for n in range(last_seq + 1, seq + 1)]
+    found = cache.get_many(keys)
+    if len(found) != len(keys):
+        return None
+    return [found[key] for key in keys]
+
+
+def snapshot():
+    """Compact full state: {"seq", "beds": {id: status}, "seats": {id: status}}."""
+    seq = current_seq()
+    return {
+        "type": "snapshot",
+        "seq": seq,
+        "beds": {bed.id: get_occupancy(bed)['status'] for bed in HostelOccupancyService.get_beds()},
+        "seats": {seat.id: get_occupancy(seat)['status'] for seat in LibraryOccupancyService.get_seats()},
+    }
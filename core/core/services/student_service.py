@@ -0,0 +1,103 @@
+"""
+Admin student list.
+
+enrich() annotates a student queryset with everything the list shows beyond
+the user row (active booking ids, latest invoice flags per vertical) as
+correlated subqueries, so a page of any size is one SELECT. UserSerializer
+reads the annotations when they are present. Pages are keyset-paginated on
+the primary key, or on (search_rank, primary key) for search results.
+"""
+from django.conf import settings
+from django.db.models import OuterRef, Q, Subquery
+
+from hostel.models import HostelBooking, HostelMonthlyInvoice
+from library.models import LibraryBooking, LibraryMonthlyInvoice
+
+MAX_PAGE_SIZE = 1000
+ACTIVE_BOOKING_STATUSES = ['approved', 'pending']
+
+
+def enrich(students):
+    def active_booking(booking_model):
+        return Subquery(booking_model.objects.filter(
+            student=OuterRef('pk'), status__in=ACTIVE_BOOKING_STATUSES
+        ).order_by('-id').values('id')[:1])
+
+    def latest_invoice(invoice_model, field):
+        return Subquery(invoice_model.objects.filter(
+            booking__student=OuterRef('pk')
+        ).order_by('-month', '-id').values(field)[:1])
+
+    return students.annotate(
+        hostel_booking_id=active_booking(HostelBooking),
+        library_booking_id=active_booking(LibraryBooking),
+        latest_hostel_invoice_paid=latest_invoice(HostelMonthlyInvoice, 'is_paid'),
+        latest_hostel_invoice_expired=latest_invoice(HostelMonthlyInvoice, 'invoice_expired'),
+        latest_library_invoice_paid=latest_invoice(LibraryMonthlyInvoice, 'is_paid'),
+        latest_library_invoice_expired=latest_invoice(LibraryMonthlyInvoice, 'invoice_expired'),
+    )
+
+
+def page_size_from(value):
+    """Requested page size clamped to 1..MAX_PAGE_SIZE; raises ValueError on junk."""
+    if value in (None, ''):
+        return settings.STUDENT_LIST_PAGE_SIZE
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def _is_ranked(students):
+    return 'search_rank' in students.query.annotations
+
+
+def parse_cursor(value):
+    """`after` as sent by the client: a student id, or '<rank>:<id>' for search results."""
+    if value in (None, ''):
+        return None
+    if ':' in str(value):
+        rank, pk = str(value).split(':', 1)
+        return int(rank), int(pk)
+    return int(value)
+
+
+def cursor_for(students, student):
+    return f'{student.search_rank}:{student.pk}' if _is_ranked(students) else student.pk
+
+
+def keyset_page(students, page_size, after=None):
+    """
+    (page, has_more) after the cursor `after`, one query. Plain lists are in
+    id order; search results (annotated with search_rank) best match first.
+    """
+    ranked = _is_ranked(students)
+    qs = enrich(students).order_by('-search_rank', 'pk') if ranked else enrich(students).order_by('pk')
+    if isinstance(after, tuple):
+        rank, pk = after
+        qs = qs.filter(Q(search_rank__lt=rank) | Q(search_rank=rank, pk__gt=pk)) if ranked else qs.filter(pk__gt=pk)
+    elif after is not None:
+        qs = qs.filter(pk__gt=after)
+    page = list(qs[:page_size + 1])
+    return page[:page_size], len(page) > page_size
+
+
+def keyset_pages(students, page_size=None):
+    """Yield successive pages until the queryset is exhausted."""
+    page_size = page_size or settings.STUDENT_LIST_PAGE_SIZE
+    ranked = _is_ranked(students)
+    after = None
+    while True:
+        page, has_more = keyset_page(students, page_size, after)
+        if page:
+            yield page
+        if not has_more:
+            return
+        after = (page[-1].search_rank, page[-1].pk) if ranked else page[-1].pk
+
+
+def serialize_page(page, request):
+    from users.serializers import UserSerializer
+
+    rows = UserSerializer(page, many=True, context={'request': request}).data
+    for student, row in zip(page, rows):
+        row['hostel_booking_id'] = student.hostel_booking_id
+        row['library_booking_id'] = student.library_booking_id
+    return rows
@@ -1,13 +1,19 @@
+import os
+import sys
+import tempfile
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
 import dj_database_url
 from urllib.parse import urlparse
+from celery.schedules import crontab
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = config("SECRET_KEY")
 DEBUG = config("DEBUG", default=False, cast=bool)
+# `manage.py test`: single process, no Redis
+TESTING = sys.argv[1:2] == ['test']
 ALLOWED_HOSTS = config("ALLOWED_HOSTS", default="127.0.0.1").split(",")
 
 INSTALLED_APPS = [
@@ -30,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.services.metrics.MetricsMiddleware',
+    'core.services.query_inspector.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -39,6 +47,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.services.broadcast_service.BroadcastScopeMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -103,11 +112,119 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache (shared live-map snapshot, seat-map replay buffer).
+# Shared by every web, Daphne and Celery process: seat-map seq/replay, live-map snapshots, report
+# versions and rate limits live here, so a per-process cache breaks them (core.checks warns)
+CACHES = {
+    'default': {
+        'BACKEND': config("CACHE_BACKEND", default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config("CACHE_LOCATION", default='redis://127.0.0.1:6379/1'),
+    }
+}
+if TESTING:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Upper bound on how long a library live-map snapshot is cached; changes invalidate it sooner
+LIVE_MAP_SNAPSHOT_SECONDS = config("LIVE_MAP_SNAPSHOT_SECONDS", default=300, cast=int)
+
+# Seat-map WebSocket frames are coalesced to at most one per this many ms.
+SEAT_MAP_BROADCAST_DEBOUNCE_MS = config("SEAT_MAP_BROADCAST_DEBOUNCE_MS", default=250, cast=int)
+
+# Service diagnostics (core.*) go to the console; the web server and Celery capture it
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '{levelname} {name}: {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'core': {'handlers': ['console'], 'level': config("CORE_LOG_LEVEL", default="INFO")},
+    },
+}
+
 # Celery
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'drain-notification-outbox': {
+        'task': 'core.tasks.drain_notification_outbox',
+        'schedule': config("NOTIFICATION_OUTBOX_POLL_SECONDS", default=10.0, cast=float),
+    },
+    'month-end-billing-run': {
+        'task': 'core.tasks.billing_run',
+        'schedule': crontab(minute=30, hour=0, day_of_month=1),
+    },
+    'nightly-booking-expiry': {
+        'task': 'core.tasks.release_expired_bookings',
+        'schedule': crontab(minute=5, hour=0),
+    },
+    'nightly-invoice-payment-reset': {
+        'task': 'core.tasks.reset_invoice_payments',
+        'schedule': crontab(minute=0, hour=1),
+    },
+    'resume-stalled-email-campaigns': {
+        'task': 'core.tasks.resume_email_campaigns',
+        'schedule': crontab(minute='*/10'),
+    },
+    'hourly-export-artifact-purge': {
+        'task': 'core.tasks.purge_expired_exports',
+        'schedule': crontab(minute=20),
+    },
+}
+# Bookings invoiced per checkpointed chunk in core.tasks.billing_run
+BILLING_RUN_CHUNK_SIZE = config("BILLING_RUN_CHUNK_SIZE", default=500, cast=int)
+# Minutes without a finished chunk before a running billing run counts as dead and may be taken over
+BILLING_RUN_TIMEOUT_MINUTES = config("BILLING_RUN_TIMEOUT_MINUTES", default=15, cast=int)
+# Admin student list: default keyset page size (?page_size= may ask for up to 1000)
+STUDENT_LIST_PAGE_SIZE = config("STUDENT_LIST_PAGE_SIZE", default=200, cast=int)
+# Rows fetched per database round trip by the streaming exports (core.services.export_service)
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)
+# Hours an asynchronous export artifact stays downloadable (core.services.export_jobs)
+EXPORT_JOB_TTL_HOURS = config("EXPORT_JOB_TTL_HOURS", default=24, cast=int)
+# A job still `running` after this long lost its worker and is failed by the hourly purge
+EXPORT_JOB_TIMEOUT_MINUTES = config("EXPORT_JOB_TIMEOUT_MINUTES", default=60, cast=int)
+# Processes rendering a batch invoice ZIP (core.services.invoice_batch); 1 renders in-process
+INVOICE_BATCH_WORKERS = config("INVOICE_BATCH_WORKERS", default=4, cast=int)
+# Upper bound on how long a rendered student profile PDF is cached; changes invalidate it sooner
+PROFILE_REPORT_CACHE_SECONDS = config("PROFILE_REPORT_CACHE_SECONDS", default=86400, cast=int)
+# Longest side kept when an uploaded photo is re-encoded without its metadata (core.utils.image_utils)
+IMAGE_ORIGINAL_MAX_PX = config("IMAGE_ORIGINAL_MAX_PX", default=2560, cast=int)
+# X-DB-Queries / Server-Timing response headers (core.services.query_inspector); keep off in production
+QUERY_INSPECTOR = config("QUERY_INSPECTOR", default=DEBUG, cast=bool)
+# Times one SQL shape may run in a request before it is reported as a likely N+1
+QUERY_REPEAT_THRESHOLD = config("QUERY_REPEAT_THRESHOLD", default=5, cast=int)
+# Bearer token for /metrics (core.services.metrics); without it only staff sessions can scrape
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+# Per-process metric files summed by every scrape; empty keeps each process's numbers to itself
+METRICS_DIR = config("METRICS_DIR", default=os.path.join(tempfile.gettempdir(), 'hostel-library-metrics'))
+if TESTING:
+    METRICS_DIR = ''
+# How often a process writes its metrics to METRICS_DIR
+METRICS_FLUSH_SECONDS = config("METRICS_FLUSH_SECONDS", default=5.0, cast=float)
+# Port and interface a Celery worker serves metrics on (token required); 0 disables it
+CELERY_METRICS_PORT = config("CELERY_METRICS_PORT", default=0, cast=int)
+CELERY_METRICS_BIND = config("CELERY_METRICS_BIND", default="127.0.0.1")
+
+# Notification outbox (core.services.notification_service)
+NOTIFICATION_OUTBOX_BATCH_SIZE = config("NOTIFICATION_OUTBOX_BATCH_SIZE", default=100, cast=int)
+NOTIFICATION_OUTBOX_CONCURRENCY = config("NOTIFICATION_OUTBOX_CONCURRENCY", default=4, cast=int)
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = config("NOTIFICATION_OUTBOX_MAX_ATTEMPTS", default=5, cast=int)
+NOTIFICATION_OUTBOX_RETRY_BASE_SECONDS = config("NOTIFICATION_OUTBOX_RETRY_BASE_SECONDS", default=30, cast=int)
+NOTIFICATION_OUTBOX_CLAIM_TIMEOUT = 600
+# Admin email campaigns: recipients sent per Celery task run
+EMAIL_CAMPAIGN_CHUNK_SIZE = config("EMAIL_CAMPAIGN_CHUNK_SIZE", default=50, cast=int)
+# Seconds before a chunk claimed by a worker that died is sent again, and its campaign re-queued by beat
+EMAIL_CAMPAIGN_CLAIM_TIMEOUT = 600
+# Messages per minute, per channel
+NOTIFICATION_RATE_LIMITS = {
+    'email': config("EMAIL_RATE_LIMIT_PER_MINUTE", default=120, cast=int),
+    'sms': config("SMS_RATE_LIMIT_PER_MINUTE", default=30, cast=int),
+}
 
 # Email
 EMAIL_BACKEND = config("EMAIL_BACKEND")
@@ -0,0 +1,24 @@
+from celery import signals as celery_signals
+from django.db.models.signals import post_delete, post_init, post_save
+
+from core.services import image_pipeline, metrics, profile_report
+from users.models import User
+from .models import AchievementBlog, Complaint, Review
+
+# Cached student profile reports, invalidated after the change commits
+post_save.connect(profile_report.complaint_changed, sender=Complaint)
+post_delete.connect(profile_report.complaint_changed, sender=Complaint)
+post_save.connect(profile_report.review_changed, sender=Review)
+post_delete.connect(profile_report.review_changed, sender=Review)
+post_save.connect(profile_report.student_changed, sender=User)
+
+# Uploaded photos: metadata stripped and derivatives written by a worker
+for model in (User, Complaint, AchievementBlog):
+    post_init.connect(image_pipeline.remember_images, sender=model)
+    post_save.connect(image_pipeline.images_saved, sender=model)
+
+# Celery task durations and failures (core.services.metrics)
+celery_signals.task_prerun.connect(metrics.task_prerun)
+celery_signals.task_postrun.connect(metrics.task_postrun)
+celery_signals.task_failure.connect(metrics.task_failure)
+celery_signals.worker_ready.connect(metrics.worker_ready)
@@ -0,0 +1,102 @@
+# core/tasks.py
+
+from celery import shared_task
+
+
+@shared_task
+def drain_notification_outbox():
+    from core.services import notification_service
+    from django.conf import settings
+
+    result = notification_service.drain()
+
+    # A full batch means more is waiting; keep draining without waiting for beat
+    if result["claimed"] >= settings.NOTIFICATION_OUTBOX_BATCH_SIZE:
+        drain_notification_outbox.delay()
+
+    return (f"{result['sent']} notifications sent, {result['retried']} retried, "
+            f"{result['failed']} failed, {result['deferred']} rate-limited.")
+
+
+@shared_task
+def send_email_campaign(campaign_id):
+    from core.services import campaign_service
+
+    remaining = campaign_service.send_chunk(campaign_id)
+
+    # One chunk per task run, so a restart only repeats the current chunk's lookup
+    if remaining:
+        send_email_campaign.delay(campaign_id)
+
+    return f"Campaign {campaign_id}: {remaining} recipients remaining."
+
+
+@shared_task
+def resume_email_campaigns():
+    """Re-queue campaigns whose task chain stopped (worker restart, lost message) before they completed."""
+    from core.services import campaign_service
+
+    campaign_ids = campaign_service.stalled_campaigns()
+    for campaign_id in campaign_ids:
+        send_email_campaign.delay(campaign_id)
+    return f"{len(campaign_ids)} stalled campaigns re-queued."
+
+
+@shared_task
+def billing_run(month=None):
+    """Month-end invoices for hostel and library; `month` is an optional 'YYYY-MM-DD' string."""
+    from datetime import date
+    from core.services import billing_service
+
+    run = billing_service.run_billing(date.fromisoformat(month).replace(day=1) if month else None)
+    return (f"Billing run {run.id} for {run.month:%Y-%m} {run.status}: "
+            f"{run.hostel_created} hostel / {run.library_created} library invoices "
+            f"from {run.hostel_scanned + run.library_scanned} bookings in {run.duration_seconds:.1f}s.")
+
+
+@shared_task
+def reset_invoice_payments(vertical='all', grace_days=30):
+    """Nightly: clear is_paid on invoices older than `grace_days` ('hostel', 'library' or 'all')."""
+    from core.services.invoice_service import reset_expired_payments
+
+    verticals = ('hostel', 'library') if vertical == 'all' else (vertical,)
+    result = reset_expired_payments(verticals, grace_days)
+    counts = ", ".join(f"{result[v]} {v}" for v in verticals)
+    return f"{counts} invoices reset to unpaid in {result['duration_ms']}ms."
+
+
+@shared_task
+def release_expired_bookings(dry_run=False):
+    from core.services import expiry_service
+
+    result = expiry_service.release_expired_bookings(dry_run=dry_run)
+    prefix = "Dry run: " if dry_run else ""
+    return (f"{prefix}{result['hostel']['bookings']} hostel & {result['library']['bookings']} library bookings "
+            f"expired, {result['hostel']['released']} beds & {result['library']['released']} seats released "
+            f"in {result['duration_ms']}ms.")
+
+
+@shared_task
+def run_export_job(job_id):
+    from core.services import export_jobs
+
+    job = export_jobs.run(job_id)
+    if job is None:
+        return f"Export job {job_id} not found."
+    return f"Export job {job.id} ({job.dataset}, {job.output}) {job.status}: {job.row_count} rows."
+
+
+@shared_task
+def purge_expired_exports():
+    from core.services import export_jobs
+
+    stalled = export_jobs.fail_stalled()
+    return f"{stalled} stalled export jobs failed, {export_jobs.purge_expired()} expired export artifacts removed."
+
+
+@shared_task
+def process_uploaded_image(label, pk, field):
+    from core.services import image_pipeline
+
+    written = image_pipeline.process(label, pk, field)
+    return f"{label} {pk} {field}: {len(written)} files written."
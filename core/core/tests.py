@@ -0,0 +1,1159 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import urllib.error
+import urllib.request
+import zipfile
+import zlib
+from io import StringIO
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import get_connection
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from core import tasks
+from core.asgi import application
+from core.consumers import ADMIN_GROUP_NAME, AdminSeatMapConsumer
+
+from core.models import BillingRun, Complaint, EmailCampaign, EmailCampaignRecipient, ExportJob, NotificationOutbox, \
+    OccupancyCounter, RevenueRollup, Review
+from core.services import billing_service, campaign_service, export_jobs, invoice_batch, notification_service, \
+    image_pipeline, kyc_service, metrics, occupancy_counters, profile_report, query_inspector, revenue_rollup, \
+    seat_map_stream
+from core.services.expiry_service import release_expired_bookings
+from core.services.invoice_service import HostelInvoiceService, LibraryInvoiceService, reset_expired_payments
+from core.utils import email_utils, image_utils
+from hostel.models import HostelBed, HostelBooking, HostelMonthlyFee, HostelMonthlyInvoice, HostelRoom
+from hostel.consumers import SeatUpdateConsumer
+from hostel.tests import IN_MEMORY_CHANNEL_LAYERS, listen_seat_map, make_booking, make_student
+from library.models import LibraryBooking, LibraryMonthlyFee, LibraryMonthlyInvoice, LibrarySeat
+from users.models import KycDocument, User
+
+
+@override_settings(NOTIFICATION_RATE_LIMITS={'email': 100, 'sms': 100}, NOTIFICATION_OUTBOX_MAX_ATTEMPTS=2)
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='s1', password='pass', role='student',
+                                                email='s1@example.com', phone_number='+910000000000')
+
+    def test_notify_booking_only_writes_rows(self):
+        notification_service.notify_booking(self.student, 'booking_approved', "Hostel")
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(sorted(NotificationOutbox.objects.values_list('channel', flat=True)), ['email', 'sms'])
+
+    def test_drain_sends_and_marks_rows(self):
+        notification_service.notify_booking(self.student, 'booking_rejected', "Library")
+
+        with mock.patch('core.services.notification_service.deliver_sms') as deliver_sms:
+            result = notification_service.drain()
+
+        self.assertEqual(result['sent'], 2)
+        self.assertEqual(mail.outbox[0].subject, "Library Booking Rejected")
+        deliver_sms.assert_called_once_with('+910000000000', "Hi s1, your library booking has been rejected.")
+        self.assertFalse(NotificationOutbox.objects.exclude(status='sent').exists())
+
+    def test_failures_back_off_then_fail(self):
+        notification_service.queue_notification('sms', '+910000000000', 'booking_approved',
+                                                {"student_name": "s1", "booking_type": "Hostel"})
+
+        with mock.patch('core.services.notification_service.deliver_sms', side_effect=RuntimeError('down')):
+            self.assertEqual(notification_service.drain()['retried'], 1)
+            row = NotificationOutbox.objects.get()
+            self.assertEqual((row.status, row.attempts, row.last_error), ('pending', 1, 'down'))
+            self.assertGreater(row.next_attempt_at, timezone.now())
+
+            # Not due yet
+            self.assertEqual(notification_service.drain()['claimed'], 0)
+
+            NotificationOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(notification_service.drain()['failed'], 1)
+            self.assertEqual(NotificationOutbox.objects.get().status, 'failed')
+
+    @override_settings(NOTIFICATION_RATE_LIMITS={'email': 1})
+    def test_rate_limit_defers_extra_rows(self):
+        for _ in range(3):
+            notification_service.queue_notification('email', 's1@example.com', 'booking_approved',
+                                                    {"student_name": "s1", "booking_type": "Hostel"})
+
+        result = notification_service.drain()
+
+        self.assertEqual((result['sent'], result['deferred']), (1, 2))
+        self.assertEqual(NotificationOutbox.objects.filter(status='pending', attempts=0).count(), 2)
+
+
+class NotificationBatchSendTests(TestCase):
+    def setUp(self):
+        email_utils.close_pooled_connection()
+
+    def test_email_batch_uses_one_connection(self):
+        items = [(f's{i}@example.com', 'booking_approved', {"student_name": f's{i}', "booking_type": "Hostel"})
+                 for i in range(3)]
+        items.append(('bad@example.com', 'no_such_template', {}))
+
+        with mock.patch('core.utils.email_utils.get_connection', wraps=get_connection) as connect:
+            errors = notification_service.send_batch('email', items)
+
+        connect.assert_called_once()
+        self.assertEqual(errors[:3], [None, None, None])
+        self.assertIn('Template error', errors[3])
+        self.assertEqual([m.to for m in mail.outbox], [['s0@example.com'], ['s1@example.com'], ['s2@example.com']])
+
+    def test_sms_client_is_reused(self):
+        with mock.patch('core.utils.sms_utils._client', None), \
+                mock.patch('core.utils.sms_utils.Client') as client:
+            notification_service.send_batch('sms', [
+                ('+910000000001', 'booking_rejected', {"student_name": "a", "booking_type": "Library"}),
+                ('+910000000002', 'booking_rejected', {"student_name": "b", "booking_type": "Library"}),
+            ])
+
+        client.assert_called_once()
+        self.assertEqual(client.return_value.messages.create.call_count, 2)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class EmailCampaignTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='pass', is_staff=True))
+        for i in range(3):
+            student = User.objects.create_user(username=f's{i}', password='pass', role='student',
+                                               first_name=f'Name{i}', email=f's{i}@example.com')
+            LibraryBooking.objects.create(
+                student=student, seat=LibrarySeat.objects.create(seat_number=f'A{i}'), status='approved',
+                start_date=date.today(), aadhaar_front_photo=SimpleUploadedFile('front.jpg', b'x'),
+                aadhaar_back_photo=SimpleUploadedFile('back.jpg', b'x'),
+            )
+
+    def test_request_queues_campaign_and_chunks_are_sent_per_recipient(self):
+        with mock.patch('core.tasks.send_email_campaign.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/admin/send-email/', {
+                'subject': 'Notice', 'message': 'Hi {first_name}', 'send_to_all': True, 'target_group': 'library',
+            }, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        campaign_id = response.json()['campaign_id']
+        delay.assert_called_once_with(campaign_id)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(campaign_service.send_chunk(campaign_id, chunk_size=2), 1)
+        progress = self.client.get(f'/api/admin/email-campaigns/{campaign_id}/').json()
+        self.assertEqual((progress['sent'], progress['failed'], progress['remaining']), (2, 0, 1))
+        self.assertEqual(progress['status'], 'sending')
+
+        self.assertEqual(campaign_service.send_chunk(campaign_id, chunk_size=2), 0)
+        progress = self.client.get(f'/api/admin/email-campaigns/{campaign_id}/').json()
+        self.assertEqual((progress['sent'], progress['remaining'], progress['status']), (3, 0, 'completed'))
+
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['s0@example.com', 's1@example.com', 's2@example.com'])
+        self.assertTrue(all(len(m.to) == 1 for m in mail.outbox))
+        self.assertIn('Hi Name0', next(m.body for m in mail.outbox if m.to == ['s0@example.com']))
+
+    def _campaign(self):
+        return campaign_service.create_campaign(None, 'Notice', 'Hi', '', 'library',
+                                                User.objects.filter(role='student').order_by('id'))
+
+    def test_concurrent_runs_claim_disjoint_chunks_and_dead_claims_are_retaken(self):
+        campaign = self._campaign()
+        first = campaign_service.claim_chunk(campaign.id, 2)
+        second = campaign_service.claim_chunk(campaign.id, 2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual([r.email for r in second], ['s2@example.com'])
+        self.assertEqual(campaign_service.claim_chunk(campaign.id, 2), [])
+
+        # The first run's worker died; its chunk is sent again once the claim is stale
+        EmailCampaignRecipient.objects.filter(id__in=[r.id for r in first]).update(
+            claimed_at=timezone.now() - timedelta(seconds=settings.EMAIL_CAMPAIGN_CLAIM_TIMEOUT + 1))
+        self.assertEqual(campaign_service.send_chunk(campaign.id), 0)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['s0@example.com', 's1@example.com'])
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, 'sending')  # s2 is still claimed by the live run
+
+    def test_beat_requeues_campaigns_that_stopped_progressing(self):
+        stalled, active = self._campaign(), self._campaign()
+        long_ago = timezone.now() - timedelta(seconds=settings.EMAIL_CAMPAIGN_CLAIM_TIMEOUT + 1)
+        EmailCampaign.objects.update(created_at=long_ago, status='sending')
+        campaign_service.claim_chunk(active.id, 1)
+
+        with mock.patch('core.tasks.send_email_campaign.delay') as delay:
+            tasks.resume_email_campaigns()
+        delay.assert_called_once_with(stalled.id)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BillingRunTests(TestCase):
+    def setUp(self):
+        HostelMonthlyFee.objects.create(monthly_fee=1500, deposit_amount=2000)
+        LibraryMonthlyFee.objects.create(monthly_fee=600, deposit_amount=500)
+        self.month = date.today().replace(day=1)
+        room = HostelRoom.objects.create(room_number='101', capacity=10)
+        photos = dict(aadhaar_front_photo=SimpleUploadedFile('front.jpg', b'x'),
+                      aadhaar_back_photo=SimpleUploadedFile('back.jpg', b'x'))
+
+        self.students = [User.objects.create_user(username=f's{i}', password='pass', role='student')
+                         for i in range(3)]
+        for i, student in enumerate(self.students):
+            HostelBooking.objects.create(student=student, bed=HostelBed.objects.create(room=room, bed_number=str(i)),
+                                         status='approved', start_date=self.month, **photos)
+        # s0 also has a hostel booking (no library deposit); s3 is library-only
+        library_only = User.objects.create_user(username='s3', password='pass', role='student')
+        for i, student in enumerate([self.students[0], library_only]):
+            LibraryBooking.objects.create(student=student, seat=LibrarySeat.objects.create(seat_number=f'A{i}'),
+                                          status='approved', start_date=self.month, **photos)
+
+    def test_run_invoices_both_verticals_in_chunks(self):
+        run = billing_service.run_billing(self.month, chunk_size=2)
+
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual((run.hostel_created, run.library_created, run.chunks), (3, 2, 3))
+        self.assertGreater(run.duration_seconds, 0)
+        deposits = dict(LibraryMonthlyInvoice.objects.values_list('booking__student__username', 'deposit'))
+        self.assertEqual((deposits['s0'], deposits['s3']), (0, 500))
+
+    def test_failed_run_resumes_from_checkpoint(self):
+        with mock.patch.object(LibraryInvoiceService, 'generate', side_effect=RuntimeError('boom')), \
+                self.assertLogs('core.services.billing_service', 'ERROR'):
+            run = billing_service.run_billing(self.month, chunk_size=2)
+        self.assertEqual((run.status, run.error, run.hostel_created, run.library_last_id), ('failed', 'boom', 3, 0))
+
+        with mock.patch.object(HostelInvoiceService, 'plan', wraps=HostelInvoiceService.plan) as hostel_plan:
+            resumed = billing_service.run_billing(self.month, chunk_size=2)
+
+        hostel_plan.assert_not_called()
+        self.assertEqual(resumed.id, run.id)
+        self.assertEqual((resumed.status, resumed.attempts, resumed.library_created), ('completed', 2, 2))
+        self.assertEqual((resumed.hostel_scanned, resumed.hostel_last_id), (3, run.hostel_last_id))
+        self.assertEqual(HostelMonthlyInvoice.objects.count(), 3)
+
+    def test_resumed_run_invoices_bookings_approved_below_the_checkpoint(self):
+        first = HostelBooking.objects.order_by('id').first()
+        HostelBooking.objects.filter(id=first.id).update(status='pending')
+        with mock.patch.object(LibraryInvoiceService, 'generate', side_effect=RuntimeError('boom')), \
+                self.assertLogs('core.services.billing_service', 'ERROR'):
+            run = billing_service.run_billing(self.month, chunk_size=2)
+        self.assertGreater(run.hostel_last_id, first.id)
+
+        HostelBooking.objects.filter(id=first.id).update(status='approved')
+        resumed = billing_service.run_billing(self.month, chunk_size=2)
+
+        self.assertEqual((resumed.status, resumed.hostel_created), ('completed', 3))
+        self.assertTrue(HostelMonthlyInvoice.objects.filter(booking=first, month=self.month).exists())
+
+    def test_live_run_is_not_started_twice_and_a_dead_one_is_taken_over(self):
+        live = BillingRun.objects.create(month=self.month, status='running', attempts=1, heartbeat_at=timezone.now())
+        with mock.patch.object(HostelInvoiceService, 'generate') as generate:
+            self.assertEqual(billing_service.run_billing(self.month).id, live.id)
+        generate.assert_not_called()
+
+        BillingRun.objects.filter(id=live.id).update(
+            heartbeat_at=timezone.now() - timedelta(minutes=settings.BILLING_RUN_TIMEOUT_MINUTES + 1))
+        run = billing_service.run_billing(self.month)
+        self.assertEqual((run.id, run.status, run.attempts), (live.id, 'completed', 2))
+
+    def test_losing_the_claim_to_a_run_that_already_finished(self):
+        finished = BillingRun.objects.create(month=self.month, status='completed', attempts=1)
+        with mock.patch.object(BillingRun, 'save', side_effect=IntegrityError), \
+                mock.patch.object(HostelInvoiceService, 'generate') as generate:
+            self.assertEqual(billing_service.run_billing(self.month).id, finished.id)
+        generate.assert_not_called()
+
+    def test_created_counts_only_rows_actually_inserted(self):
+        plan = HostelInvoiceService.plan
+
+        def plan_then_race(*args, **kwargs):
+            invoices = plan(*args, **kwargs)
+            # Another writer inserts one of the planned invoices before the bulk INSERT
+            racing = invoices[0]
+            HostelMonthlyInvoice.objects.create(booking_id=racing.booking_id, invoice_id='RACED', month=racing.month,
+                                                amount=racing.amount, total=racing.total)
+            return invoices
+
+        with mock.patch.object(HostelInvoiceService, 'plan', side_effect=plan_then_race):
+            run = billing_service.run_billing(self.month)
+
+        self.assertEqual((run.hostel_scanned, run.hostel_created), (3, 2))
+        self.assertEqual(HostelMonthlyInvoice.objects.filter(month=self.month).count(), 3)
+
+    def test_payment_reset_is_one_update_per_table(self):
+        today = date.today()
+        old_month = (self.month - timedelta(days=40)).replace(day=1)
+        hostel_bookings = list(HostelBooking.objects.order_by('id'))
+        HostelMonthlyInvoice.objects.create(booking=hostel_bookings[0], invoice_id='H-OLD', month=old_month,
+                                            amount=1500, total=1500, is_paid=True)
+        HostelMonthlyInvoice.objects.create(booking=hostel_bookings[1], invoice_id='H-NOW', month=self.month,
+                                            amount=1500, total=1500, is_paid=True)
+        LibraryMonthlyInvoice.objects.create(booking=LibraryBooking.objects.first(), invoice_id='L-OLD',
+                                             month=old_month, amount=600, total=600, is_paid=True)
+
+        with self.assertNumQueries(16):  # per table: savepoint, months, UPDATE, 4 for the rollup, release
+            result = reset_expired_payments(today=today)
+
+        self.assertEqual((result['hostel'], result['library']), (1, 1))
+        self.assertIn('duration_ms', result)
+        self.assertEqual(list(HostelMonthlyInvoice.objects.filter(is_paid=True).values_list('invoice_id', flat=True)),
+                         ['H-NOW'])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class OccupancyCounterTests(TestCase):
+    def setUp(self):
+        self.room = HostelRoom.objects.create(room_number='101', capacity=10)
+        self.beds = [HostelBed.objects.create(room=self.room, bed_number=str(i)) for i in range(4)]
+        self.students = [User.objects.create_user(username=f's{i}', password='pass', role='student')
+                         for i in range(3)]
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin', is_staff=True)
+
+    def book(self, student, bed, status='pending', **kwargs):
+        return HostelBooking.objects.create(
+            student=student, bed=bed, status=status, start_date=kwargs.pop('start_date', date.today()),
+            aadhaar_front_photo=SimpleUploadedFile('front.jpg', b'x'),
+            aadhaar_back_photo=SimpleUploadedFile('back.jpg', b'x'), **kwargs
+        )
+
+    def assertCountersMatch(self, vertical='hostel'):
+        self.assertEqual({key: value for key, value in occupancy_counters.read(vertical).items() if value},
+                         {key: value for key, value in occupancy_counters.compute(vertical).items() if value})
+
+    def test_counters_follow_booking_lifecycle(self):
+        first = self.book(self.students[0], self.beds[0])
+        self.book(self.students[1], self.beds[0])
+        third = self.book(self.students[2], self.beds[1])
+        self.assertCountersMatch()
+
+        first.status = 'approved'
+        first.save()
+        third.status = 'rejected'
+        third.save()
+        third.delete()
+        self.beds[3].delete()
+        self.assertCountersMatch()
+
+        first.end_date = date.today() - timedelta(days=1)
+        first.save()
+        release_expired_bookings()
+        self.assertCountersMatch()
+        self.assertEqual(occupancy_counters.booking_stats('hostel'),
+                         {'total': 0, 'approved': 0, 'pending': 1, 'rejected': 0, 'expired': 1})
+
+    def test_pending_resources_follow_moves_between_beds(self):
+        first = self.book(self.students[0], self.beds[0])
+        second = self.book(self.students[1], self.beds[0])
+        self.assertEqual(occupancy_counters.read('hostel')[occupancy_counters.PENDING], 1)
+
+        first.bed = self.beds[1]
+        first.save()
+        self.assertEqual(occupancy_counters.read('hostel')[occupancy_counters.PENDING], 2)
+
+        # Loaded without its tracked fields; the stored values are read when it is saved
+        second = HostelBooking.objects.only('id').get(id=second.id)
+        second.status = 'rejected'
+        second.save()
+        HostelBooking.objects.get(id=first.id).delete()
+        self.assertEqual(occupancy_counters.read('hostel')[occupancy_counters.PENDING], 0)
+        self.assertCountersMatch()
+
+    def test_new_key_created_concurrently_keeps_both_counts(self):
+        key = occupancy_counters.created_key(date(2030, 1, 1))
+        bulk_create = OccupancyCounter.objects.bulk_create
+
+        def racing_insert(rows, **kwargs):
+            # Another transaction created the key (and counted its booking) after our UPDATE missed it
+            OccupancyCounter.objects.create(vertical='hostel', key=key, value=1)
+            return bulk_create(rows, **kwargs)
+
+        with mock.patch.object(OccupancyCounter.objects, 'bulk_create', side_effect=racing_insert):
+            occupancy_counters.adjust('hostel', {key: 1})
+        self.assertEqual(occupancy_counters.read('hostel')[key], 2)
+
+    def test_rolled_back_change_leaves_counters_alone(self):
+        booking = self.book(self.students[0], self.beds[0])
+        before = occupancy_counters.read('hostel')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            booking.status = 'approved'
+            booking.save()
+            raise RuntimeError
+        self.assertEqual(occupancy_counters.read('hostel'), before)
+
+    def test_dashboard_and_stats_are_one_query(self):
+        self.book(self.students[0], self.beds[0], status='approved')
+        self.book(self.students[1], self.beds[1])
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/hostel/admin/hostel-dashboard-stats/')
+        self.assertEqual(response.data, {
+            "hostel": {"total_beds": 4, "booked": 1, "pending": 1, "available": 2},
+            "trends": {"today_bookings": 2, "weekly_bookings": 2},
+        })
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/hostel/bookings/stats/')
+        self.assertEqual((response.data['total'], response.data['approved'], response.data['pending']), (1, 1, 1))
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        self.book(self.students[0], self.beds[0])
+        LibrarySeat.objects.create(seat_number='A1')
+        HostelBed.objects.filter(id=self.beds[1].id).update(is_booked=True)  # no signal
+
+        self.assertEqual(occupancy_counters.reconcile(dry_run=True),
+                         {'hostel': {'resources:booked': (0, 1)}, 'library': {}})
+        call_command('reconcile_occupancy_counters', stdout=StringIO())
+        self.assertEqual(occupancy_counters.reconcile(), {'hostel': {}, 'library': {}})
+        self.assertEqual(OccupancyCounter.objects.get(vertical='hostel', key='resources:booked').value, 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RevenueSummaryTests(TestCase):
+    def setUp(self):
+        room = HostelRoom.objects.create(room_number='101', capacity=10)
+        photos = dict(aadhaar_front_photo=SimpleUploadedFile('front.jpg', b'x'),
+                      aadhaar_back_photo=SimpleUploadedFile('back.jpg', b'x'))
+        student = User.objects.create_user(username='s0', password='pass', role='student')
+        hostel = HostelBooking.objects.create(student=student, bed=HostelBed.objects.create(room=room, bed_number='1'),
+                                              status='approved', start_date=date.today(), **photos)
+        library = LibraryBooking.objects.create(student=student, seat=LibrarySeat.objects.create(seat_number='A1'),
+                                                status='approved', start_date=date.today(), **photos)
+
+        jan = timezone.make_aware(datetime(2025, 1, 15))
+        feb = timezone.make_aware(datetime(2025, 2, 3))
+        for invoice_id, month, paid, generated_on in [('H1', date(2025, 1, 1), True, jan),
+                                                      ('H2', date(2025, 2, 1), False, feb)]:
+            HostelMonthlyInvoice.objects.create(booking=hostel, invoice_id=invoice_id, month=month,
+                                                amount=1500, total=1500, is_paid=paid)
+            HostelMonthlyInvoice.objects.filter(invoice_id=invoice_id).update(generated_on=generated_on)
+        LibraryMonthlyInvoice.objects.create(booking=library, invoice_id='L1', month=date(2025, 1, 1),
+                                             amount=600, total=600, is_paid=True)
+        LibraryMonthlyInvoice.objects.filter(invoice_id='L1').update(generated_on=jan)
+        revenue_rollup.rebuild()  # generated_on was back-dated with update()
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='pass', is_staff=True))
+
+    def test_combined_summary_is_one_query_per_table(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/admin/revenue-summary/',
+                                       {'start_date': '2025-01-10', 'end_date': '2025-02-20'})
+
+        self.assertEqual(response.data['data']['combined'],
+                         {"total_paid": 2100, "total_pending": 1500, "count_paid": 2, "count_pending": 1})
+        self.assertEqual(response.data['data']['hostel']['count_pending'], 1)
+
+    def test_grouped_series_comes_from_the_same_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/admin/revenue-summary/',
+                                       {'group_by': 'week', 'start_date': '2025-01-10', 'end_date': '2025-02-20'})
+
+        combined = response.data['data']['combined']
+        self.assertEqual(combined['total_paid'], 2100)
+        self.assertEqual([(p['period'], p['total_paid'], p['total_pending']) for p in combined['series']],
+                         [(date(2025, 1, 13), 2100, 0), (date(2025, 2, 3), 0, 1500)])
+
+    def test_whole_month_ranges_read_the_rollup(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/admin/revenue-summary/',
+                                       {'group_by': 'month', 'start_date': '2025-01-01', 'end_date': '2025-02-28'})
+
+        combined = response.data['data']['combined']
+        self.assertEqual((combined['total_paid'], combined['count_pending']), (2100, 1))
+        self.assertEqual([(p['period'], p['total_paid'], p['total_pending']) for p in combined['series']],
+                         [(date(2025, 1, 1), 2100, 0), (date(2025, 2, 1), 0, 1500)])
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/admin/revenue-summary/', {'mode': 'library'})
+        self.assertEqual(response.data['data'], {"total_paid": 600, "total_pending": 0, "count_paid": 1,
+                                                 "count_pending": 0})
+
+    def test_rollup_follows_invoice_writes(self):
+        invoice = HostelMonthlyInvoice.objects.get(invoice_id='H2')
+        invoice.is_paid = True
+        invoice.save()
+        feb = RevenueRollup.objects.get(vertical='hostel', month=date(2025, 2, 1))
+        self.assertEqual((feb.paid_count, feb.pending_count, feb.paid_total), (1, 0, 1500))
+
+        fees = HostelMonthlyFee.objects.create(monthly_fee=1500, deposit_amount=2000)
+        HostelInvoiceService.generate(fees, date.today().replace(day=1))
+        current = RevenueRollup.objects.get(vertical='hostel', month=date.today().replace(day=1))
+        self.assertEqual(current.pending_count, 1)
+
+        invoice.delete()
+        self.assertFalse(RevenueRollup.objects.filter(vertical='hostel', month=date(2025, 2, 1)).exists())
+
+        RevenueRollup.objects.all().delete()
+        call_command('rebuild_revenue_rollup', stdout=StringIO())
+        self.assertEqual(RevenueRollup.objects.count(), 3)  # hostel Jan + this month, library Jan
+
+    def test_unknown_group_by_is_rejected(self):
+        response = self.client.get('/api/admin/revenue-summary/', {'group_by': 'year', 'mode': 'hostel'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, MEDIA_ROOT=tempfile.mkdtemp(), EXPORT_JOB_TTL_HOURS=2)
+class ExportJobTests(TestCase):
+    def setUp(self):
+        room = HostelRoom.objects.create(room_number='201', capacity=10)
+        for i in range(3):
+            make_booking(make_student(f'job{i}'), HostelBed.objects.create(room=room, bed_number=str(i)),
+                         'approved' if i else 'pending')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='pass', is_staff=True))
+
+    def submit(self, **spec):
+        with mock.patch('core.tasks.run_export_job.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/admin/export-jobs/', spec, format='json')
+        return response, delay
+
+    def test_submit_queues_job_without_building_the_file(self):
+        response, delay = self.submit(dataset='hostel_bookings', output='csv', filters={'status': 'approved'})
+
+        self.assertEqual(response.status_code, 202)
+        job = ExportJob.objects.get(id=response.data['job_id'])
+        self.assertEqual(job.status, 'queued')
+        self.assertFalse(job.file)
+        delay.assert_called_once_with(job.id)
+
+    def test_invalid_specs_are_rejected(self):
+        self.assertEqual(self.submit(dataset='payroll')[0].status_code, 400)
+        self.assertEqual(self.submit(dataset='hostel_bookings', output='pdf')[0].status_code, 400)
+        self.assertEqual(self.submit(dataset='hostel_bookings', filters={'bed': 1})[0].status_code, 400)
+        self.assertEqual(self.submit(dataset='hostel_bookings', filters={'start_date_from': 'soon'})[0].status_code,
+                         400)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_run_writes_artifact_and_notifies_admin_group_only(self):
+        job = export_jobs.create_job(None, 'hostel_bookings', 'csv', {'status': 'approved'})
+
+        public = []
+        frames = listen_seat_map(lambda: public.extend(listen_seat_map(lambda: export_jobs.run(job.id))),
+                                 group=ADMIN_GROUP_NAME)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.row_count, 2)
+        self.assertTrue(job.file.name.startswith('exports/hostel_bookings_'))
+        with job.file.open('rb') as artifact:
+            self.assertEqual(len(artifact.read().decode().splitlines()), 3)
+        self.assertEqual(frames, [{'type': 'export_job', 'job_id': job.id, 'status': 'completed'}])
+        self.assertEqual(public, [])
+
+        # A redelivered task leaves the finished job alone
+        export_jobs.run(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+
+    def test_stalled_running_job_is_failed_and_expires(self):
+        job = export_jobs.create_job(None, 'students', 'csv', {})
+        ExportJob.objects.filter(id=job.id).update(status='running',
+                                                   started_at=timezone.now() - timedelta(hours=2))
+        fresh = export_jobs.create_job(None, 'students', 'csv', {})
+        ExportJob.objects.filter(id=fresh.id).update(status='running', started_at=timezone.now())
+
+        self.assertEqual(export_jobs.fail_stalled(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.expires_at)
+        self.assertEqual(ExportJob.objects.get(id=fresh.id).status, 'running')
+        self.assertEqual(export_jobs.purge_expired(job.expires_at), 1)
+
+    def test_admin_socket_requires_staff(self):
+        async def connect(user):
+            communicator = WebsocketCommunicator(AdminSeatMapConsumer.as_asgi(), '/ws/admin/notifications/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            await communicator.disconnect()
+            return connected
+
+        self.assertFalse(async_to_sync(connect)(AnonymousUser()))
+        self.assertFalse(async_to_sync(connect)(make_student('nosy')))
+        self.assertTrue(async_to_sync(connect)(User.objects.get(username='staff')))
+
+    def test_admin_socket_accepts_a_jwt_access_token(self):
+        staff_token = str(AccessToken.for_user(User.objects.get(username='staff')))
+        student_token = str(AccessToken.for_user(make_student('tokened')))
+
+        async def connect(path, subprotocols=None):
+            communicator = WebsocketCommunicator(application, path, subprotocols=subprotocols)
+            connected, subprotocol = await communicator.connect()
+            await communicator.disconnect()
+            return connected, subprotocol
+
+        self.assertEqual(async_to_sync(connect)('/ws/admin/notifications/')[0], False)
+        self.assertEqual(async_to_sync(connect)('/ws/admin/notifications/?token=garbage')[0], False)
+        self.assertEqual(async_to_sync(connect)(f'/ws/admin/notifications/?token={student_token}')[0], False)
+        self.assertEqual(async_to_sync(connect)(f'/ws/admin/notifications/?token={staff_token}')[0], True)
+        self.assertEqual(async_to_sync(connect)('/ws/admin/notifications/', ['bearer', staff_token]),
+                         (True, 'bearer'))
+
+    def test_status_and_download(self):
+        job = export_jobs.create_job(None, 'students', 'xlsx', {'search': 'job1'})
+        self.assertIsNone(self.client.get(f'/api/admin/export-jobs/{job.id}/').data['download_url'])
+        self.assertEqual(self.client.get(f'/api/admin/export-jobs/{job.id}/download/').status_code, 409)
+
+        export_jobs.run(job.id)
+        data = self.client.get(f'/api/admin/export-jobs/{job.id}/').data
+        self.assertEqual((data['status'], data['row_count']), ('completed', 1))
+
+        response = self.client.get(data['download_url'])
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="students.xlsx"')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+    def test_purge_removes_expired_artifacts(self):
+        job = export_jobs.run(export_jobs.create_job(None, 'hostel_invoices', 'gzip', {}).id)
+        path = job.file.path
+        self.assertEqual(export_jobs.purge_expired(), 0)
+
+        self.assertEqual(export_jobs.purge_expired(timezone.now() + timedelta(hours=3)), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'expired')
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.client.get(f'/api/admin/export-jobs/{job.id}/download/').status_code, 410)
+
+    def test_non_staff_cannot_submit(self):
+        self.client.force_authenticate(make_student('nosy'))
+        self.assertEqual(self.submit(dataset='students')[0].status_code, 403)
+
+
+def invoice_id_of(pdf):
+    """The Invoice ID printed on a ReportLab PDF (page streams are ASCII85 + Flate encoded)."""
+    for stream in re.findall(rb'stream\r?\n(.*?)endstream', pdf, re.S):
+        text = zlib.decompress(base64.a85decode(stream.strip(), adobe=True))
+        match = re.search(rb'\(Invoice ID: ([^)]*)\)', text)
+        if match:
+            return match.group(1).decode()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), INVOICE_BATCH_WORKERS=1)
+class InvoiceBatchTests(TestCase):
+    url = '/api/admin/invoices/batch-pdf/'
+
+    def setUp(self):
+        self.month = date(2026, 9, 1)
+        room = HostelRoom.objects.create(room_number='401', capacity=10)
+        for i in range(3):
+            booking = make_booking(make_student(f'batch{i}'), HostelBed.objects.create(room=room, bed_number=str(i)),
+                                   'approved')
+            HostelMonthlyInvoice.objects.create(booking=booking, invoice_id=f'INV-HO-{i}', month=self.month,
+                                                amount=1500, total=1500, is_paid=bool(i))
+        HostelMonthlyInvoice.objects.create(booking=booking, invoice_id='INV-HO-OLD', month=date(2026, 8, 1),
+                                            amount=1500, total=1500)
+        library = LibraryBooking.objects.create(
+            student=make_student('reader'), seat=LibrarySeat.objects.create(seat_number='B1'), status='approved',
+            start_date=self.month, aadhaar_front_photo=SimpleUploadedFile('front.jpg', b'x'),
+            aadhaar_back_photo=SimpleUploadedFile('back.jpg', b'x'),
+        )
+        LibraryMonthlyInvoice.objects.create(booking=library, invoice_id='INV-LI-0', month=self.month,
+                                             amount=800, total=800)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='pass', is_staff=True))
+
+    def test_zip_of_a_month(self):
+        with self.assertNumQueries(2):  # one joined query per vertical
+            response = self.client.get(self.url, {'month': '2026-09'})
+            content = b''.join(response.streaming_content)
+
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="invoices_all_2026-09.zip"')
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertEqual(archive.namelist(), ['hostel/INV-HO-0.pdf', 'hostel/INV-HO-1.pdf',
+                                                  'hostel/INV-HO-2.pdf', 'library/INV-LI-0.pdf'])
+            self.assertTrue(archive.read('library/INV-LI-0.pdf').startswith(b'%PDF'))
+
+    def test_merged_pdf_has_a_page_per_invoice(self):
+        response = self.client.get(self.url, {'month': '2026-09', 'vertical': 'hostel', 'is_paid': 'true',
+                                              'output': 'pdf'})
+
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response.content.count(b'/Type /Page\n'), 2)
+
+    def test_process_pool_renders_in_order(self):
+        selected = invoice_batch.invoice_fields(['hostel', 'library'], self.month)
+        pdfs = list(invoice_batch.render_all([fields for _, fields in selected] * 2, workers=2))
+
+        self.assertEqual([invoice_id_of(pdf) for pdf in pdfs], ['INV-HO-0', 'INV-HO-1', 'INV-HO-2', 'INV-LI-0'] * 2)
+
+    def test_requires_a_month_or_student(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'month': 'September'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'month': '2020-01'}).status_code, 404)
+
+
+def image_upload(name, size):
+    out = io.BytesIO()
+    Image.new('RGB', size, 'navy').save(out, 'JPEG')
+    return SimpleUploadedFile(name, out.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProfileReportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('profiled')
+        self.student.profile_photo = image_upload('me.jpg', (1600, 1200))
+        self.student.save()
+        room = HostelRoom.objects.create(room_number='501', capacity=4)
+        for i in range(3):
+            HostelBooking.objects.create(
+                student=self.student, bed=HostelBed.objects.create(room=room, bed_number=str(i)), status='approved',
+                start_date=date.today(), aadhaar_front_photo=image_upload('front.jpg', (2000, 1250)),
+                aadhaar_back_photo=image_upload('back.jpg', (2000, 1250)),
+            )
+        self.url = f'/api/admin/students/{self.student.id}/full-profile/pdf/'
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='pass', is_staff=True))
+
+    def download(self):
+        with mock.patch('core.services.profile_report.generate_student_profile_pdf',
+                        wraps=profile_report.generate_student_profile_pdf) as render:
+            response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        return response, render.call_count
+
+    def test_report_reads_a_fixed_number_of_queries_and_is_cached(self):
+        with self.assertNumQueries(5):  # student, hostel + library bookings, complaints, reviews
+            _, renders = self.download()
+        self.assertEqual(renders, 1)
+
+        with self.assertNumQueries(1):
+            _, renders = self.download()
+        self.assertEqual(renders, 0)
+
+    def test_photos_wait_for_the_worker_thumbnails(self):
+        with mock.patch('core.utils.pdf_utils._draw_placeholder') as placeholder:
+            self.download()
+        self.assertEqual(placeholder.call_count, 3)  # profile photo, Aadhaar front and back
+        self.assertFalse(default_storage.exists(self.student.profile_photo.name.replace('.jpg', '.thumb.jpg')))
+
+        image_pipeline.process('users.User', self.student.pk, 'profile_photo')
+        self.student.refresh_from_db()
+        with mock.patch('core.utils.pdf_utils._draw_placeholder') as placeholder:
+            _, renders = self.download()
+        self.assertEqual((renders, placeholder.call_count), (1, 2))
+        with default_storage.open(self.student.profile_photo.name.replace('.jpg', '.thumb.jpg')) as thumb:
+            self.assertEqual(Image.open(thumb).size, (240, 180))
+
+    def test_related_changes_invalidate_the_report(self):
+        self.download()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Complaint.objects.create(title='Noise', description='Loud', category='other', submitted_by=self.student)
+        self.assertEqual(self.download()[1], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(title='Great', description='Nice', name=self.student.username, rating=5)
+        self.assertEqual(self.download()[1], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            HostelBooking.objects.filter(student=self.student).first().delete()
+        self.assertEqual(self.download()[1], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(id=self.student.id).save(update_fields=['last_login'])
+        self.assertEqual(self.download()[1], 0)
+
+    def test_expiring_bookings_invalidates_the_report(self):
+        self.download()
+        HostelBooking.objects.filter(student=self.student).update(end_date=date.today() - timedelta(days=1))
+        self.assertEqual(self.download()[1], 0)  # update() sends no signals
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_expired_bookings()
+        self.assertEqual(self.download()[1], 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), IMAGE_ORIGINAL_MAX_PX=1000)
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        self.student = make_student('camera')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def upload_phone_photo(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'  # Make
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise to display
+        out = io.BytesIO()
+        Image.new('RGB', (3000, 2000), 'teal').save(out, 'JPEG', exif=exif)
+
+        self.student.profile_photo = SimpleUploadedFile('phone.jpg', out.getvalue(), content_type='image/jpeg')
+        with mock.patch('core.tasks.process_uploaded_image.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.student.save()
+        return delay
+
+    def test_new_upload_is_queued_once(self):
+        delay = self.upload_phone_photo()
+        delay.assert_called_once_with('users.User', self.student.pk, 'profile_photo')
+
+        with mock.patch('core.tasks.process_uploaded_image.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                User.objects.get(pk=self.student.pk).save()
+        delay.assert_not_called()
+
+    def test_processing_strips_metadata_and_writes_derivatives(self):
+        self.upload_phone_photo()
+        uploaded_name = self.student.profile_photo.name
+
+        written = image_pipeline.process('users.User', self.student.pk, 'profile_photo')
+
+        self.assertEqual(len(written), 5)
+        self.student.refresh_from_db()
+        name = self.student.profile_photo.name
+        self.assertNotEqual(name, uploaded_name)  # re-encoded under a fresh name, the upload removed
+        self.assertFalse(default_storage.exists(uploaded_name))
+        with default_storage.open(name) as original:
+            image = Image.open(original)
+            self.assertEqual(image.size, (667, 1000))  # orientation applied, capped at IMAGE_ORIGINAL_MAX_PX
+            self.assertEqual(len(image.getexif()), 0)
+        with default_storage.open(name.replace('.jpg', '.thumb.webp')) as thumb:
+            self.assertEqual((Image.open(thumb).format, Image.open(thumb).size), ('WEBP', (160, 240)))
+        with default_storage.open(name.replace('.jpg', '.preview.jpg')) as preview:
+            self.assertEqual(Image.open(preview).size, (667, 1000))
+
+        self.assertEqual(image_pipeline.process('users.User', self.student.pk, 'profile_photo'), [])
+
+    @override_settings(STORAGES={**settings.STORAGES, 'default': {
+        'BACKEND': 'django.core.files.storage.InMemoryStorage'}})
+    def test_processing_works_on_storage_without_local_paths(self):
+        # InMemoryStorage raises NotImplementedError from path(), like S3 and other remote backends
+        self.upload_phone_photo()
+
+        written = image_pipeline.process('users.User', self.student.pk, 'profile_photo')
+
+        self.assertEqual(len(written), 5)
+        self.student.refresh_from_db()
+        self.assertTrue(default_storage.exists(self.student.profile_photo.name))
+        self.assertIsNotNone(self.student.profile_photo_processed_at)
+
+    def test_failed_write_keeps_the_original(self):
+        self.upload_phone_photo()
+        name = self.student.profile_photo.name
+        with default_storage.open(name) as original:
+            uploaded = original.read()
+        real_save = FileSystemStorage._save
+        calls = []
+
+        def failing_save(storage, name, content):
+            calls.append(name)
+            if len(calls) == 3:
+                raise OSError('disk full')
+            return real_save(storage, name, content)
+
+        with mock.patch.object(FileSystemStorage, '_save', failing_save):
+            self.assertEqual(image_pipeline.process('users.User', self.student.pk, 'profile_photo'), [])
+
+        self.assertEqual(User.objects.get(pk=self.student.pk).profile_photo.name, name)
+        with default_storage.open(name) as original:
+            self.assertEqual(original.read(), uploaded)
+        self.assertFalse([written for written in calls[:2] if default_storage.exists(written)])
+        self.assertIsNone(User.objects.get(pk=self.student.pk).profile_photo_processed_at)
+
+    def test_new_upload_clears_the_processed_stamp(self):
+        self.upload_phone_photo()
+        image_pipeline.process('users.User', self.student.pk, 'profile_photo')
+        self.student.refresh_from_db()
+        self.assertIsNotNone(self.student.profile_photo_processed_at)
+
+        self.upload_phone_photo()
+        self.assertIsNone(User.objects.get(pk=self.student.pk).profile_photo_processed_at)
+
+    def test_derivative_urls_do_not_touch_storage(self):
+        self.upload_phone_photo()
+        image_pipeline.process('users.User', self.student.pk, 'profile_photo')
+        self.student.refresh_from_db()
+
+        with mock.patch.object(FileSystemStorage, 'exists', side_effect=AssertionError('storage hit')):
+            urls = image_utils.derivative_urls(self.student, 'profile_photo')
+        self.assertTrue(urls['thumb']['jpg'].endswith('.thumb.jpg'))
+
+    def test_api_returns_derivative_urls_once_processed(self):
+        self.upload_phone_photo()
+        self.assertIsNone(self.client.get('/api/users/me/').data['profile_photo_derivatives'])
+
+        image_pipeline.process('users.User', self.student.pk, 'profile_photo')
+        self.student.refresh_from_db()  # the authenticated user object
+
+        derivatives = self.client.get('/api/users/me/').data['profile_photo_derivatives']
+        self.assertEqual(set(derivatives), {'thumb', 'preview'})
+        self.assertTrue(derivatives['thumb']['webp'].endswith('.thumb.webp'))
+        self.assertTrue(derivatives['preview']['jpg'].startswith('http://testserver/media/'))
+
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class KycDocumentTests(TestCase):
+    def setUp(self):
+        self.student = make_student('kyc')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        HostelMonthlyFee.objects.create(monthly_fee=1500, deposit_amount=2000)
+        LibraryMonthlyFee.objects.create(monthly_fee=600, deposit_amount=500)
+        self.bed = HostelBed.objects.create(room=HostelRoom.objects.create(room_number='501', capacity=1),
+                                            bed_number='1')
+        self.seat = LibrarySeat.objects.create(seat_number='K1')
+
+    def book_hostel(self, **photos):
+        return self.client.post('/api/hostel/bookings/', {'bed_id': self.bed.id, 'start_date': date.today(),
+                                                          'purpose_of_joining': 'Study', **photos})
+
+    def book_library(self, **photos):
+        return self.client.post('/api/library/bookings/', {'seat_id': self.seat.id, 'start_date': date.today(),
+                                                           'purpose_of_joining': 'Study', **photos})
+
+    def test_same_upload_is_stored_once_and_reused_across_verticals(self):
+        response = self.book_hostel(aadhaar_front_photo=image_upload('front.jpg', (40, 30)),
+                                    aadhaar_back_photo=image_upload('back.jpg', (30, 40)))
+        self.assertEqual(response.status_code, 201, response.data)
+        hostel = HostelBooking.objects.get(student=self.student)
+        hostel.status = 'cancelled'
+        hostel.save()
+
+        # Same bytes again: no new document, no new file
+        response = self.book_library(aadhaar_front_photo=image_upload('again.jpg', (40, 30)),
+                                     aadhaar_back_photo=image_upload('again.jpg', (30, 40)))
+        self.assertEqual(response.status_code, 201, response.data)
+        library = LibraryBooking.objects.get(student=self.student)
+
+        self.assertEqual(KycDocument.objects.filter(student=self.student).count(), 2)
+        front = KycDocument.objects.get(student=self.student, kind=KycDocument.AADHAAR_FRONT)
+        self.assertEqual(front.file.name, kyc_service.storage_name(front.sha256, 'front.jpg'))
+        self.assertEqual((hostel.aadhaar_front_document, library.aadhaar_front_document), (front, front))
+        self.assertEqual(library.aadhaar_front_photo.name, front.file.name)
+        self.assertEqual(len(default_storage.listdir(os.path.dirname(front.file.name))[1]), 1)
+
+    def test_stored_documents_satisfy_the_next_booking(self):
+        self.assertEqual(self.book_library().status_code, 400)
+        kyc_service.store(self.student, KycDocument.AADHAAR_FRONT, image_upload('front.jpg', (40, 30)))
+        kyc_service.store(self.student, KycDocument.AADHAAR_BACK, image_upload('back.jpg', (30, 40)))
+
+        response = self.book_library()
+        self.assertEqual(response.status_code, 201, response.data)
+        booking = LibraryBooking.objects.get(student=self.student)
+        self.assertEqual(booking.aadhaar_back_document.kind, KycDocument.AADHAAR_BACK)
+        self.assertEqual(booking.aadhaar_back_photo.name, booking.aadhaar_back_document.file.name)
+
+    def test_stored_bytes_match_their_address_after_processing(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'  # Make
+        out = io.BytesIO()
+        Image.new('RGB', (40, 30), 'olive').save(out, 'JPEG', exif=exif)
+        response = self.book_hostel(aadhaar_front_photo=SimpleUploadedFile('front.jpg', out.getvalue()),
+                                    aadhaar_back_photo=image_upload('back.jpg', (30, 40)))
+        self.assertEqual(response.status_code, 201, response.data)
+        booking = HostelBooking.objects.get(student=self.student)
+
+        image_pipeline.process('hostel.HostelBooking', booking.pk, 'aadhaar_front_photo')
+
+        front = booking.aadhaar_front_document
+        with default_storage.open(front.file.name) as stored:
+            data = stored.read()
+        self.assertEqual(hashlib.sha256(data).hexdigest(), front.sha256)
+        self.assertIn(front.sha256, front.file.name)
+        self.assertEqual(len(Image.open(io.BytesIO(data)).getexif()), 0)
+        self.assertTrue(default_storage.exists(image_utils.derivative_name(front.file.name, 'thumb', 'webp')))
+
+    def test_current_documents_is_one_query(self):
+        kyc_service.store(self.student, KycDocument.AADHAAR_FRONT, image_upload('old.jpg', (10, 10)))
+        newer = kyc_service.store(self.student, KycDocument.AADHAAR_FRONT, image_upload('new.jpg', (20, 20)))
+        with self.assertNumQueries(1):
+            documents = kyc_service.current_documents(self.student)
+        self.assertEqual(documents, {KycDocument.AADHAAR_FRONT: newer})
+        self.assertFalse(kyc_service.has_aadhaar(documents))
+
+
+# Per-endpoint ceilings, checked against several rows so a per-row query cannot hide under the budget
+ENDPOINT_QUERY_BUDGETS = [
+    # (url, as staff, max queries)
+    ('/api/hostel/beds/', False, 4),
+    ('/api/library/seats/', False, 4),
+    ('/api/hostel/my-invoices/', False, 4),
+    ('/api/library/my-invoices/', False, 4),
+    ('/api/hostel/admin/hostel-invoices/', True, 4),
+    ('/api/library/admin/library-invoices/', True, 4),
+]
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.student = make_student('budget')
+        room = HostelRoom.objects.create(room_number='601', capacity=6)
+        for n in range(6):
+            booking = make_booking(self.student, HostelBed.objects.create(room=room, bed_number=str(n)), 'approved')
+            HostelMonthlyInvoice.objects.create(booking=booking, invoice_id=f'INV-HB-{n}', month=date.today(),
+                                                amount=1500, total=1500)
+            seat = LibrarySeat.objects.create(seat_number=f'B{n}')
+            library = LibraryBooking.objects.create(student=self.student, seat=seat, status='pending',
+                                                    start_date=date.today(),
+                                                    aadhaar_front_photo='f.jpg', aadhaar_back_photo='b.jpg')
+            LibraryMonthlyInvoice.objects.create(booking=library, invoice_id=f'INV-LB-{n}', month=date.today(),
+                                                 amount=600, total=600)
+        self.staff = User.objects.create_user(username='staff', password='pass', is_staff=True, role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_endpoints_stay_within_their_query_budget(self):
+        for url, as_staff, budget in ENDPOINT_QUERY_BUDGETS:
+            self.client.force_authenticate(self.staff if as_staff else self.student)
+            with self.subTest(url=url), query_inspector.query_budget(budget):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertGreaterEqual(len(response.data), 6)
+
+    def test_budget_reports_repeated_queries(self):
+        with self.assertRaisesMessage(AssertionError, 'repeated queries'):
+            with query_inspector.query_budget(100, max_repeats=2):
+                for booking in LibraryBooking.objects.all():
+                    booking.seat.seat_number
+
+    @override_settings(QUERY_INSPECTOR=True, QUERY_REPEAT_THRESHOLD=3)
+    def test_middleware_sets_query_headers(self):
+        with query_inspector.capture() as log:
+            response = self.client.get('/api/hostel/beds/')
+        self.assertEqual(response['X-DB-Queries'], str(log.count))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries"$')
+        self.assertNotIn('X-DB-Repeated-Queries', response)
+
+    @override_settings(QUERY_INSPECTOR=True, QUERY_REPEAT_THRESHOLD=1)
+    def test_middleware_logs_repeated_queries(self):
+        with self.assertLogs('core.services.query_inspector', 'WARNING') as logs:
+            response = self.client.get('/api/hostel/beds/')
+        self.assertIn('X-DB-Repeated-Queries', response)
+        self.assertIn('Repeated queries in GET /api/hostel/beds/', logs.output[0])
+
+    @override_settings(QUERY_INSPECTOR=False)
+    def test_middleware_is_silent_when_disabled(self):
+        self.assertNotIn('X-DB-Queries', self.client.get('/api/hostel/beds/'))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.student = make_student('metered')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_requests_are_timed_per_view_and_action(self):
+        before = metrics.REQUEST_DURATION.count(view='HostelBedViewSet.list', method='GET', status='200')
+        self.client.get('/api/hostel/beds/')
+        self.client.get('/api/hostel/beds/')
+
+        self.assertEqual(metrics.REQUEST_DURATION.count(view='HostelBedViewSet.list', method='GET', status='200'),
+                         before + 2)
+        self.assertGreaterEqual(metrics.REQUEST_QUERIES.count(view='HostelBedViewSet.list', method='GET'), 2)
+
+        self.client.force_login(User.objects.create_user(username='ops', password='pass', is_staff=True))
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertRegex(body, r'http_request_duration_seconds_bucket\{view="HostelBedViewSet.list",method="GET",'
+                               r'status="200",le="\+Inf"\} \d+')
+        self.assertNotIn('view="metrics"', body)
+
+    @override_settings(METRICS_TOKEN='scrape')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer scrape'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_metrics_are_denied_without_a_token_or_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code, 401)
+
+    def test_scrape_sums_every_process_file(self):
+        directory = tempfile.mkdtemp()
+        other = {
+            metrics.TASK_FAILURES.name: [[['core.tasks.billing_run', 'RuntimeError'], 2]],
+            metrics.WEBSOCKET_CONNECTIONS.name: [[['live_seat_updates'], 7]],
+        }
+        with open(os.path.join(directory, f'{os.getppid()}.json'), 'w') as fh:
+            json.dump(other, fh)
+        # No process has this pid, so its gauges are dropped but its counters still count
+        with open(os.path.join(directory, '999999999.json'), 'w') as fh:
+            json.dump(other, fh)
+
+        with override_settings(METRICS_DIR=directory):
+            metrics.TASK_FAILURES.inc(task='core.tasks.billing_run', exception='RuntimeError')
+            local = metrics.WEBSOCKET_CONNECTIONS.value(group='live_seat_updates')
+            body = metrics.render()
+
+        self.assertTrue(os.path.exists(os.path.join(directory, f'{os.getpid()}.json')))
+        local_failures = metrics.TASK_FAILURES.value(task='core.tasks.billing_run', exception='RuntimeError')
+        self.assertIn('celery_task_failures_total{task="core.tasks.billing_run",exception="RuntimeError"} '
+                      f'{local_failures + 4}', body)
+        self.assertIn(f'websocket_connections{{group="live_seat_updates"}} {local + 7}', body)
+
+    @override_settings(METRICS_TOKEN='scrape')
+    def test_worker_server_binds_loopback_and_requires_the_token(self):
+        with self.assertLogs('core.services.metrics', 'INFO'):
+            server = metrics.serve(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        host, port = server.server_address
+        self.assertEqual(host, '127.0.0.1')
+
+        def get(headers):
+            request = urllib.request.Request(f'http://{host}:{port}/metrics', headers=headers)
+            try:
+                return urllib.request.urlopen(request, timeout=5).status
+            except urllib.error.HTTPError as error:
+                return error.code
+
+        self.assertEqual(get({}), 401)
+        self.assertEqual(get({'Authorization': 'Bearer scrape'}), 200)
+
+    def test_worker_server_is_not_started_without_a_token(self):
+        with self.assertLogs('core.services.metrics', 'ERROR'):
+            self.assertIsNone(metrics.serve(0))
+
+    def test_task_durations_and_failures(self):
+        name = tasks.reset_invoice_payments.name
+        before = metrics.TASK_DURATION.count(task=name, state='SUCCESS')
+        tasks.reset_invoice_payments.apply()
+        self.assertEqual(metrics.TASK_DURATION.count(task=name, state='SUCCESS'), before + 1)
+
+        with mock.patch('core.services.invoice_service.reset_expired_payments', side_effect=RuntimeError('boom')):
+            tasks.reset_invoice_payments.apply()
+        self.assertEqual(metrics.TASK_FAILURES.value(task=name, exception='RuntimeError'), 1)
+        self.assertEqual(metrics.TASK_DURATION.count(task=name, state='FAILURE'), 1)
+
+    @override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+    def test_websocket_connections_per_group(self):
+        async def run():
+            communicator = WebsocketCommunicator(SeatUpdateConsumer.as_asgi(), '/ws/seat-updates/')
+            await communicator.connect()
+            connected = metrics.WEBSOCKET_CONNECTIONS.value(group=seat_map_stream.GROUP_NAME)
+            await communicator.disconnect()
+            return connected
+
+        before = metrics.WEBSOCKET_CONNECTIONS.value(group=seat_map_stream.GROUP_NAME)
+        self.assertEqual(async_to_sync(run)(), before + 1)
+        self.assertEqual(metrics.WEBSOCKET_CONNECTIONS.value(group=seat_map_stream.GROUP_NAME), before)
+
+    def test_notification_send_and_delivery_latency(self):
+        before = metrics.NOTIFICATION_DELIVERY.count(channel='email', result='sent')
+        notification_service.queue_notification('email', 'metered@example.com', 'booking_approved',
+                                                {"student_name": "metered", "booking_type": "Hostel"})
+        notification_service.drain()
+
+        self.assertEqual(metrics.NOTIFICATION_DELIVERY.count(channel='email', result='sent'), before + 1)
+        self.assertGreaterEqual(metrics.NOTIFICATION_SEND.count(channel='email'), 1)
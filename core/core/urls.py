@@ -32,6 +32,8 @@ from core.views import (
     export_library_bookings_csv_by_student, student_full_profile, download_student_profile_pdf, AchievementBlogViewSet
 )
 from core.views import hostel_booking_history_by_student, library_booking_history_by_student, send_email_to_students
+from core.views import broadcast_stats, email_campaign_progress, create_export_job, export_job_status, \
+    download_export_job, batch_invoice_pdfs, metrics
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -78,8 +80,16 @@ urlpatterns = [
     path('api/admin/students/<int:student_id>/full-profile/pdf/', download_student_profile_pdf),
 
     path('api/admin/send-email/', send_email_to_students, name='admin-send-email'),
+    path('api/admin/email-campaigns/<int:campaign_id>/', email_campaign_progress, name='email-campaign-progress'),
+
+    path('api/admin/export-jobs/', create_export_job, name='export-job-create'),
+    path('api/admin/export-jobs/<int:job_id>/', export_job_status, name='export-job-status'),
+    path('api/admin/export-jobs/<int:job_id>/download/', download_export_job, name='export-job-download'),
+    path('api/admin/invoices/batch-pdf/', batch_invoice_pdfs, name='batch-invoice-pdfs'),
 
     path('api/admin/revenue-summary/', RevenueSummaryView.as_view(), name='revenue-summary'),
+    path('api/admin/broadcast-stats/', broadcast_stats, name='broadcast-stats'),
+    path('metrics', metrics, name='metrics'),
 
 
 ]
@@ -1,7 +1,14 @@
-from django.core.mail import send_mail
+import smtplib
+import threading
+
+from django.core.mail import send_mail, get_connection
 from django.conf import settings
 
-def send_approval_email(student_email, student_name, booking_type):
+# One mail connection per worker thread, kept open between sends
+_pooled = threading.local()
+
+
+def approval_email_content(student_name, booking_type):
     subject = f"{booking_type} Booking Approved"
     message = (
         f"Hello {student_name},\n\n"
@@ -9,14 +16,10 @@ def send_approval_email(student_email, student_name, booking_type):
         f"You may now proceed as per the schedule.\n\n"
         f"Regards,\nAdmin Team"
     )
-    try:
-        print("Sending approval email to:", student_email)
-        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [student_email])
-        print("Email sent successfully")
-    except Exception as e:
-        print("Error while sending approval email:", e)
-
-def send_rejection_email(student_email, student_name, booking_type):
+    return subject, message
+
+
+def rejection_email_content(student_name, booking_type):
     subject = f"{booking_type} Booking Rejected"
     message = (
         f"Hello {student_name},\n\n"
@@ -24,13 +27,7 @@ def send_rejection_email(student_email, student_name, booking_type):
         f"If you have any questions, please contact the administration.\n\n"
         f"Regards,\nAdmin Team"
     )
-    try:
-        print("Sending rejection email to:", student_email)
-        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [student_email])
-        print("Email sent successfully")
-    except Exception as e:
-        print("Error while sending rejection email:", e)
-
+    return subject, message
 
 
 def send_custom_email(subject, to_email, message):
@@ -42,3 +39,46 @@ def send_custom_email(subject, to_email, message):
         recipient_list=[to_email],
         fail_silently=True,
     )
+
+
+def get_pooled_connection():
+    connection = getattr(_pooled, 'connection', None)
+    if connection is None:
+        connection = get_connection()
+        _pooled.connection = connection
+    connection.open()
+    return connection
+
+
+def close_pooled_connection():
+    connection = getattr(_pooled, 'connection', None)
+    _pooled.connection = None
+    if connection is not None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def send_email_messages(messages):
+    """
+    Send EmailMessages over this thread's pooled connection instead of one
+    handshake per message. Returns one error string (or None) per message.
+    """
+    errors = []
+    for message in messages:
+        for attempt in range(2):
+            connection = get_pooled_connection()
+            try:
+                connection.send_messages([message])
+                errors.append(None)
+                break
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                # Server dropped the idle connection; reconnect once
+                close_pooled_connection()
+                if attempt:
+                    errors.append(str(e) or repr(e))
+            except Exception as e:
+                errors.append(str(e) or repr(e))
+                break
+    return errors
@@ -0,0 +1,166 @@
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# label -> longest side in px; each is written as WebP and JPEG next to the original
+DERIVATIVE_SIZES = {
+    'thumb': 240,
+    'preview': 1280,
+}
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# Formats the sanitised original may keep; anything else is re-encoded as-is by Pillow
+ORIGINAL_SAVE_OPTIONS = {
+    'JPEG': {'quality': 88, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 88},
+}
+
+
+# process() writes this derivative last, so its presence means the upload is fully processed
+DONE_MARKER = ('preview', 'jpg')
+
+
+def derivative_name(name, label, ext):
+    """profile_photos/abc.jpg -> profile_photos/abc.thumb.webp"""
+    root, _ = os.path.splitext(name)
+    return f"{root}.{label}.{ext}"
+
+
+def processed_field(field):
+    """Model field the worker stamps once `field`'s derivatives are written: profile_photo_processed_at."""
+    return f"{field}_processed_at"
+
+
+def _open(fileobj):
+    image = Image.open(fileobj)
+    source_format = image.format
+    # Apply the camera's orientation before the EXIF block carrying it is dropped
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    return image, source_format
+
+
+def _load(field_file):
+    with field_file.storage.open(field_file.name, 'rb') as original:
+        return _open(original)
+
+
+def _encode(image, fmt, options):
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    out = BytesIO()
+    image.save(out, fmt, **options)
+    return out.getvalue()
+
+
+def _write(storage, name, data):
+    """
+    Store `data` under `name` with storage.save() alone, so any backend works.
+    If the name is taken (a concurrent worker wrote the same derivative first),
+    that file is kept and ours dropped.
+    """
+    saved = storage.save(name, ContentFile(data))
+    if saved != name:
+        storage.delete(saved)
+    return name
+
+
+def _derivative(image, label, ext):
+    scaled = image.copy()
+    scaled.thumbnail((DERIVATIVE_SIZES[label], DERIVATIVE_SIZES[label]))
+    return _encode(scaled, *DERIVATIVE_FORMATS[ext])
+
+
+def _sanitised(image, source_format):
+    sanitised = image.copy()
+    sanitised.thumbnail((settings.IMAGE_ORIGINAL_MAX_PX, settings.IMAGE_ORIGINAL_MAX_PX))
+    return sanitised, _encode(sanitised, source_format, ORIGINAL_SAVE_OPTIONS.get(source_format, {}))
+
+
+def sanitise(fileobj):
+    """
+    (bytes, format) of an uploaded image re-encoded the way process() rewrites
+    originals: without metadata, capped at IMAGE_ORIGINAL_MAX_PX. For uploads
+    that must be stored final, e.g. content-addressed ones.
+    """
+    image, source_format = _open(fileobj)
+    return _sanitised(image, source_format)[1], source_format
+
+
+def process(field_file, rewrite_original=True):
+    """
+    Re-encode the original without its metadata (EXIF, GPS, camera data) and
+    capped at IMAGE_ORIGINAL_MAX_PX, then write every derivative next to it.
+    The re-encoded original is saved under a fresh name (storage.save() picks
+    one), so no reader ever sees a half-written file; the caller points the
+    field at it and deletes the old file. With rewrite_original=False the
+    stored bytes are kept and only the derivatives are written.
+    Returns (original name, names written); an upload that was already
+    processed is left alone and returns (its name, []).
+    """
+    storage = field_file.storage
+    if storage.exists(derivative_name(field_file.name, *DONE_MARKER)):
+        return field_file.name, []
+    image, source_format = _load(field_file)
+
+    name, written = field_file.name, []
+    try:
+        if rewrite_original:
+            image, data = _sanitised(image, source_format)
+            name = storage.save(field_file.name, ContentFile(data))
+            written.append(name)
+        for label in DERIVATIVE_SIZES:
+            for ext in DERIVATIVE_FORMATS:
+                written.append(_write(storage, derivative_name(name, label, ext), _derivative(image, label, ext)))
+    except BaseException:
+        discard(storage, written if name != field_file.name else [])
+        raise
+    return name, written
+
+
+def discard(storage, names):
+    """Delete files written by a process() whose result is not used."""
+    for name in names:
+        storage.delete(name)
+
+
+def derivative(instance, field, label='thumb', ext='jpg'):
+    """
+    Storage name of one derivative of `instance`'s `field`, or None until the
+    worker has stamped <field>_processed_at. Never renders on the caller's
+    thread; unprocessed uploads are left to the worker and the
+    process_uploaded_images command.
+    """
+    field_file = getattr(instance, field) if instance else None
+    if not field_file or not getattr(instance, processed_field(field)):
+        return None
+    return derivative_name(field_file.name, label, ext)
+
+
+def derivative_urls(instance, field, request=None):
+    """
+    {"thumb": {"webp": url, "jpg": url}, "preview": {...}} once the worker
+    has stamped `instance`'s <field>_processed_at, otherwise None; clients fall
+    back to the original. Built from the row alone, without touching storage.
+    """
+    field_file = getattr(instance, field) if instance else None
+    if not field_file or not getattr(instance, processed_field(field)):
+        return None
+
+    def absolute(name):
+        url = field_file.storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+
+    return {
+        label: {ext: absolute(derivative_name(field_file.name, label, ext)) for ext in DERIVATIVE_FORMATS}
+        for label in DERIVATIVE_SIZES
+    }
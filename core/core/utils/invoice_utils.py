@@ -1,8 +1,9 @@
+from functools import lru_cache
 from io import BytesIO
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from datetime import date
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from reportlab.lib.colors import red, green
@@ -21,112 +22,129 @@ def add_watermark(canvas, doc, text, color):
     canvas.restoreState()
 
 
-#  Hostel invoice with PAID/UNPAID watermark
-def generate_hostel_invoice_pdf(invoice):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    elements.append(Paragraph("<b>Bussiness Track Hostel & Library</b>", styles['Title']))
-    elements.append(Spacer(1, 20))
-    elements.append(Paragraph(f"Invoice ID: {invoice.invoice_id}", styles['Normal']))
-    elements.append(Paragraph(f"Month: {invoice.month.strftime('%d-%b-%Y')}", styles['Normal']))
-    elements.append(Spacer(1, 10))
-
-    student = invoice.booking.student
-    bed = invoice.booking.bed
-
-    elements.append(Paragraph(f"Student: {student.first_name} {student.last_name}", styles['Normal']))
-    elements.append(Paragraph(f"Phone: {student.phone_number}", styles['Normal']))
-    elements.append(Paragraph(f"Room: {bed.room.room_number if bed else '-'} | Bed: {bed.bed_number if bed else '-'}", styles['Normal']))
-    elements.append(Spacer(1, 20))
-
-    data = [
-        ['Description', 'Amount (₹)'],
-        ['Monthly Fee', f"{invoice.amount}"],
-        ['Deposit', f"{invoice.deposit}"],
-        ['Total', f"{invoice.total}"]
-    ]
-
-    table = Table(data, colWidths=[300, 200])
-    table.setStyle(TableStyle([
+@lru_cache(maxsize=None)
+def invoice_styles():
+    """Stylesheet and table style shared by every invoice; built once per process."""
+    table_style = TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
         ('BOX', (0, 0), (-1, -1), 1, colors.black),
         ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
         ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-    ]))
-    elements.append(table)
-    elements.append(Spacer(1, 30))
-    elements.append(Paragraph("Thank you for your payment!", styles['Italic']))
+    ])
+    return getSampleStyleSheet(), table_style
 
-    #  Watermark logic
-    status_text = "PAID" if invoice.is_paid else "UNPAID"
-    status_color = (0, 1, 0) if invoice.is_paid else (1, 0, 0)  # Green or Red RGB
-    doc.build(
-        elements,
-        onFirstPage=lambda c, d: add_watermark(c, d, status_text, status_color)
-    )
-
-    buffer.seek(0)
-    return buffer
 
-#  Library invoice with watermark
-def generate_library_invoice_pdf(invoice):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
+def hostel_invoice_fields(invoice):
+    """Everything the hostel invoice prints, as plain picklable values."""
+    student = invoice.booking.student
+    bed = invoice.booking.bed
+    return {
+        'invoice_id': invoice.invoice_id,
+        'month': invoice.month,
+        'student_name': f"{student.first_name} {student.last_name}",
+        'phone': student.phone_number,
+        'place': f"Room: {bed.room.room_number if bed else '-'} | Bed: {bed.bed_number if bed else '-'}",
+        'amount': invoice.amount,
+        'deposit': invoice.deposit,
+        'total': invoice.total,
+        'is_paid': invoice.is_paid,
+    }
+
+
+def library_invoice_fields(invoice):
+    """Everything the library invoice prints, as plain picklable values."""
+    student = invoice.booking.student
+    seat = invoice.booking.seat
+    return {
+        'invoice_id': invoice.invoice_id,
+        'month': invoice.month,
+        'student_name': f"{student.first_name} {student.last_name}",
+        'phone': student.phone_number,
+        'place': f"Seat: {seat.seat_number if seat else '-'}",
+        'amount': invoice.amount,
+        'deposit': invoice.deposit,
+        'total': invoice.total,
+        'is_paid': invoice.is_paid,
+    }
+
+
+def invoice_elements(fields):
+    styles, table_style = invoice_styles()
     elements = []
 
     elements.append(Paragraph("<b>Bussiness Track Hostel & Library</b>", styles['Title']))
     elements.append(Spacer(1, 20))
-    elements.append(Paragraph(f"Invoice ID: {invoice.invoice_id}", styles['Normal']))
-    elements.append(Paragraph(f"Month: {invoice.month.strftime('%d-%b-%Y')}", styles['Normal']))
+    elements.append(Paragraph(f"Invoice ID: {fields['invoice_id']}", styles['Normal']))
+    elements.append(Paragraph(f"Month: {fields['month'].strftime('%d-%b-%Y')}", styles['Normal']))
     elements.append(Spacer(1, 10))
 
-    student = invoice.booking.student
-    seat = invoice.booking.seat
-
-    elements.append(Paragraph(f"Student: {student.first_name} {student.last_name}", styles['Normal']))
-    elements.append(Paragraph(f"Phone: {student.phone_number}", styles['Normal']))
-    elements.append(Paragraph(f"Seat: {seat.seat_number if seat else '-'}", styles['Normal']))
+    elements.append(Paragraph(f"Student: {fields['student_name']}", styles['Normal']))
+    elements.append(Paragraph(f"Phone: {fields['phone']}", styles['Normal']))
+    elements.append(Paragraph(fields['place'], styles['Normal']))
     elements.append(Spacer(1, 20))
 
     data = [
         ['Description', 'Amount (₹)'],
-        ['Monthly Fee', f"{invoice.amount}"],
-        ['Deposit', f"{invoice.deposit}"],
-        ['Total', f"{invoice.total}"]
+        ['Monthly Fee', f"{fields['amount']}"],
+        ['Deposit', f"{fields['deposit']}"],
+        ['Total', f"{fields['total']}"]
     ]
 
     table = Table(data, colWidths=[300, 200])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('BOX', (0, 0), (-1, -1), 1, colors.black),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-    ]))
+    table.setStyle(table_style)
     elements.append(table)
     elements.append(Spacer(1, 30))
     elements.append(Paragraph("Thank you for your payment!", styles['Italic']))
+    return elements
 
+
+def _watermark_for(fields):
     #  Watermark logic
-    status_text = "PAID" if invoice.is_paid else "UNPAID"
-    status_color = (0, 1, 0) if invoice.is_paid else (1, 0, 0)  # Green or Red RGB
+    status_text = "PAID" if fields['is_paid'] else "UNPAID"
+    status_color = (0, 1, 0) if fields['is_paid'] else (1, 0, 0)  # Green or Red RGB
+    return status_text, status_color
+
+
+def render_invoice(fields):
+    """PDF bytes of one invoice with its PAID/UNPAID watermark."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    status_text, status_color = _watermark_for(fields)
     doc.build(
-        elements,
+        invoice_elements(fields),
         onFirstPage=lambda c, d: add_watermark(c, d, status_text, status_color)
     )
+    return buffer.getvalue()
 
-    buffer.seek(0)
-    return buffer
 
+def render_merged_invoices(fields_list):
+    """PDF bytes of several invoices, one page each, each page with its own watermark."""
+    fields_list = list(fields_list)
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    for fields in fields_list:
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(invoice_elements(fields))
 
+    def watermark(c, d):
+        if fields_list:
+            add_watermark(c, d, *_watermark_for(fields_list[c.getPageNumber() - 1]))
 
+    doc.build(elements or [Spacer(1, 1)], onFirstPage=watermark, onLaterPages=watermark)
+    return buffer.getvalue()
 
 
+#  Hostel invoice with PAID/UNPAID watermark
+def generate_hostel_invoice_pdf(invoice):
+    return BytesIO(render_invoice(hostel_invoice_fields(invoice)))
 
 
+#  Library invoice with watermark
+def generate_library_invoice_pdf(invoice):
+    return BytesIO(render_invoice(library_invoice_fields(invoice)))
+
 
 # Booking invoice for booking screen (not monthly invoice)
 def generate_invoice_pdf(booking, student_name, total_due, months, monthly_fee, deposit):
@@ -3,9 +3,31 @@ from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.pdfgen import canvas
 from reportlab.platypus import Table, TableStyle
+from reportlab.lib.utils import ImageReader
 from io import BytesIO
-import os
-from django.conf import settings
+from core.utils.image_utils import derivative
+
+
+def _thumbnail_reader(instance, field):
+    # The 240px derivative: photos are drawn at most 80pt wide, so ~3x print resolution
+    name = derivative(instance, field, 'thumb', 'jpg')
+    if not name:
+        return None
+    field_file = getattr(instance, field)
+    with field_file.storage.open(name, 'rb') as f:
+        return ImageReader(BytesIO(f.read()))
+
+
+def _draw_placeholder(p, x, y, w, h):
+    # Uploaded but not processed yet: the worker writes the thumbnail, the report never renders one
+    p.setStrokeColor(colors.grey)
+    p.rect(x, y, w, h)
+    p.setFont("Helvetica", 7)
+    p.setFillColor(colors.grey)
+    p.drawCentredString(x + w / 2, y + h / 2 - 2, "Processing")
+    p.setFillColor(colors.black)
+    p.setStrokeColor(colors.black)
+
 
 def generate_student_profile_pdf(student, hostel_bookings, library_bookings, complaints, reviews):
     buffer = BytesIO()
@@ -24,29 +46,28 @@ def generate_student_profile_pdf(student, hostel_bookings, library_bookings, com
     draw_line("Student Profile Report", font="Helvetica-Bold", size=14, dy=25)
 
     # 👤 Profile Photo and Aadhaar Images
-    profile_photo = student.profile_photo.path if student.profile_photo and os.path.exists(student.profile_photo.path) else None
-    aadhaar_front = None
-    aadhaar_back = None
-
-    latest_hostel = hostel_bookings.last()
-    latest_library = library_bookings.last()
-
-    if latest_hostel:
-        aadhaar_front = latest_hostel.aadhaar_front_photo.path if latest_hostel.aadhaar_front_photo else None
-        aadhaar_back = latest_hostel.aadhaar_back_photo.path if latest_hostel.aadhaar_back_photo else None
-    if not aadhaar_front and latest_library:
-        aadhaar_front = latest_library.aadhaar_front_photo.path if latest_library.aadhaar_front_photo else None
-    if not aadhaar_back and latest_library:
-        aadhaar_back = latest_library.aadhaar_back_photo.path if latest_library.aadhaar_back_photo else None
-
-    # 📷 Draw Images
+    hostel_bookings, library_bookings = list(hostel_bookings), list(library_bookings)
+    latest_hostel = hostel_bookings[-1] if hostel_bookings else None
+    latest_library = library_bookings[-1] if library_bookings else None
+
+    # Aadhaar photos from the latest hostel booking, else the latest library booking
+    aadhaar_front = latest_hostel if latest_hostel and latest_hostel.aadhaar_front_photo else latest_library
+    aadhaar_back = latest_hostel if latest_hostel and latest_hostel.aadhaar_back_photo else latest_library
+
+    # 📷 Draw Images (the worker's pre-scaled thumbnails, not the full-resolution uploads)
     image_y = y
-    if profile_photo and os.path.exists(profile_photo):
-        p.drawImage(profile_photo, 400, image_y - 20, width=80, height=80, preserveAspectRatio=True)
-    if aadhaar_front and os.path.exists(aadhaar_front):
-        p.drawImage(aadhaar_front, 50, image_y - 100, width=80, height=50, preserveAspectRatio=True)
-    if aadhaar_back and os.path.exists(aadhaar_back):
-        p.drawImage(aadhaar_back, 150, image_y - 100, width=80, height=50, preserveAspectRatio=True)
+    for owner, field, x, photo_y, w, h in (
+        (student, 'profile_photo', 400, image_y - 20, 80, 80),
+        (aadhaar_front, 'aadhaar_front_photo', 50, image_y - 100, 80, 50),
+        (aadhaar_back, 'aadhaar_back_photo', 150, image_y - 100, 80, 50),
+    ):
+        if not owner or not getattr(owner, field):
+            continue
+        image = _thumbnail_reader(owner, field)
+        if image:
+            p.drawImage(image, x, photo_y, width=w, height=h, preserveAspectRatio=True)
+        else:
+            _draw_placeholder(p, x, photo_y, w, h)
 
     y -= 120
 
@@ -1,15 +1,25 @@
+import threading
+
 from django.conf import settings
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 
-def send_sms(to_phone, message):
-    try:
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        client.messages.create(
-            body=message,
-            from_=settings.TWILIO_PHONE_NUMBER,
-            to=to_phone
-        )
-        return True
-    except Exception as e:
-        print(f"SMS sending failed: {e}")
-        return False
+_client = None
+_client_lock = threading.Lock()
+
+def get_twilio_client():
+    # Shared per worker; TwilioHttpClient keeps a pooled requests session
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN,
+                             http_client=TwilioHttpClient(pool_connections=True, timeout=10))
+        return _client
+
+def deliver_sms(to_phone, message):
+    # Raises on failure so callers (e.g. the notification outbox) can retry
+    get_twilio_client().messages.create(
+        body=message,
+        from_=settings.TWILIO_PHONE_NUMBER,
+        to=to_phone
+    )
@@ -16,9 +16,8 @@ from .serializers import ComplaintSerializer, ReviewSerializer
 from hostel.serializers import HostelBookingSerializer
 from library.serializers import LibraryBookingSerializer
 from django.http import HttpResponse
-from core.utils.pdf_utils import generate_student_profile_pdf
 from core.serializers import AdminHostelBookingSerializer, AdminLibraryBookingSerializer, AdminSendEmailSerializer, \
-    AchievementBlogSerializer
+    AchievementBlogSerializer, ExportJobRequestSerializer
 from .serializers import AdminSendEmailSerializer
 from users.models import User
 from django.core.mail import send_mail
@@ -306,13 +305,14 @@ def library_booking_history_by_student(request, student_id):
         openapi.Parameter('student_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=True),
         openapi.Parameter('status', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False)
     ],
-    operation_description="Export hostel booking history for a student as CSV (admin only)"
+    operation_description="Export hostel booking history for a student as CSV (admin only). "
+                          "?output=gzip or xlsx for other formats"
 )
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def export_hostel_bookings_csv_by_student(request):
-    import csv
-    from django.http import HttpResponse
+    from core.services import export_service
+    from core.services.export_service import Column
     from users.models import User
 
     if request.user.role != 'admin':
@@ -324,6 +324,11 @@ def export_hostel_bookings_csv_by_student(request):
     if not student_id:
         return Response({'error': 'student_id is required'}, status=400)
 
+    try:
+        output = export_service.output_from(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
     try:
         student = User.objects.get(id=student_id)
     except User.DoesNotExist:
@@ -333,23 +338,14 @@ def export_hostel_bookings_csv_by_student(request):
     if status_filter:
         bookings = bookings.filter(status=status_filter)
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="hostel_bookings_{student.username}.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Booking ID', 'Start Date', 'Status', 'Bed', 'Room', 'Remarks'])
-
-    for b in bookings:
-        writer.writerow([
-            b.id,
-            b.start_date,
-            b.status,
-            b.bed.bed_number if b.bed else '',
-            b.bed.room.room_number if b.bed and b.bed.room else '',
-            b.remarks or ''
-        ])
-
-    return response
+    return export_service.export_response(bookings.order_by('id'), [
+        Column('Booking ID', 'id'),
+        Column('Start Date', 'start_date'),
+        Column('Status', 'status'),
+        Column('Bed', 'bed__bed_number'),
+        Column('Room', 'bed__room__room_number'),
+        Column('Remarks', 'remarks'),
+    ], f'hostel_bookings_{student.username}', output)
 
 
 @swagger_auto_schema(
@@ -358,13 +354,14 @@ def export_hostel_bookings_csv_by_student(request):
         openapi.Parameter('student_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=True),
         openapi.Parameter('status', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False)
     ],
-    operation_description="Export library booking history for a student as CSV (admin only)"
+    operation_description="Export library booking history for a student as CSV (admin only). "
+                          "?output=gzip or xlsx for other formats"
 )
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def export_library_bookings_csv_by_student(request):
-    import csv
-    from django.http import HttpResponse
+    from core.services import export_service
+    from core.services.export_service import Column
     from users.models import User
 
     if request.user.role != 'admin':
@@ -376,6 +373,11 @@ def export_library_bookings_csv_by_student(request):
     if not student_id:
         return Response({'error': 'student_id is required'}, status=400)
 
+    try:
+        output = export_service.output_from(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
     try:
         student = User.objects.get(id=student_id)
     except User.DoesNotExist:
@@ -385,22 +387,13 @@ def export_library_bookings_csv_by_student(request):
     if status_filter:
         bookings = bookings.filter(status=status_filter)
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="library_bookings_{student.username}.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Booking ID', 'Start Date', 'Status', 'Seat', 'Remarks'])
-
-    for b in bookings:
-        writer.writerow([
-            b.id,
-            b.start_date,
-            b.status,
-            b.seat.seat_number if b.seat else '',
-            b.remarks or ''
-        ])
-
-    return response
+    return export_service.export_response(bookings.order_by('id'), [
+        Column('Booking ID', 'id'),
+        Column('Start Date', 'start_date'),
+        Column('Status', 'status'),
+        Column('Seat', 'seat__seat_number'),
+        Column('Remarks', 'remarks'),
+    ], f'library_bookings_{student.username}', output)
 
 
 @api_view(['GET'])
@@ -452,30 +445,30 @@ def student_full_profile(request, student_id):
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def download_student_profile_pdf(request, student_id):
+    from core.services import profile_report
+
     try:
         student = User.objects.get(id=student_id)
     except User.DoesNotExist:
         return Response({'error': 'Student not found'}, status=404)
 
-    hostel_bookings = HostelBooking.objects.filter(student=student)
-    library_bookings = LibraryBooking.objects.filter(student=student)
-    complaints = Complaint.objects.filter(submitted_by=student)
-    reviews = Review.objects.filter(name=student.username)
-
-    pdf_buffer = generate_student_profile_pdf(student, hostel_bookings, library_bookings, complaints, reviews)
-
-    return HttpResponse(pdf_buffer, content_type='application/pdf')
+    return HttpResponse(profile_report.get_pdf(student), content_type='application/pdf')
 
 
 @swagger_auto_schema(
     method='post',
     request_body=AdminSendEmailSerializer,
-    operation_description="Admin: Send email to students by booking type (hostel/library/both)",
-    responses={200: "Email sent", 400: "Validation error or no emails"}
+    operation_description="Admin: Queue an email campaign to students by booking type (hostel/library/both). "
+                          "Each student gets their own message; {first_name} in the message is personalised.",
+    responses={202: "Campaign queued", 400: "Validation error or no emails"}
 )
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 def send_email_to_students(request):
+    from django.db import transaction
+    from core.services import campaign_service
+    from core.tasks import send_email_campaign
+
     serializer = AdminSendEmailSerializer(data=request.data)
     if serializer.is_valid():
         subject = serializer.validated_data['subject']
@@ -505,45 +498,180 @@ def send_email_to_students(request):
         else:
             students = User.objects.filter(id__in=recipient_ids).filter(id__in=eligible_ids)
 
-        email_list = [user.email for user in students if user.email]
+        students = list(students.exclude(email='').only('id', 'email', 'first_name'))
 
-        if not email_list:
+        if not students:
             return Response({'error': 'No valid emails found for selected students.'}, status=400)
 
-        try:
-            # logo_url = "https://a1ajinkya.com/static/images/logo.png"
-            logo_url = request.build_absolute_uri('/static/images/logo.png')
-
-            # Format message before f-string to avoid f-string escape issue
-            formatted_message = message.replace('\n', '<br>')
-
-            html_message = f"""
-                <div style="font-family: Arial, sans-serif; padding: 10px;">
-                    <img src="{logo_url}" alt="Bussiness Track Hostel & Library" style="max-width: 200px; margin-bottom: 20px;" />
-                    <p>{formatted_message}</p>
-                    <br>
-                    <p>Thanks & Regards,<br>
-                    Admin,<br>
-                    <strong>Bussiness Track Hostel & Library</strong></p>
-                </div>
-            """
-
-            email = EmailMessage(
-                subject=subject,
-                body=html_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=email_list
-            )
-            email.content_subtype = "html"
-            email.send()
+        # logo_url = "https://a1ajinkya.com/static/images/logo.png"
+        logo_url = request.build_absolute_uri('/static/images/logo.png')
 
-            return Response({'message': f'Email sent to {len(email_list)} student(s) successfully.'})
-        except Exception as e:
-            return Response({'error': str(e)}, status=500)
+        campaign = campaign_service.create_campaign(request.user, subject, message, logo_url, target_group, students)
+        transaction.on_commit(lambda: send_email_campaign.delay(campaign.id))
+
+        return Response({
+            'message': f'Email queued for {campaign.recipients.count()} student(s).',
+            'campaign_id': campaign.id,
+            'progress_url': request.build_absolute_uri(f'/api/admin/email-campaigns/{campaign.id}/'),
+        }, status=status.HTTP_202_ACCEPTED)
 
     return Response(serializer.errors, status=400)
 
 
+@swagger_auto_schema(
+    method='get',
+    operation_description="Admin: Progress of an email campaign (sent / failed / remaining)",
+    responses={200: "Campaign progress", 404: "Campaign not found"}
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def email_campaign_progress(request, campaign_id):
+    from core.models import EmailCampaign
+    from core.services import campaign_service
+
+    try:
+        campaign = EmailCampaign.objects.get(id=campaign_id)
+    except EmailCampaign.DoesNotExist:
+        return Response({'error': 'Campaign not found'}, status=404)
+
+    return Response(campaign_service.get_progress(campaign))
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('month', openapi.IN_QUERY, type=openapi.TYPE_STRING, description="YYYY-MM"),
+        openapi.Parameter('vertical', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                          description="hostel, library or all (default)"),
+        openapi.Parameter('is_paid', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN),
+        openapi.Parameter('student_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        openapi.Parameter('output', openapi.IN_QUERY, type=openapi.TYPE_STRING, description="zip (default) or pdf"),
+    ],
+    operation_description="Admin: All monthly invoice PDFs for a month (or a filtered set) as a ZIP "
+                          "or as one merged PDF",
+    responses={200: "ZIP or PDF", 400: "Invalid parameters", 404: "No invoices matched"}
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def batch_invoice_pdfs(request):
+    from datetime import datetime
+    from django.http import StreamingHttpResponse
+    from core.services import invoice_batch
+
+    params = request.query_params
+    vertical = params.get('vertical', 'all')
+    output = params.get('output', invoice_batch.ZIP)
+    if vertical not in ('hostel', 'library', 'all'):
+        return Response({'error': 'vertical must be hostel, library or all.'}, status=400)
+    if output not in invoice_batch.OUTPUTS:
+        return Response({'error': f"output must be one of {', '.join(invoice_batch.OUTPUTS)}."}, status=400)
+    if not params.get('month') and not params.get('student_id'):
+        return Response({'error': 'Give a month (YYYY-MM) or a student_id.'}, status=400)
+
+    try:
+        month = datetime.strptime(params['month'], '%Y-%m').date() if params.get('month') else None
+        student_id = int(params['student_id']) if params.get('student_id') else None
+    except ValueError:
+        return Response({'error': 'month must be YYYY-MM and student_id an integer.'}, status=400)
+    is_paid = {'true': True, 'false': False}.get(params.get('is_paid', '').lower())
+
+    verticals = ('hostel', 'library') if vertical == 'all' else (vertical,)
+    selected = invoice_batch.invoice_fields(verticals, month, is_paid, student_id)
+    if not selected:
+        return Response({'error': 'No invoices matched.'}, status=404)
+
+    filename = f"invoices_{vertical}_{month:%Y-%m}" if month else f"invoices_{vertical}_student_{student_id}"
+    if output == invoice_batch.PDF:
+        response = HttpResponse(invoice_batch.merged_pdf(selected), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.pdf"'
+    else:
+        response = StreamingHttpResponse(invoice_batch.zip_chunks(selected), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.zip"'
+    return response
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=ExportJobRequestSerializer,
+    operation_description="Admin: Queue an export (hostel_bookings, library_bookings, hostel_invoices, "
+                          "library_invoices or students) as csv, gzip or xlsx. The file is built by a worker; "
+                          "poll status_url or listen for an `export_job` frame on the seat-map socket.",
+    responses={202: "Export queued", 400: "Invalid dataset, output or filters"}
+)
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def create_export_job(request):
+    from django.db import transaction
+    from core.services import export_jobs
+    from core.tasks import run_export_job
+
+    serializer = ExportJobRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+
+    try:
+        job = export_jobs.create_job(request.user, **serializer.validated_data)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    transaction.on_commit(lambda: run_export_job.delay(job.id))
+
+    return Response({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': request.build_absolute_uri(f'/api/admin/export-jobs/{job.id}/'),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Admin: Status of an export job, with a download_url once it has completed",
+    responses={200: "Job status", 404: "Job not found"}
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_job_status(request, job_id):
+    from core.models import ExportJob
+    from core.services import export_jobs
+
+    try:
+        job = ExportJob.objects.get(id=job_id)
+    except ExportJob.DoesNotExist:
+        return Response({'error': 'Export job not found'}, status=404)
+
+    data = export_jobs.describe(job)
+    data['download_url'] = (request.build_absolute_uri(f'/api/admin/export-jobs/{job.id}/download/')
+                            if job.status == 'completed' else None)
+    return Response(data)
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Admin: Download the file produced by a completed export job",
+    responses={200: "File", 404: "Job not found", 409: "Not ready", 410: "Expired"}
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def download_export_job(request, job_id):
+    from django.http import FileResponse
+    from core.models import ExportJob
+    from core.services import export_service
+
+    try:
+        job = ExportJob.objects.get(id=job_id)
+    except ExportJob.DoesNotExist:
+        return Response({'error': 'Export job not found'}, status=404)
+
+    if job.status == 'expired':
+        return Response({'error': 'Export has expired; submit it again.'}, status=410)
+    if job.status != 'completed':
+        return Response({'error': f'Export is {job.status}.'}, status=409)
+
+    _, content_type, extension = export_service.WRITERS[job.output]
+    return FileResponse(job.file.open('rb'), as_attachment=True,
+                        filename=f'{job.dataset}.{extension}', content_type=content_type)
+
+
 class AchievementBlogViewSet(viewsets.ModelViewSet):
     queryset = AchievementBlog.objects.all().order_by('-created_at')
     serializer_class = AchievementBlogSerializer
@@ -576,3 +704,24 @@ class AchievementBlogViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         self.perform_destroy(instance)
         return Response({"message": "Achievement blog deleted successfully."}, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Admin: Seat-map broadcast counters for this worker (queued, coalesced, sent)",
+    responses={200: "Counters"}
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def broadcast_stats(request):
+    from core.services.broadcast_service import get_counters
+    return Response(get_counters())
+
+
+def metrics(request):
+    """Prometheus scrape endpoint; needs `Authorization: Bearer <METRICS_TOKEN>` or a staff session."""
+    from core.services import metrics as metrics_service
+
+    if not metrics_service.authorized(request.headers.get('Authorization'), request.user):
+        return HttpResponse(status=401)
+    return HttpResponse(metrics_service.render(), content_type=metrics_service.CONTENT_TYPE)
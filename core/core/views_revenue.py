@@ -1,8 +1,9 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework import status
 from rest_framework.permissions import IsAdminUser
 from core.services.revenue_service import (
-    HostelRevenueService, LibraryRevenueService, CombinedRevenueService
+    HostelRevenueService, LibraryRevenueService, CombinedRevenueService, GROUP_BY_CHOICES
 )
 
 class RevenueSummaryView(APIView):
@@ -12,12 +13,20 @@ class RevenueSummaryView(APIView):
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
         mode = request.GET.get('mode', 'combined')  # hostel | library | combined
+        group_by = request.GET.get('group_by')  # month | week | day, adds a per-period series
+
+        if group_by and group_by not in GROUP_BY_CHOICES:
+            return Response({"error": f"group_by must be one of {', '.join(GROUP_BY_CHOICES)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
 
         if mode == 'hostel':
-            data = HostelRevenueService.get_summary(start_date, end_date)
+            data = HostelRevenueService.get_summary(start_date, end_date, group_by)
         elif mode == 'library':
-            data = LibraryRevenueService.get_summary(start_date, end_date)
+            data = LibraryRevenueService.get_summary(start_date, end_date, group_by)
         else:
-            data = CombinedRevenueService.get_summary(start_date, end_date)
+            data = CombinedRevenueService.get_summary(start_date, end_date, group_by)
 
-        return Response({"mode": mode, "data": data})
+        response = {"mode": mode, "data": data}
+        if group_by:
+            response["group_by"] = group_by
+        return Response(response)
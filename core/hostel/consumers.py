@@ -1,9 +1,12 @@
 import json
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from core.services import metrics, seat_map_stream
+
 
 class SeatUpdateConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.group_name = 'live_seat_updates'
+        self.group_name = seat_map_stream.GROUP_NAME
 
         # Join group
         await self.channel_layer.group_add(
@@ -11,8 +14,10 @@ class SeatUpdateConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         await self.accept()
+        metrics.WEBSOCKET_CONNECTIONS.inc(group=self.group_name)
 
     async def disconnect(self, close_code):
+        metrics.WEBSOCKET_CONNECTIONS.dec(group=self.group_name)
         # Leave group
         await self.channel_layer.group_discard(
             self.group_name,
@@ -20,8 +25,24 @@ class SeatUpdateConsumer(AsyncWebsocketConsumer):
         )
 
     async def receive(self, text_data):
-        # Optional: handle data sent from frontend if needed
-        pass
+        # Client sends {"action": "resync", "last_seq": <int or null>} after (re)connecting
+        try:
+            message = json.loads(text_data)
+        except (TypeError, ValueError):
+            return
+        if not isinstance(message, dict) or message.get("action") != "resync":
+            return
+
+        last_seq = message.get("last_seq")
+        events = None
+        if isinstance(last_seq, int):
+            events = await database_sync_to_async(seat_map_stream.replay_since)(last_seq)
+
+        if events is None:
+            payload = await database_sync_to_async(seat_map_stream.snapshot)()
+        else:
+            payload = {"type": "replay", "seq": events[-1]["seq"] if events else last_seq, "events": events}
+        await self.send(text_data=json.dumps(payload))
 
     async def send_seat_update(self, event):
         await self.send(text_data=json.dumps(event["data"]))
@@ -1,34 +1,30 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from hostel.models import HostelBooking
-from library.models import LibraryBooking
+from core.services.expiry_service import release_expired_bookings
+
 
 class Command(BaseCommand):
     help = 'Auto-release expired hostel and library bookings'
 
-    def handle(self, *args, **kwargs):
-        today = timezone.now().date()
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Show what would be released without changing anything')
 
-        # Hostel logic
-        expired_hostel = HostelBooking.objects.filter(end_date__lt=today, status='approved')
-        hostel_count = 0
-        for booking in expired_hostel:
-            booking.status = 'expired'
-            booking.bed.is_booked = False
-            booking.bed.save()
-            booking.save()
-            hostel_count += 1
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        result = release_expired_bookings(dry_run=dry_run)
+        hostel, library = result['hostel'], result['library']
 
-        # Library logic
-        expired_library = LibraryBooking.objects.filter(booking_date__lt=today, status='approved')
-        library_count = 0
-        for booking in expired_library:
-            booking.status = 'expired'
-            booking.seat.is_booked = False
-            booking.seat.save()
-            booking.save()
-            library_count += 1
+        if dry_run:
+            self.stdout.write(f"Hostel bookings to expire: {hostel['booking_ids']} (beds freed: {hostel['freed_ids']})")
+            self.stdout.write(f"Library bookings to expire: {library['booking_ids']} "
+                              f"(seats freed: {library['freed_ids']})")
+            self.stdout.write(self.style.WARNING(
+                f"Dry run: {hostel['bookings']} hostel bookings & {library['bookings']} library bookings "
+                f"would be released ({result['duration_ms']}ms)."
+            ))
+            return
 
         self.stdout.write(self.style.SUCCESS(
-            f'{hostel_count} hostel bookings & {library_count} library bookings auto-released. ✅'
+            f"{hostel['bookings']} hostel bookings & {library['bookings']} library bookings auto-released, "
+            f"{hostel['released']} beds & {library['released']} seats freed in {result['duration_ms']}ms. ✅"
         ))
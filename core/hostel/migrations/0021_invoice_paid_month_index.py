@@ -0,0 +1,17 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hostel', '0020_hostelavailableswitchhistory_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hostelmonthlyinvoice',
+            index=models.Index(fields=['is_paid', 'month'], name='hostel_host_is_paid_224947_idx'),
+        ),
+    ]
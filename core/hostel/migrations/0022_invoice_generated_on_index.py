@@ -0,0 +1,17 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hostel', '0021_invoice_paid_month_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hostelmonthlyinvoice',
+            index=models.Index(fields=['generated_on'], name='hostel_host_generat_38e861_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hostel', '0023_booking_aadhaar_documents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hostelbooking',
+            name='aadhaar_back_photo_processed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='hostelbooking',
+            name='aadhaar_front_photo_processed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -3,6 +3,7 @@ from rest_framework import serializers
 from .models import HostelRoom, HostelBed, HostelBooking, HostelMonthlyFee, HostelMonthlyInvoice, \
     HostelAvailableSwitchRequest, HostelMutualSwitchRequest, HostelAvailableSwitchHistory, HostelMutualSwitchHistory
 from users.serializers import UserSerializer
+from core.services import broadcast_service, seat_map_stream
 
 
 class HostelRoomSerializer(serializers.ModelSerializer):
@@ -26,15 +27,16 @@ class HostelBedSerializer(serializers.ModelSerializer):
         ]
 
     def get_status(self, obj):
-        from hostel.models import HostelBooking
         if obj.is_booked:
             return "Booked"
-        pending = HostelBooking.objects.filter(bed=obj, status='pending').exists()
-        return "Pending" if pending else "Available"
+        return "Pending" if self.get_pending_count(obj) else "Available"
 
     pending_count = serializers.SerializerMethodField()
 
     def get_pending_count(self, obj):
+        # Annotated by HostelOccupancyService.get_beds() for the live map
+        if hasattr(obj, 'pending_bookings'):
+            return obj.pending_bookings
         from .models import HostelBooking
         return HostelBooking.objects.filter(bed=obj, status='pending').count()
 
@@ -57,7 +59,8 @@ class HostelBookingSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = [
             'id', 'student', 'bed', 'status', 'approved_by', 'approved_at', 'purpose_of_joining',
-            'monthly_fee', 'deposit_amount', 'created_at', 'billing_summary'
+            'monthly_fee', 'deposit_amount', 'created_at', 'billing_summary',
+            'aadhaar_front_document', 'aadhaar_back_document',
         ]
 
     def validate(self, data):
@@ -65,36 +68,26 @@ class HostelBookingSerializer(serializers.ModelSerializer):
         user = request.user
 
         if request.method == 'POST':
-            aadhaar_present = False
+            from core.services import kyc_service
+            from users.models import KycDocument
 
-            from hostel.models import HostelBooking
-            from library.models import LibraryBooking
-
-            # Check hostel booking
-            hostel = HostelBooking.objects.filter(student=user, status__in=['approved', 'pending']).last()
-            if hostel and hostel.aadhaar_front_photo and hostel.aadhaar_back_photo:
-                aadhaar_present = True
-
-            # Check library booking
-            library = LibraryBooking.objects.filter(student=user, status__in=['approved', 'pending']).last()
-            if library and library.aadhaar_front_photo and library.aadhaar_back_photo:
-                aadhaar_present = True
+            # Documents the student uploaded before (any booking, either vertical)
+            self._kyc_documents = kyc_service.current_documents(user)
 
             # Aadhaar required only if not already present
-            if not aadhaar_present:
+            if not kyc_service.has_aadhaar(self._kyc_documents):
                 if not data.get('aadhaar_front_photo') or not data.get('aadhaar_back_photo'):
                     raise serializers.ValidationError("Aadhaar front and back photo are required.")
 
             # Profile photo logic
-            if not user.profile_photo and not data.get('aadhaar_front_photo'):
+            if not user.profile_photo and not data.get('aadhaar_front_photo') \
+                    and KycDocument.AADHAAR_FRONT not in self._kyc_documents:
                 raise serializers.ValidationError("Profile photo or Aadhaar front is required.")
 
         return data
 
     def create(self, validated_data):
         from .models import HostelMonthlyFee
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
 
         user = self.context['request'].user
 
@@ -117,6 +110,10 @@ class HostelBookingSerializer(serializers.ModelSerializer):
         validated_data['deposit_amount'] = fee_config.deposit_amount
         print(f"Billing - Fee: {monthly_fee}, Deposit: {fee_config.deposit_amount}")
 
+        from core.services import kyc_service
+
+        kyc_service.attach(user, validated_data, getattr(self, '_kyc_documents', {}))
+
         booking = HostelBooking.objects.create(
             student=user,
             status='pending',
@@ -124,20 +121,13 @@ class HostelBookingSerializer(serializers.ModelSerializer):
         )
 
         # WebSocket trigger for admin live map
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "live_seat_updates",
-            {
-                "type": "send_seat_update",
-                "data": {
-                    "type": "booking_pending",
-                    "bed_id": booking.bed.id,
-                    "room_id": booking.bed.room.id,
-                    "is_booked": False,
-                    "student": booking.student.username,
-                }
-            }
-        )
+        broadcast_service.queue_seat_event({
+            "type": "booking_pending",
+            "bed_id": booking.bed.id,
+            "room_id": booking.bed.room.id,
+            "is_booked": False,
+            "student": booking.student.username,
+        }, [(seat_map_stream.BED, booking.bed.id)])
 
         return booking
 
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+
+from core.services import image_pipeline, invoice_pdf_cache, occupancy_counters, profile_report, revenue_rollup
+from .models import HostelBed, HostelBooking, HostelMonthlyInvoice
+
+for model in (HostelBooking, HostelBed):
+    pre_save.connect(occupancy_counters.capture_state, sender=model)
+
+post_save.connect(occupancy_counters.booking_saved, sender=HostelBooking)
+pre_delete.connect(occupancy_counters.lock_pending_resource, sender=HostelBooking)
+post_delete.connect(occupancy_counters.booking_deleted, sender=HostelBooking)
+post_save.connect(occupancy_counters.resource_saved, sender=HostelBed)
+post_delete.connect(occupancy_counters.resource_deleted, sender=HostelBed)
+
+post_save.connect(revenue_rollup.invoice_changed, sender=HostelMonthlyInvoice)
+post_delete.connect(revenue_rollup.invoice_changed, sender=HostelMonthlyInvoice)
+
+# Cached invoice PDFs, dropped after the change commits
+post_save.connect(invoice_pdf_cache.invoice_changed, sender=HostelMonthlyInvoice)
+post_delete.connect(invoice_pdf_cache.invoice_changed, sender=HostelMonthlyInvoice)
+
+# Cached student profile reports
+post_save.connect(profile_report.booking_changed, sender=HostelBooking)
+post_delete.connect(profile_report.booking_changed, sender=HostelBooking)
+
+# Aadhaar uploads: metadata stripped and derivatives written by a worker
+post_init.connect(image_pipeline.remember_images, sender=HostelBooking)
+post_save.connect(image_pipeline.images_saved, sender=HostelBooking)
@@ -1,23 +1,13 @@
 # hostel/tasks.py
 
 from celery import shared_task
-from datetime import date, timedelta
-from hostel.models import HostelMonthlyInvoice
 
 
 @shared_task
 def reset_hostel_invoice_payments():
-    today = date.today()
-    invoices = HostelMonthlyInvoice.objects.filter(is_paid=True)
-
-    count = 0
-    for invoice in invoices:
-        if today > (invoice.month + timedelta(days=30)):
-            invoice.is_paid = False
-            invoice.save()
-            count += 1
-
-    return f"{count} hostel invoices reset to unpaid."
+    # Kept for existing beat entries; see core.tasks.reset_invoice_payments
+    from core.tasks import reset_invoice_payments
+    return reset_invoice_payments('hostel')
 
 # from django.utils import timezone
 # from hostel.models import HostelBooking
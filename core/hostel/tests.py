@@ -1,3 +1,483 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.checks import shared_cache_check
+from core.models import NotificationOutbox
+from core.services import broadcast_service, expiry_service, invoice_pdf_cache, occupancy_counters, seat_map_stream
+from library.models import LibraryBooking, LibrarySeat
+from users.models import User
+from .consumers import SeatUpdateConsumer
+from .models import HostelRoom, HostelBed, HostelBooking, HostelMonthlyFee, HostelMonthlyInvoice
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def skip_image_queue(test):
+    """TransactionTestCase really commits, so stop uploads from being queued to a broker that isn't running."""
+    patcher = mock.patch('core.services.image_pipeline.enqueue')
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+def make_student(username):
+    return User.objects.create_user(username=username, password='pass', role='student',
+                                    first_name=username, last_name='Test', email=f'{username}@example.com')
+
+
+def make_booking(student, resource, status):
+    """A hostel booking for a HostelBed, a library booking for a LibrarySeat."""
+    model, field = (LibraryBooking, 'seat') if isinstance(resource, LibrarySeat) else (HostelBooking, 'bed')
+    return model.objects.create(
+        student=student, status=status, start_date=date.today(), **{field: resource},
+        aadhaar_front_photo=SimpleUploadedFile('front.jpg', b'x'),
+        aadhaar_back_photo=SimpleUploadedFile('back.jpg', b'x'),
+    )
+
+
+def listen_seat_map(action, group=seat_map_stream.GROUP_NAME):
+    """Run `action` with a channel in the seat-map (or another) group; return the frames it received."""
+    layer = get_channel_layer()
+    channel = async_to_sync(layer.new_channel)()
+    async_to_sync(layer.group_add)(group, channel)
+    action()
+
+    frames = []
+    while True:
+        try:
+            frames.append(async_to_sync(asyncio.wait_for)(layer.receive(channel), 0.1)['data'])
+        except asyncio.TimeoutError:
+            return frames
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, MEDIA_ROOT=tempfile.mkdtemp())
+class HostelLiveMapTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_student('viewer'))
+        self.room = HostelRoom.objects.create(room_number='101', capacity=4)
+
+    def add_bed(self, number):
+        return HostelBed.objects.create(room=self.room, bed_number=number)
+
+    def live_map(self):
+        response = self.client.get('/api/hostel/beds/live-map/')
+        self.assertEqual(response.status_code, 200)
+        return {row['id']: row for row in response.json()}
+
+    def test_live_map_statuses(self):
+        free = self.add_bed('1')
+        pending = self.add_bed('2')
+        paid = self.add_bed('3')
+        stale = self.add_bed('4')
+
+        make_booking(make_student('p1'), pending, 'pending')
+        make_booking(make_student('p2'), pending, 'pending')
+        paid_booking = make_booking(make_student('b1'), paid, 'approved')
+        stale_booking = make_booking(make_student('b2'), stale, 'approved')
+
+        this_month = date.today().replace(day=1)
+        last_month = (this_month - timedelta(days=1)).replace(day=1)
+        HostelMonthlyInvoice.objects.create(booking=paid_booking, invoice_id='INV-1', month=this_month,
+                                            amount=1500, total=1500, is_paid=True)
+        HostelMonthlyInvoice.objects.create(booking=stale_booking, invoice_id='INV-2', month=last_month,
+                                            amount=1500, total=1500, is_paid=True)
+
+        data = self.live_map()
+
+        self.assertEqual(data[free.id]['status'], 'available')
+        self.assertIsNone(data[free.id]['booking_id'])
+        self.assertEqual(data[pending.id]['status'], 'pending')
+        self.assertEqual(data[pending.id]['pending_count'], 2)
+        self.assertEqual(data[paid.id]['status'], 'booked')
+        self.assertEqual(data[paid.id]['booking_id'], paid_booking.id)
+        self.assertTrue(data[paid.id]['is_paid'])
+        self.assertFalse(data[paid.id]['invoice_expired'])
+        self.assertFalse(data[stale.id]['is_paid'])
+        self.assertTrue(data[stale.id]['invoice_expired'])
+        self.assertEqual(data[paid.id]['room']['room_number'], '101')
+
+    def test_live_map_query_count_is_constant(self):
+        for i in range(10):
+            bed = self.add_bed(str(i))
+            if i % 2:
+                booking = make_booking(make_student(f's{i}'), bed, 'approved')
+                HostelMonthlyInvoice.objects.create(booking=booking, invoice_id=f'INV-{i}',
+                                                    month=date.today().replace(day=1), amount=1500, total=1500)
+            else:
+                make_booking(make_student(f's{i}'), bed, 'pending')
+
+        with self.assertNumQueries(1):
+            self.client.get('/api/hostel/beds/live-map/')
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, MEDIA_ROOT=tempfile.mkdtemp())
+class SeatMapStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        room = HostelRoom.objects.create(room_number='101', capacity=4)
+        self.bed = HostelBed.objects.create(room=room, bed_number='1')
+
+    def resync(self, last_seq):
+        async def run():
+            communicator = WebsocketCommunicator(SeatUpdateConsumer.as_asgi(), '/ws/seat-updates/')
+            await communicator.connect()
+            await communicator.send_json_to({"action": "resync", "last_seq": last_seq})
+            response = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return response
+
+        return async_to_sync(run)()
+
+    def test_events_carry_sequence_and_delta(self):
+        booking = make_booking(make_student('s1'), self.bed, 'pending')
+        first = seat_map_stream.publish({"type": "booking_pending"}, [(seat_map_stream.BED, self.bed.id)])
+
+        booking.status = 'approved'
+        booking.save()
+        second = seat_map_stream.publish({"type": "booking_approved"}, [(seat_map_stream.BED, self.bed.id)])
+
+        self.assertEqual(second['seq'], first['seq'] + 1)
+        self.assertEqual(second['deltas'], [{
+            "kind": "bed", "id": self.bed.id, "from": "pending", "to": "booked", "booking_id": booking.id,
+        }])
+
+    def test_resync_replays_missed_events(self):
+        make_booking(make_student('s1'), self.bed, 'pending')
+        first = seat_map_stream.publish({"type": "booking_pending"}, [(seat_map_stream.BED, self.bed.id)])
+        second = seat_map_stream.publish({"type": "booking_pending"}, [(seat_map_stream.BED, self.bed.id)])
+
+        response = self.resync(first['seq'])
+        self.assertEqual(response['type'], 'replay')
+        self.assertEqual([event['seq'] for event in response['events']], [second['seq']])
+
+    def test_resync_falls_back_to_snapshot(self):
+        make_booking(make_student('s1'), self.bed, 'pending')
+        seat_map_stream.publish({"type": "booking_pending"}, [(seat_map_stream.BED, self.bed.id)])
+
+        for last_seq in (None, seat_map_stream.current_seq() + 10):
+            response = self.resync(last_seq)
+            self.assertEqual(response['type'], 'snapshot')
+            self.assertEqual(response['beds'], {str(self.bed.id): 'pending'})
+
+    def test_status_swap_waits_for_the_lock_and_outlives_a_dead_holder(self):
+        cache.add(seat_map_stream.STATUS_LOCK_KEY, 'crashed-worker', 60)
+        with mock.patch.object(seat_map_stream, 'STATUS_LOCK_SECONDS', 0.05):
+            delta = seat_map_stream.build_delta(seat_map_stream.BED, self.bed.id)
+        self.assertEqual((delta['from'], delta['to']), (None, 'available'))
+        # Our own release never removes someone else's lock
+        self.assertEqual(cache.get(seat_map_stream.STATUS_LOCK_KEY), 'crashed-worker')
+
+    def test_state_and_seq_are_taken_under_the_status_lock(self):
+        make_booking(make_student('s1'), self.bed, 'pending')
+        held = []
+
+        def under_lock(real):
+            def wrapper(*args):
+                held.append(cache.get(seat_map_stream.STATUS_LOCK_KEY) is not None)
+                return real(*args)
+            return wrapper
+
+        with mock.patch.object(seat_map_stream, 'get_occupancy', under_lock(seat_map_stream.get_occupancy)), \
+                mock.patch.object(seat_map_stream, 'next_seq', under_lock(seat_map_stream.next_seq)):
+            frame = seat_map_stream.publish({"type": "booking_pending"}, [(seat_map_stream.BED, self.bed.id)])
+
+        self.assertEqual(held, [True, True])
+        self.assertEqual(frame['deltas'][0]['to'], 'pending')
+
+    @override_settings(TESTING=False, DEBUG=False,
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_fails_the_system_check(self):
+        self.assertEqual([e.id for e in shared_cache_check(None)], ['core.E001'])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, MEDIA_ROOT=tempfile.mkdtemp(),
+                   SEAT_MAP_BROADCAST_DEBOUNCE_MS=0)
+class BroadcastCoalescingTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        skip_image_queue(self)
+        room = HostelRoom.objects.create(room_number='101', capacity=4)
+        self.bed = HostelBed.objects.create(room=room, bed_number='1')
+
+    def test_approve_request_sends_one_batched_frame(self):
+        admin = User.objects.create_user(username='admin', password='pass', role='admin', is_staff=True)
+        booking = make_booking(make_student('s1'), self.bed, 'pending')
+        make_booking(make_student('s2'), self.bed, 'pending')
+        make_booking(make_student('s3'), self.bed, 'pending')
+        client = APIClient()
+        client.force_authenticate(admin)
+        before = broadcast_service.get_counters()
+
+        frames = listen_seat_map(lambda: client.post(f'/api/hostel/bookings/{booking.id}/approve/'))
+
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0]['type'], 'batch')
+        self.assertEqual([event['type'] for event in frames[0]['events']],
+                         ['booking_rejected', 'booking_rejected', 'booking_approved'])
+        self.assertEqual(frames[0]['deltas'], [{
+            "kind": "bed", "id": self.bed.id, "from": None, "to": "booked", "booking_id": booking.id,
+        }])
+
+        after = broadcast_service.get_counters()
+        self.assertEqual(after['queued'] - before['queued'], 3)
+        self.assertEqual(after['coalesced'] - before['coalesced'], 2)
+        self.assertEqual(after['sent'] - before['sent'], 1)
+
+        # Notifications are stored for the outbox worker, not sent in the request
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(NotificationOutbox.objects.filter(channel='email').count(), 3)
+
+    def test_rolled_back_events_are_dropped(self):
+        def action():
+            with broadcast_service.batch():
+                with transaction.atomic():
+                    broadcast_service.queue_seat_event({"type": "kept"}, [(seat_map_stream.BED, self.bed.id)])
+                try:
+                    with transaction.atomic():
+                        broadcast_service.queue_seat_event({"type": "dropped"}, [(seat_map_stream.BED, self.bed.id)])
+                        raise ValueError
+                except ValueError:
+                    pass
+
+        frames = listen_seat_map(action)
+        self.assertEqual([frame['type'] for frame in frames], ['kept'])
+
+    @override_settings(SEAT_MAP_BROADCAST_DEBOUNCE_MS=60000)
+    def test_task_batches_send_synchronously_and_waiting_frames_flush_at_exit(self):
+        def burst():
+            for kind in ('first', 'second'):
+                with broadcast_service.batch():
+                    broadcast_service.queue_seat_event({"type": kind}, [(seat_map_stream.BED, self.bed.id)])
+
+        # The second batch is inside the debounce interval and still goes out before batch() returns
+        self.assertEqual([frame['type'] for frame in listen_seat_map(burst)], ['first', 'second'])
+
+        def left_to_the_timer():
+            broadcast_service.queue_seat_event({"type": "waiting"}, [(seat_map_stream.BED, self.bed.id)])
+            broadcast_service._debouncer.flush_all()  # what atexit runs
+
+        self.assertEqual([frame['type'] for frame in listen_seat_map(left_to_the_timer)], ['waiting'])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BulkInvoiceGenerationTests(TestCase):
+    url = '/api/hostel/admin/generate-central-invoices/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='pass', is_staff=True))
+        HostelMonthlyFee.objects.create(monthly_fee=1500, deposit_amount=2000)
+        room = HostelRoom.objects.create(room_number='101', capacity=10)
+        self.this_month = date.today().replace(day=1)
+        last_month = (self.this_month - timedelta(days=1)).replace(day=1)
+
+        self.new = make_booking(make_student('new'), HostelBed.objects.create(room=room, bed_number='1'), 'approved')
+        self.new.start_date = self.this_month.replace(day=15)
+        self.new.save()
+        self.returning = make_booking(make_student('ret'), HostelBed.objects.create(room=room, bed_number='2'),
+                                      'approved')
+        HostelMonthlyInvoice.objects.create(booking=self.returning, invoice_id='INV-OLD', month=last_month,
+                                            amount=1500, total=1500)
+        self.done = make_booking(make_student('done'), HostelBed.objects.create(room=room, bed_number='3'),
+                                 'approved')
+        HostelMonthlyInvoice.objects.create(booking=self.done, invoice_id='INV-DONE', month=self.this_month,
+                                            amount=1500, total=1500)
+        make_booking(make_student('pend'), HostelBed.objects.create(room=room, bed_number='4'), 'pending')
+
+    def test_dry_run_previews_without_writing(self):
+        response = self.client.post(self.url, {'dry_run': True}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body['dry_run'])
+        rows = {row['booking_id']: row for row in body['invoices']}
+        self.assertEqual(set(rows), {self.new.id, self.returning.id})
+        self.assertEqual((float(rows[self.new.id]['amount']), float(rows[self.new.id]['deposit'])), (1000, 2000))
+        self.assertEqual((float(rows[self.returning.id]['amount']), float(rows[self.returning.id]['deposit'])),
+                         (1500, 0))
+        self.assertEqual(float(body['totals']['total']), 4500)
+        self.assertEqual(HostelMonthlyInvoice.objects.filter(month=self.this_month).count(), 1)
+
+    def test_generation_uses_constant_queries(self):
+        for i in range(5):
+            make_booking(make_student(f'extra{i}'), HostelBed.objects.create(room=self.new.bed.room,
+                                                                            bed_number=f'x{i}'), 'approved')
+
+        with self.assertNumQueries(13):  # includes the inserted-row count (2) and revenue rollup refresh (4)
+            response = self.client.post(self.url, {}, format='json')
+
+        self.assertEqual(response.json()['totals']['count'], 7)
+        self.assertEqual(HostelMonthlyInvoice.objects.filter(month=self.this_month).count(), 8)
+        self.assertEqual(self.client.post(self.url, {}, format='json').json()['totals']['count'], 0)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, MEDIA_ROOT=tempfile.mkdtemp(),
+                   SEAT_MAP_BROADCAST_DEBOUNCE_MS=0)
+class BookingExpiryTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        skip_image_queue(self)
+        room = HostelRoom.objects.create(room_number='101', capacity=4)
+        self.beds = [HostelBed.objects.create(room=room, bed_number=str(i)) for i in range(3)]
+        yesterday = date.today() - timedelta(days=1)
+
+        self.expired = []
+        for i, bed in enumerate(self.beds):
+            booking = make_booking(make_student(f's{i}'), bed, 'approved')
+            booking.end_date = yesterday
+            booking.save()
+            self.expired.append(booking)
+        # Bed 2 is still held by another approved booking
+        make_booking(make_student('keeper'), self.beds[2], 'approved')
+
+        self.seat = LibrarySeat.objects.create(seat_number='A1')
+        self.library_booking = LibraryBooking.objects.create(
+            student=make_student('reader'), seat=self.seat, status='approved', start_date=yesterday,
+            end_date=yesterday, aadhaar_front_photo=SimpleUploadedFile('front.jpg', b'x'),
+            aadhaar_back_photo=SimpleUploadedFile('back.jpg', b'x'),
+        )
+        # The flush between TransactionTestCases drops the counters migration 0015 seeded
+        occupancy_counters.reconcile()
+
+    def test_dry_run_changes_nothing(self):
+        result = expiry_service.release_expired_bookings(dry_run=True)
+
+        self.assertEqual((result['hostel']['bookings'], result['hostel']['released']), (3, 2))
+        self.assertEqual(result['library']['freed_ids'], [self.seat.id])
+        self.assertFalse(HostelBooking.objects.filter(status='expired').exists())
+
+    def test_release_is_set_based_and_sends_one_frame(self):
+        def action():
+            with self.assertNumQueries(14):  # 10 for the release, 1 counter update and 1 delta query per kind
+                self.result = expiry_service.release_expired_bookings()
+
+        frames = listen_seat_map(action)
+
+        self.assertEqual((self.result['hostel']['bookings'], self.result['library']['bookings']), (3, 1))
+        self.assertEqual(HostelBooking.objects.filter(status='expired').count(), 3)
+        self.assertEqual(list(HostelBed.objects.filter(is_booked=False).order_by('id')), self.beds[:2])
+        self.assertTrue(HostelBed.objects.get(id=self.beds[2].id).is_booked)
+        self.assertFalse(LibrarySeat.objects.get(id=self.seat.id).is_booked)
+
+        self.assertEqual(len(frames), 1)
+        self.assertEqual([event['type'] for event in frames[0]['events']],
+                         ['booking_expired', 'booking_expired', 'library_booking_expired'])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), EXPORT_CHUNK_SIZE=2)
+class BookingExportTests(TestCase):
+    url = '/api/hostel/admin/export-csv/'
+
+    def setUp(self):
+        room = HostelRoom.objects.create(room_number='101', capacity=10)
+        for i in range(5):
+            make_booking(make_student(f'export{i}'), HostelBed.objects.create(room=room, bed_number=str(i)),
+                         'approved' if i % 2 else 'pending')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='pass', is_staff=True))
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_streams_projected_rows(self):
+        response = self.client.get(self.url)
+        with self.assertNumQueries(1):  # one projected SELECT, read through the iterator
+            content = b''.join(response.streaming_content)
+
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="hostel_bookings.csv"')
+        self.assertEqual(rows[0][:3], ['Username', 'First Name', 'Middle Name'])
+        self.assertEqual([(row[0], row[7], row[-1]) for row in rows[1:3]],
+                         [('export0', '101', 'PENDING'), ('export1', '101', 'APPROVED')])
+        self.assertEqual(len(rows), 6)
+
+    def test_gzip_and_xlsx_outputs(self):
+        response, content = self.download(output='gzip')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(len(gzip.decompress(content).decode().splitlines()), 6)
+
+        response, content = self.download(output='xlsx')
+        self.assertTrue(response['Content-Disposition'].endswith('hostel_bookings.xlsx"'))
+        with zipfile.ZipFile(io.BytesIO(content)) as workbook:
+            self.assertIsNone(workbook.testzip())
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 6)
+        self.assertIn('<t xml:space="preserve">export4</t>', sheet)
+
+    def test_unknown_output_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'output': 'pdf'}).status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class InvoicePdfCacheTests(TestCase):
+    def setUp(self):
+        student = make_student('pdf')
+        room = HostelRoom.objects.create(room_number='301', capacity=2)
+        booking = make_booking(student, HostelBed.objects.create(room=room, bed_number='1'), 'approved')
+        self.invoice = HostelMonthlyInvoice.objects.create(booking=booking, invoice_id='INV-PDF', month=date.today(),
+                                                           amount=1500, total=1500)
+        self.url = f'/api/hostel/invoices/{self.invoice.id}/download-pdf/'
+        self.client = APIClient()
+        self.client.force_authenticate(student)
+
+    def download(self, **headers):
+        with mock.patch.dict(invoice_pdf_cache.RENDERERS,
+                             hostel=mock.Mock(wraps=invoice_pdf_cache.RENDERERS['hostel'])) as renderers:
+            response = self.client.get(self.url, headers=headers)
+            return response, renderers['hostel'].call_count
+
+    def test_repeat_download_is_served_from_cache(self):
+        first, renders = self.download()
+        self.assertEqual((first.status_code, renders), (200, 1))
+        body = b''.join(first.streaming_content)
+        self.assertTrue(body.startswith(b'%PDF'))
+
+        second, renders = self.download()
+        self.assertEqual((renders, second['ETag']), (0, first['ETag']))
+        self.assertEqual(b''.join(second.streaming_content), body)
+
+        not_modified, renders = self.download(**{'If-None-Match': first['ETag']})
+        self.assertEqual((not_modified.status_code, renders), (304, 0))
+
+    def test_paying_the_invoice_renders_a_new_version(self):
+        unpaid, _ = self.download()
+
+        self.invoice.is_paid = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoice.save()
+        self.assertEqual(default_storage.listdir(f'invoice_pdfs/hostel/{self.invoice.id}')[1], [])
+
+        paid, renders = self.download(**{'If-None-Match': unpaid['ETag']})
+        self.assertEqual((paid.status_code, renders), (200, 1))
+        self.assertNotEqual(paid['ETag'], unpaid['ETag'])
+
+    def test_bulk_update_is_caught_by_the_content_key(self):
+        self.download()
+        HostelMonthlyInvoice.objects.filter(id=self.invoice.id).update(is_paid=True)
+
+        _, renders = self.download()
+        self.assertEqual(renders, 1)
+        self.assertEqual(len(default_storage.listdir(f'invoice_pdfs/hostel/{self.invoice.id}')[1]), 1)
+
+    def test_other_students_invoice_is_not_found(self):
+        self.client.force_authenticate(make_student('other'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
@@ -5,30 +5,32 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
 from django.http import HttpResponse
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from datetime import date, timedelta
-import csv
 from rest_framework.exceptions import PermissionDenied
 from .models import HostelRoom, HostelBed, HostelBooking, HostelMonthlyFee, HostelMonthlyInvoice, \
     HostelAvailableSwitchRequest, HostelMutualSwitchRequest, HostelAvailableSwitchHistory, HostelMutualSwitchHistory
 from .serializers import HostelRoomSerializer, HostelBedSerializer, HostelBookingSerializer, HostelMonthlyFeeSerializer, \
     HostelInvoiceAdminSerializer, HostelMonthlyInvoiceSerializer, HostelAvailableSwitchRequestSerializer, \
     HostelMutualSwitchRequestSerializer, HostelAvailableSwitchHistorySerializer, HostelMutualSwitchHistorySerializer
-from core.utils.email_utils import send_rejection_email, send_approval_email, send_custom_email
+from core.utils.email_utils import send_custom_email
 
-from core.utils.sms_utils import send_sms
 from core.utils.invoice_utils import generate_invoice_pdf
 from rest_framework.permissions import IsAuthenticated
 from core.utils.invoice_utils import generate_invoice_id
 from rest_framework import filters
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from core.utils.invoice_utils import generate_hostel_invoice_pdf
 from rest_framework.generics import ListAPIView
 from .filters import HostelInvoiceFilter
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Count, Q
+from core.filters import StudentSearchFilter
+from core.services import export_service
+from core.services.export_service import Column
+from core.utils.image_utils import derivative_urls
+from core.services.occupancy_service import HostelOccupancyService
+from core.services import broadcast_service, invoice_pdf_cache, notification_service, occupancy_counters, \
+    seat_map_stream
 
 
 #  Custom role-based permissions
@@ -79,6 +81,11 @@ class HostelBedViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['is_booked']
 
+    def get_queryset(self):
+        # Room and pending count in the same query, not one of each per bed (HostelBedSerializer)
+        return super().get_queryset().select_related('room').annotate(
+            pending_bookings=Count('bookings', filter=Q(bookings__status='pending')))
+
     def get_permissions(self):
         if self.action in ['list', 'retrieve', 'live_map']:
             return [permissions.IsAuthenticated()]
@@ -91,59 +98,9 @@ class HostelBedViewSet(viewsets.ModelViewSet):
     )
     @action(detail=False, methods=['get'], url_path='live-map', permission_classes=[permissions.AllowAny])
     def live_map(self, request):
-        beds = HostelBed.objects.select_related('room').all()
+        beds = HostelOccupancyService.get_beds()
         serializer = self.get_serializer(beds, many=True)
-        base_data = serializer.data
-
-        extended_data = []
-        for bed, base in zip(beds, base_data):
-            from hostel.models import HostelBooking, HostelMonthlyInvoice
-            from datetime import date
-            from calendar import monthrange
-
-            latest_booking = (
-                HostelBooking.objects
-                .filter(bed=bed)
-                .order_by('-created_at')
-                .first()
-            )
-
-            status = "available"
-            booking_id = None
-            is_paid = False
-            invoice_expired = True
-
-            if latest_booking:
-                if latest_booking.status == "pending":
-                    status = "pending"
-                    booking_id = latest_booking.id
-                elif latest_booking.status == "approved":
-                    status = "booked"
-                    booking_id = latest_booking.id
-
-                    latest_invoice = HostelMonthlyInvoice.objects.filter(booking=latest_booking).order_by(
-                        '-month').first()
-                    if latest_invoice:
-                        today = date.today()
-                        invoice_start = latest_invoice.month
-                        year, month = invoice_start.year, invoice_start.month
-                        last_day = monthrange(year, month)[1]
-                        invoice_end = invoice_start.replace(day=last_day)
-
-                        if today <= invoice_end:
-                            is_paid = latest_invoice.is_paid
-                            invoice_expired = not latest_invoice.is_paid
-                        else:
-                            is_paid = False
-                            invoice_expired = True
-
-            base['status'] = status
-            base['booking_id'] = booking_id
-            base['is_paid'] = is_paid
-            base['invoice_expired'] = invoice_expired
-            extended_data.append(base)
-
-        return Response(extended_data)
+        return Response(HostelOccupancyService.get_live_map(serializer))
 
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
@@ -172,7 +129,7 @@ class HostelBedViewSet(viewsets.ModelViewSet):
 class HostelBookingViewSet(viewsets.ModelViewSet):
     queryset = HostelBooking.objects.all()
     serializer_class = HostelBookingSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, StudentSearchFilter]
     filterset_fields = ['status', 'bed__room__room_number']
     search_fields = ['student__first_name', 'student__last_name', 'student__username']
 
@@ -182,8 +139,8 @@ class HostelBookingViewSet(viewsets.ModelViewSet):
         responses={200: "Booking approved", 400: "Already processed"}
     )
     @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
+    @transaction.atomic
     def approve(self, request, pk=None):
-        import threading
         booking = self.get_object()
 
         if booking.status != 'pending':
@@ -198,21 +155,8 @@ class HostelBookingViewSet(viewsets.ModelViewSet):
         booking.bed.is_booked = True
         booking.bed.save()
 
-        #  Notify approved student (email + sms)
-        try:
-            threading.Thread(target=send_approval_email, args=(
-                booking.student.email,
-                booking.student.username,
-                "Hostel"
-            )).start()
-
-            if booking.student.phone_number:
-                threading.Thread(target=send_sms, args=(
-                    booking.student.phone_number,
-                    f"Hi {booking.student.username}, your hostel booking has been approved."
-                )).start()
-        except Exception as e:
-            print("Approval notification failed:", e)
+        #  Notify approved student (email + sms, delivered from the outbox)
+        notification_service.notify_booking(booking.student, 'booking_approved', "Hostel")
 
         #  Reject & notify other pending bookings for same bed
         other_pending = HostelBooking.objects.filter(
@@ -221,55 +165,27 @@ class HostelBookingViewSet(viewsets.ModelViewSet):
         ).exclude(id=booking.id)
 
         for other in other_pending:
-            try:
-                threading.Thread(target=send_rejection_email, args=(
-                    other.student.email,
-                    other.student.username,
-                    "Hostel"
-                )).start()
-
-                if other.student.phone_number:
-                    threading.Thread(target=send_sms, args=(
-                        other.student.phone_number,
-                        f"Hi {other.student.username}, your hostel booking has been rejected."
-                    )).start()
-
-            except Exception as e:
-                print("Rejection notification failed:", e)
+            notification_service.notify_booking(other.student, 'booking_rejected', "Hostel")
 
             other.delete()
 
             #  WebSocket notify
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                "live_seat_updates",
-                {
-                    "type": "send_seat_update",
-                    "data": {
-                        "type": "booking_rejected",
-                        "bed_id": other.bed.id,
-                        "room_id": other.bed.room.id,
-                        "student": other.student.username,
-                        "is_booked": False
-                    }
-                }
-            )
+            broadcast_service.queue_seat_event({
+                "type": "booking_rejected",
+                "bed_id": other.bed.id,
+                "room_id": other.bed.room.id,
+                "student": other.student.username,
+                "is_booked": False
+            }, [(seat_map_stream.BED, other.bed.id)])
 
         #  WebSocket approve broadcast
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "live_seat_updates",
-            {
-                "type": "send_seat_update",
-                "data": {
-                    "type": "booking_approved",
-                    "bed_id": booking.bed.id,
-                    "room_id": booking.bed.room.id,
-                    "is_booked": True,
-                    "student": booking.student.username
-                }
-            }
-        )
+        broadcast_service.queue_seat_event({
+            "type": "booking_approved",
+            "bed_id": booking.bed.id,
+            "room_id": booking.bed.room.id,
+            "is_booked": True,
+            "student": booking.student.username
+        }, [(seat_map_stream.BED, booking.bed.id)])
 
         return Response({"detail": "Booking approved. Others rejected and notified."})
 
@@ -285,8 +201,8 @@ class HostelBookingViewSet(viewsets.ModelViewSet):
         responses={200: "Booking rejected", 400: "Already processed"}
     )
     @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
+    @transaction.atomic
     def reject(self, request, pk=None):
-        import threading
         booking = self.get_object()
 
         if booking.status != 'pending':
@@ -302,36 +218,18 @@ class HostelBookingViewSet(viewsets.ModelViewSet):
         booking.approved_by = request.user
         booking.save()
 
-        #  Email Notification (Threaded)
-        threading.Thread(target=send_rejection_email, args=(
-            booking.student.email,
-            booking.student.username,
-            "Hostel"
-        )).start()
-
-        #  SMS Notification (Threaded)
-        if booking.student.phone_number:
-            threading.Thread(target=send_sms, args=(
-                booking.student.phone_number,
-                f"Hi {booking.student.username}, your hostel booking has been rejected."
-            )).start()
+        #  Email + SMS Notification (delivered from the outbox)
+        notification_service.notify_booking(booking.student, 'booking_rejected', "Hostel")
 
         #  WebSocket update
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "live_seat_updates",
-            {
-                "type": "send_seat_update",
-                "data": {
-                    "type": "booking_rejected",
-                    "bed_id": booking.bed.id,
-                    "room_id": booking.bed.room.id,
-                    "is_booked": False,
-                    "rejected_by": booking.approved_by.username,
-                    "student": booking.student.username,
-                }
-            }
-        )
+        broadcast_service.queue_seat_event({
+            "type": "booking_rejected",
+            "bed_id": booking.bed.id,
+            "room_id": booking.bed.room.id,
+            "is_booked": False,
+            "rejected_by": booking.approved_by.username,
+            "student": booking.student.username,
+        }, [(seat_map_stream.BED, booking.bed.id)])
 
         return Response({"detail": "Booking rejected and student notified."})
 
@@ -354,32 +252,26 @@ class HostelBookingViewSet(viewsets.ModelViewSet):
 
     @swagger_auto_schema(
         method='get',
-        operation_description="Export hostel bookings as CSV (Admin only)",
+        operation_description="Export hostel bookings as CSV (Admin only). ?output=gzip or xlsx for other formats",
         responses={200: "CSV file"}
     )
     @action(detail=False, methods=['get'], permission_classes=[IsAdmin])
     def export_csv(self, request):
-        bookings = self.get_queryset()
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="hostel_bookings.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(['ID', 'Student', 'Status', 'Start Date', 'End Date', 'Approved By', 'Approved At', 'Remarks'])
-
-        for b in bookings:
-            writer.writerow([
-                b.id,
-                b.student.username,
-                b.status,
-                b.start_date,
-                b.end_date,
-                b.approved_by.username if b.approved_by else '',
-                b.approved_at,
-                b.remarks or ''
-            ])
-
-        return response
+        try:
+            output = export_service.output_from(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return export_service.export_response(self.get_queryset().order_by('id'), [
+            Column('ID', 'id'),
+            Column('Student', 'student__username'),
+            Column('Status', 'status'),
+            Column('Start Date', 'start_date'),
+            Column('End Date', 'end_date'),
+            Column('Approved By', 'approved_by__username'),
+            Column('Approved At', 'approved_at'),
+            Column('Remarks', 'remarks'),
+        ], 'hostel_bookings', output)
 
     @swagger_auto_schema(
         method='get',
@@ -388,81 +280,48 @@ class HostelBookingViewSet(viewsets.ModelViewSet):
     )
     @action(detail=False, methods=['get'], permission_classes=[IsAdmin])
     def stats(self, request):
-        data = {
-            'total': HostelBooking.objects.filter(status='approved').count(),
-            'approved': HostelBooking.objects.filter(status='approved').count(),
-            'pending': HostelBooking.objects.filter(status='pending').count(),
-            'rejected': HostelBooking.objects.filter(status='rejected').count(),
-            'expired': HostelBooking.objects.filter(status='expired').count(),
-        }
+        data = occupancy_counters.booking_stats('hostel')
         return Response(data)
 
     @api_view(['GET'])
     @permission_classes([IsAdminUser])
     def hostel_dashboard_stats(request):
-        from hostel.models import HostelBooking, HostelBed
-        today = timezone.now().date()
-        last_week = today - timedelta(days=7)
-
-        total_beds = HostelBed.objects.count()
-        booked_beds = HostelBed.objects.filter(is_booked=True).count()
-
-        #  Pending = beds with booking (pending)
-        pending_beds = HostelBooking.objects.filter(status='pending').values_list('bed_id',
-                                                                                  flat=True).distinct().count()
-        available_beds = total_beds - booked_beds - pending_beds
-
-        today_bookings = HostelBooking.objects.filter(created_at__date=today).count()
-        weekly_bookings = HostelBooking.objects.filter(created_at__date__gte=last_week).count()
+        counts = occupancy_counters.dashboard('hostel')
 
         return Response({
             "hostel": {
-                "total_beds": total_beds,
-                "booked": booked_beds,
-                "pending": pending_beds,
-                "available": available_beds
+                "total_beds": counts["total"],
+                "booked": counts["booked"],
+                "pending": counts["pending"],
+                "available": counts["available"]
             },
             "trends": {
-                "today_bookings": today_bookings,
-                "weekly_bookings": weekly_bookings
+                "today_bookings": counts["today_bookings"],
+                "weekly_bookings": counts["weekly_bookings"]
             }
         })
 
     @api_view(['GET'])
     @permission_classes([IsAdminUser])
     def export_hostel_bookings_csv(request):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="hostel_bookings.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow([
-            'Username', 'First Name', 'Middle Name', 'Last Name',
-            'Education',
-            'Phone', 'Address',
-            'Room', 'Bed',
-            'Start Date',
-            'Status'
-        ])
-
-        bookings = HostelBooking.objects.select_related('student', 'bed__room')
-        for b in bookings:
-            writer.writerow([
-                b.student.username,
-                b.student.first_name,
-                b.student.middle_name,
-                b.student.last_name,
-                # b.student.aadhar_number,
-                b.student.education,
-                b.student.phone_number,
-                b.student.address,
-                b.bed.room.room_number,
-                b.bed.bed_number,
-                b.start_date,
-                # b.end_date,
-                b.status.upper()
-            ])
-
-        return response
+        try:
+            output = export_service.output_from(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return export_service.export_response(HostelBooking.objects.order_by('id'), [
+            Column('Username', 'student__username'),
+            Column('First Name', 'student__first_name'),
+            Column('Middle Name', 'student__middle_name'),
+            Column('Last Name', 'student__last_name'),
+            Column('Education', 'student__education'),
+            Column('Phone', 'student__phone_number'),
+            Column('Address', 'student__address'),
+            Column('Room', 'bed__room__room_number'),
+            Column('Bed', 'bed__bed_number'),
+            Column('Start Date', 'start_date'),
+            Column('Status', 'status', export_service.upper),
+        ], 'hostel_bookings', output)
 
     @swagger_auto_schema(
         method='post',
@@ -646,7 +505,9 @@ class HostelBookingViewSet(viewsets.ModelViewSet):
                         b.aadhaar_back_photo.url) if b.aadhaar_back_photo else None,
                     "profile_photo": request.build_absolute_uri(
                         student.profile_photo.url) if student.profile_photo else None,
-
+                    "aadhaar_front_derivatives": derivative_urls(b, 'aadhaar_front_photo', request),
+                    "aadhaar_back_derivatives": derivative_urls(b, 'aadhaar_back_photo', request),
+                    "profile_photo_derivatives": derivative_urls(student, 'profile_photo', request),
                 },
                 "start_date": b.start_date,
                 "purpose_of_joining": b.purpose_of_joining,
@@ -813,14 +674,12 @@ def student_hostel_booking_status(request):
 @permission_classes([permissions.IsAuthenticated])
 def download_hostel_invoice_pdf(request, invoice_id):
     try:
-        invoice = HostelMonthlyInvoice.objects.get(id=invoice_id, booking__student=request.user)
+        invoice = HostelMonthlyInvoice.objects.select_related('booking__student', 'booking__bed__room').get(
+            id=invoice_id, booking__student=request.user)
     except HostelMonthlyInvoice.DoesNotExist:
         return Response({"detail": "Invoice not found."}, status=404)
 
-    pdf_buffer = generate_hostel_invoice_pdf(invoice)
-    response = HttpResponse(pdf_buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename=hostel_invoice_{invoice.invoice_id}.pdf'
-    return response
+    return invoice_pdf_cache.invoice_response(request, 'hostel', invoice, f'hostel_invoice_{invoice.invoice_id}.pdf')
 
 
 class MyHostelInvoicesView(ListAPIView):
@@ -830,14 +689,15 @@ class MyHostelInvoicesView(ListAPIView):
     filterset_class = HostelInvoiceFilter
 
     def get_queryset(self):
-        return HostelMonthlyInvoice.objects.filter(booking__student=self.request.user)
+        return HostelMonthlyInvoice.objects.filter(booking__student=self.request.user) \
+            .select_related('booking__student', 'booking__bed__room')
 
 
 class AdminHostelInvoiceViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = HostelMonthlyInvoice.objects.select_related('booking__student', 'booking__bed__room').all()
     serializer_class = HostelInvoiceAdminSerializer
     permission_classes = [IsAdminUser]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, StudentSearchFilter]
     filterset_fields = ['is_paid']
     search_fields = ['booking__student__username', 'booking__student__first_name', 'booking__student__last_name']
 
@@ -879,59 +739,35 @@ def mark_hostel_invoice_paid(request, invoice_id):
 
 @swagger_auto_schema(
     method='post',
-    operation_description="Admin: Generate invoices for all approved hostel bookings for current month",
-    responses={200: "Invoices generated", 400: "No eligible bookings", 500: "Error occurred"}
+    operation_description="Admin: Generate invoices for all approved hostel bookings for current month. "
+                          "Pass dry_run=true to preview the invoices and totals without saving.",
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'dry_run': openapi.Schema(type=openapi.TYPE_BOOLEAN, description='Preview only (optional)')
+        }
+    ),
+    responses={200: "Invoices generated (or previewed)", 500: "Fee settings missing"}
 )
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 def generate_hostel_invoices_bulk(request):
-    from calendar import monthrange
     from datetime import date
-    today = date.today()
-    current_month = today.replace(day=1)
+    from core.services.invoice_service import HostelInvoiceService
 
-    from .models import HostelBooking, HostelMonthlyInvoice, HostelMonthlyFee
-    from core.utils.invoice_utils import generate_invoice_id
+    current_month = date.today().replace(day=1)
+    dry_run = str(request.data.get('dry_run', request.query_params.get('dry_run', ''))).lower() in ('1', 'true', 'yes')
 
-    approved_bookings = HostelBooking.objects.filter(status='approved')
     fees = HostelMonthlyFee.objects.last()
     if not fees:
         return Response({"error": "Hostel fee settings not configured."}, status=500)
 
-    count = 0
-    for booking in approved_bookings:
-        if HostelMonthlyInvoice.objects.filter(booking=booking, month=current_month).exists():
-            continue
-
-        is_first_invoice = not HostelMonthlyInvoice.objects.filter(booking=booking).exists()
-
-        if is_first_invoice:
-            booking_day = booking.start_date.day
-            if booking_day <= 10:
-                monthly_fee = 1500
-            elif booking_day <= 20:
-                monthly_fee = 1000
-            else:
-                monthly_fee = 500
-            deposit = fees.deposit_amount
-        else:
-            monthly_fee = fees.monthly_fee
-            deposit = 0
-
-        total = monthly_fee + deposit
-
-        HostelMonthlyInvoice.objects.create(
-            booking=booking,
-            invoice_id=generate_invoice_id("HO", booking.id, current_month),
-            month=current_month,
-            amount=monthly_fee,
-            deposit=deposit,
-            total=total,
-            invoice_expired=False
-        )
-        count += 1
-
-    return Response({"message": f"{count} hostel invoices generated."})
+    result = HostelInvoiceService.generate(fees, current_month, dry_run=dry_run)
+    if dry_run:
+        result["message"] = f"{result['totals']['count']} hostel invoices would be generated."
+    else:
+        result["message"] = f"{result['created']} hostel invoices generated."
+    return Response(result)
 
 
 # ========= SWITCH VIEWS (HOSTEL) =========
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0021_libraryavailableswitchhistory_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='librarymonthlyinvoice',
+            index=models.Index(fields=['is_paid', 'month'], name='library_lib_is_paid_2f16d6_idx'),
+        ),
+    ]
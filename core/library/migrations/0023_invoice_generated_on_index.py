@@ -0,0 +1,17 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0022_invoice_paid_month_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='librarymonthlyinvoice',
+            index=models.Index(fields=['generated_on'], name='library_lib_generat_07dbcb_idx'),
+        ),
+    ]
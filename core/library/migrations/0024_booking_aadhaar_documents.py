@@ -0,0 +1,25 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0023_invoice_generated_on_index'),
+        ('users', '0003_kycdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='librarybooking',
+            name='aadhaar_back_document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.kycdocument'),
+        ),
+        migrations.AddField(
+            model_name='librarybooking',
+            name='aadhaar_front_document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.kycdocument'),
+        ),
+    ]
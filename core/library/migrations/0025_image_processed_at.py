@@ -0,0 +1,23 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0024_booking_aadhaar_documents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='librarybooking',
+            name='aadhaar_back_photo_processed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='librarybooking',
+            name='aadhaar_front_photo_processed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
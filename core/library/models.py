@@ -31,6 +31,14 @@ class LibraryBooking(models.Model):
     # Photo uploads
     aadhaar_front_photo = models.ImageField(upload_to='profile_photos/')
     aadhaar_back_photo = models.ImageField(upload_to='profile_photos/')
+    # Set by the image worker once the derivatives exist (core.services.image_pipeline)
+    aadhaar_front_photo_processed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    aadhaar_back_photo_processed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Deduplicated copies of the two photos above (users.KycDocument); the photo fields name the same files
+    aadhaar_front_document = models.ForeignKey('users.KycDocument', on_delete=models.SET_NULL, null=True, blank=True,
+                                               related_name='+')
+    aadhaar_back_document = models.ForeignKey('users.KycDocument', on_delete=models.SET_NULL, null=True, blank=True,
+                                              related_name='+')
     purpose_of_joining = models.TextField(default="", help_text="For which study you want to join the study centre ?")
     # student_photo = models.ImageField(upload_to='student_photos/')
 
@@ -132,6 +140,10 @@ class LibraryMonthlyInvoice(models.Model):
 
     class Meta:
         unique_together = ['booking', 'month']
+        indexes = [
+            models.Index(fields=['is_paid', 'month']),
+            models.Index(fields=['generated_on']),
+        ]
 
     def __str__(self):
         return f"{self.invoice_id} – {self.booking.student.username}"
@@ -3,6 +3,7 @@ from rest_framework import serializers
 from .models import LibrarySeat, TimeSlot, LibraryBooking, LibraryMonthlyFee, LibraryMonthlyInvoice, \
     LibraryAvailableSwitchRequest, LibraryMutualSwitchRequest, LibraryAvailableSwitchHistory, LibraryMutualSwitchHistory
 from users.serializers import UserSerializer
+from core.services import broadcast_service, seat_map_stream
 
 
 class LibrarySeatSerializer(serializers.ModelSerializer):
@@ -15,16 +16,18 @@ class LibrarySeatSerializer(serializers.ModelSerializer):
         ]
 
     def get_status(self, obj):
-        from .models import LibraryBooking
         if obj.is_booked:
             return "Booked"
-        if LibraryBooking.objects.filter(seat=obj, status='pending').exists():
+        if self.get_pending_count(obj):
             return "Pending"
         return "Available"
 
     pending_count = serializers.SerializerMethodField()
 
     def get_pending_count(self, obj):
+        # Annotated by LibraryOccupancyService.get_seats() for the live map
+        if hasattr(obj, 'pending_bookings'):
+            return obj.pending_bookings
         from .models import LibraryBooking
         return LibraryBooking.objects.filter(seat=obj, status='pending').count()
 
@@ -54,7 +57,7 @@ class LibraryBookingSerializer(serializers.ModelSerializer):
         read_only_fields = [
             'id', 'student', 'seat', 'status', 'purpose_of_joining',
             'monthly_fee', 'deposit_amount', 'created_at',
-            'billing_summary'
+            'billing_summary', 'aadhaar_front_document', 'aadhaar_back_document',
         ]
 
     def validate(self, data):
@@ -62,36 +65,26 @@ class LibraryBookingSerializer(serializers.ModelSerializer):
         user = request.user
 
         if request.method == 'POST':
-            aadhaar_present = False
-
-            from hostel.models import HostelBooking
-            from library.models import LibraryBooking
-
-            # Check hostel booking
-            hostel = HostelBooking.objects.filter(student=user, status__in=['approved', 'pending']).last()
-            if hostel and hostel.aadhaar_front_photo and hostel.aadhaar_back_photo:
-                aadhaar_present = True
+            from core.services import kyc_service
+            from users.models import KycDocument
 
-            # Check library booking
-            library = LibraryBooking.objects.filter(student=user, status__in=['approved', 'pending']).last()
-            if library and library.aadhaar_front_photo and library.aadhaar_back_photo:
-                aadhaar_present = True
+            # Documents the student uploaded before (any booking, either vertical)
+            self._kyc_documents = kyc_service.current_documents(user)
 
             # Aadhaar required only if not already present
-            if not aadhaar_present:
+            if not kyc_service.has_aadhaar(self._kyc_documents):
                 if not data.get('aadhaar_front_photo') or not data.get('aadhaar_back_photo'):
                     raise serializers.ValidationError("Aadhaar front and back photo are required.")
 
             # Profile photo logic
-            if not user.profile_photo and not data.get('aadhaar_front_photo'):
+            if not user.profile_photo and not data.get('aadhaar_front_photo') \
+                    and KycDocument.AADHAAR_FRONT not in self._kyc_documents:
                 raise serializers.ValidationError("Profile photo or Aadhaar front is required.")
 
         return data
 
     def create(self, validated_data):
         from .models import LibraryMonthlyFee
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
 
         user = self.context['request'].user
 
@@ -118,6 +111,10 @@ class LibraryBookingSerializer(serializers.ModelSerializer):
         validated_data['deposit_amount'] = deposit
         print(f"Billing - Fee: {monthly_fee}, Deposit: {deposit}")
 
+        from core.services import kyc_service
+
+        kyc_service.attach(user, validated_data, getattr(self, '_kyc_documents', {}))
+
         booking = LibraryBooking.objects.create(
             student=user,
             status='pending',
@@ -125,19 +122,12 @@ class LibraryBookingSerializer(serializers.ModelSerializer):
         )
 
         # Notify via WebSocket
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "live_seat_updates",
-            {
-                "type": "send_seat_update",
-                "data": {
-                    "type": "library_booking_pending",
-                    "seat_id": booking.seat.id,
-                    "is_booked": False,
-                    "student": booking.student.username,
-                }
-            }
-        )
+        broadcast_service.queue_seat_event({
+            "type": "library_booking_pending",
+            "seat_id": booking.seat.id,
+            "is_booked": False,
+            "student": booking.student.username,
+        }, [(seat_map_stream.SEAT, booking.seat.id)])
 
         return booking
 
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from core.services import image_pipeline, invoice_pdf_cache, occupancy_counters, profile_report, revenue_rollup
+from .models import LibrarySeat, LibraryBooking, LibraryMonthlyInvoice
+
+
+@receiver([post_save, post_delete], sender=LibrarySeat)
+@receiver([post_save, post_delete], sender=LibraryBooking)
+@receiver([post_save, post_delete], sender=LibraryMonthlyInvoice)
+def invalidate_live_map_snapshot(sender, **kwargs):
+    from core.services.occupancy_service import LibraryOccupancyService
+
+    # Drop the snapshot only once the change is visible to other readers
+    transaction.on_commit(LibraryOccupancyService.invalidate)
+
+
+# Dashboard/stats counters, adjusted in the same transaction as the change
+for model in (LibraryBooking, LibrarySeat):
+    pre_save.connect(occupancy_counters.capture_state, sender=model)
+
+post_save.connect(occupancy_counters.booking_saved, sender=LibraryBooking)
+pre_delete.connect(occupancy_counters.lock_pending_resource, sender=LibraryBooking)
+post_delete.connect(occupancy_counters.booking_deleted, sender=LibraryBooking)
+post_save.connect(occupancy_counters.resource_saved, sender=LibrarySeat)
+post_delete.connect(occupancy_counters.resource_deleted, sender=LibrarySeat)
+
+# Monthly revenue rollup, refreshed for the invoice's month in the same transaction
+post_save.connect(revenue_rollup.invoice_changed, sender=LibraryMonthlyInvoice)
+post_delete.connect(revenue_rollup.invoice_changed, sender=LibraryMonthlyInvoice)
+
+# Cached invoice PDFs, dropped after the change commits
+post_save.connect(invoice_pdf_cache.invoice_changed, sender=LibraryMonthlyInvoice)
+post_delete.connect(invoice_pdf_cache.invoice_changed, sender=LibraryMonthlyInvoice)
+
+# Cached student profile reports
+post_save.connect(profile_report.booking_changed, sender=LibraryBooking)
+post_delete.connect(profile_report.booking_changed, sender=LibraryBooking)
+
+# Aadhaar uploads: metadata stripped and derivatives written by a worker
+post_init.connect(image_pipeline.remember_images, sender=LibraryBooking)
+post_save.connect(image_pipeline.images_saved, sender=LibraryBooking)
@@ -1,3 +1,70 @@
-from django.test import TestCase
+import tempfile
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.services.occupancy_service import LibraryOccupancyService
+from hostel.tests import IN_MEMORY_CHANNEL_LAYERS, make_booking, make_student
+from .models import LibrarySeat, LibraryMonthlyInvoice
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, MEDIA_ROOT=tempfile.mkdtemp())
+class LibraryLiveMapSnapshotTests(TestCase):
+    url = '/api/library/seats/live-map/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_student('viewer'))
+        self.seat = LibrarySeat.objects.create(seat_number='A1')
+        self.booking = make_booking(make_student('s1'), self.seat, 'approved')
+        LibraryMonthlyInvoice.objects.create(booking=self.booking, invoice_id='INV-1',
+                                             month=date.today().replace(day=1), amount=600, total=600, is_paid=True)
+
+    def test_snapshot_is_shared_between_readers(self):
+        with self.assertNumQueries(1):
+            first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+
+        self.assertEqual(first.json(), second.json())
+        row = first.json()[0]
+        self.assertEqual(row['status'], 'booked')
+        self.assertEqual(row['booking_id'], self.booking.id)
+        self.assertTrue(row['is_paid'])
+        self.assertFalse(row['invoice_expired'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_booking_change_rebuilds_snapshot(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.status = 'cancelled'
+            self.booking.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['status'], 'available')
+
+    @override_settings(LIVE_MAP_SNAPSHOT_SECONDS=120)
+    def test_snapshot_is_cached_with_a_bounded_timeout(self):
+        with mock.patch('core.services.occupancy_service.cache.set', wraps=cache.set) as cache_set:
+            self.client.get(self.url)
+        self.assertEqual(cache_set.call_args.args[2], 120)
+
+    def test_invalidate_bumps_the_version_instead_of_deleting(self):
+        self.client.get(self.url)
+        version = cache.get(LibraryOccupancyService.VERSION_CACHE_KEY, 0)
+        LibraryOccupancyService.invalidate()
+        self.assertEqual(cache.get(LibraryOccupancyService.VERSION_CACHE_KEY), version + 1)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
@@ -5,9 +5,6 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
 from django.http import HttpResponse
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-import csv
 from rest_framework.exceptions import PermissionDenied
 from .models import LibrarySeat, TimeSlot, LibraryBooking, LibraryMonthlyFee, LibraryMonthlyInvoice, LibraryFeeSetting, \
     LibraryAvailableSwitchRequest, LibraryMutualSwitchRequest, LibraryAvailableSwitchHistory, LibraryMutualSwitchHistory
@@ -15,8 +12,7 @@ from .serializers import LibrarySeatSerializer, TimeSlotSerializer, LibraryBooki
     LibraryMonthlyFeeSerializer, LibraryInvoiceAdminSerializer, LibraryAvailableSwitchRequestSerializer, \
     LibraryMutualSwitchRequestSerializer, LibraryAvailableSwitchHistorySerializer, LibraryMutualSwitchHistorySerializer
 from hostel.views import IsAdmin, IsStudent
-from core.utils.email_utils import send_rejection_email, send_approval_email, send_custom_email
-from core.utils.sms_utils import send_sms
+from core.utils.email_utils import send_custom_email
 from core.utils.invoice_utils import generate_invoice_pdf
 from rest_framework.permissions import IsAuthenticated
 from core.utils.invoice_utils import generate_invoice_id
@@ -26,11 +22,17 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from hostel.models import HostelBooking
 from library.models import LibraryBooking, LibraryMonthlyInvoice
-from core.utils.invoice_utils import generate_library_invoice_pdf
 from rest_framework.generics import ListAPIView
 from .filters import LibraryInvoiceFilter
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Count, Q
+from core.filters import StudentSearchFilter
+from core.services import export_service
+from core.services.export_service import Column
+from core.utils.image_utils import derivative_urls
+from core.services.occupancy_service import LibraryOccupancyService
+from core.services import broadcast_service, invoice_pdf_cache, notification_service, occupancy_counters, \
+    seat_map_stream
 
 
 class LibrarySeatViewSet(viewsets.ModelViewSet):
@@ -39,6 +41,11 @@ class LibrarySeatViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['is_booked']
 
+    def get_queryset(self):
+        # Pending count in the same query, not one COUNT per seat (LibrarySeatSerializer)
+        return super().get_queryset().annotate(
+            pending_bookings=Count('librarybooking', filter=Q(librarybooking__status='pending')))
+
     def get_permissions(self):
         if self.action in ['list', 'retrieve', 'live_map']:
             return [permissions.IsAuthenticated()]
@@ -51,59 +58,13 @@ class LibrarySeatViewSet(viewsets.ModelViewSet):
     )
     @action(detail=False, methods=['get'], url_path='live-map', permission_classes=[permissions.AllowAny])
     def live_map(self, request):
-        seats = LibrarySeat.objects.all()
-        serializer = self.get_serializer(seats, many=True)
-        base_data = serializer.data
-
-        extended_data = []
-        for seat, base in zip(seats, base_data):
-            from library.models import LibraryBooking, LibraryMonthlyInvoice
-            from datetime import date
-            from calendar import monthrange
-
-            latest_booking = (
-                LibraryBooking.objects
-                .filter(seat=seat)
-                .order_by('-created_at')
-                .first()
-            )
-
-            status = "available"
-            booking_id = None
-            is_paid = False
-            invoice_expired = True
-
-            if latest_booking:
-                if latest_booking.status == "pending":
-                    status = "pending"
-                    booking_id = latest_booking.id
-                elif latest_booking.status == "approved":
-                    status = "booked"
-                    booking_id = latest_booking.id
-
-                    latest_invoice = LibraryMonthlyInvoice.objects.filter(booking=latest_booking).order_by(
-                        '-month').first()
-                    if latest_invoice:
-                        today = date.today()
-                        invoice_start = latest_invoice.month
-                        year, month = invoice_start.year, invoice_start.month
-                        last_day = monthrange(year, month)[1]
-                        invoice_end = invoice_start.replace(day=last_day)
-
-                        if today <= invoice_end:
-                            is_paid = latest_invoice.is_paid
-                            invoice_expired = not latest_invoice.is_paid
-                        else:
-                            is_paid = False
-                            invoice_expired = True
-
-            base['status'] = status
-            base['booking_id'] = booking_id
-            base['is_paid'] = is_paid
-            base['invoice_expired'] = invoice_expired
-            extended_data.append(base)
-
-        return Response(extended_data)
+        snapshot = LibraryOccupancyService.get_snapshot(lambda seats: self.get_serializer(seats, many=True))
+        if LibraryOccupancyService.is_not_modified(request, snapshot):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(snapshot['data'])
+        response['ETag'] = snapshot['etag']
+        return response
 
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
@@ -141,7 +102,7 @@ class TimeSlotViewSet(viewsets.ModelViewSet):
 class LibraryBookingViewSet(viewsets.ModelViewSet):
     queryset = LibraryBooking.objects.all()
     serializer_class = LibraryBookingSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, StudentSearchFilter]
     filterset_fields = ['status', 'seat__seat_number']
     search_fields = ['student__first_name', 'student__last_name', 'student__username']
 
@@ -151,8 +112,8 @@ class LibraryBookingViewSet(viewsets.ModelViewSet):
         responses={200: "Booking approved", 400: "Already processed"}
     )
     @action(detail=True, methods=['post'], permission_classes=[IsAdmin])
+    @transaction.atomic
     def approve(self, request, pk=None):
-        import threading
         booking = self.get_object()
 
         if booking.status != 'pending':
@@ -167,21 +128,8 @@ class LibraryBookingViewSet(viewsets.ModelViewSet):
         booking.seat.is_booked = True
         booking.seat.save()
 
-        # Notify approved student (Email + SMS in thread)
-        try:
-            threading.Thread(target=send_approval_email, args=(
-                booking.student.email,
-                booking.student.username,
-                "Library"
-            )).start()
-
-            if booking.student.phone_number:
-                threading.Thread(target=send_sms, args=(
-                    booking.student.phone_number,
-                    f"Hi {booking.student.username}, your library booking has been approved."
-                )).start()
-        except Exception as e:
-            print("Approve notification failed:", e)
+        # Notify approved student (Email + SMS, delivered from the outbox)
+        notification_service.notify_booking(booking.student, 'booking_approved', "Library")
 
         # Reject all other pending bookings for this seat
         other_pending = LibraryBooking.objects.filter(
@@ -190,53 +138,25 @@ class LibraryBookingViewSet(viewsets.ModelViewSet):
         ).exclude(id=booking.id)
 
         for other in other_pending:
-            try:
-                threading.Thread(target=send_rejection_email, args=(
-                    other.student.email,
-                    other.student.username,
-                    "Library"
-                )).start()
-
-                if other.student.phone_number:
-                    threading.Thread(target=send_sms, args=(
-                        other.student.phone_number,
-                        f"Hi {other.student.username}, your library booking has been rejected."
-                    )).start()
-
-            except Exception as e:
-                print("Rejection notification failed:", e)
+            notification_service.notify_booking(other.student, 'booking_rejected', "Library")
 
             other.delete()
 
             # WebSocket notify for rejection
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                "live_seat_updates",
-                {
-                    "type": "send_seat_update",
-                    "data": {
-                        "type": "library_booking_rejected",
-                        "seat_id": other.seat.id,
-                        "is_booked": False,
-                        "student": other.student.username
-                    }
-                }
-            )
+            broadcast_service.queue_seat_event({
+                "type": "library_booking_rejected",
+                "seat_id": other.seat.id,
+                "is_booked": False,
+                "student": other.student.username
+            }, [(seat_map_stream.SEAT, other.seat.id)])
 
         # WebSocket notify for approval
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "live_seat_updates",
-            {
-                "type": "send_seat_update",
-                "data": {
-                    "type": "library_booking_approved",
-                    "seat_id": booking.seat.id,
-                    "is_booked": True,
-                    "student": booking.student.username
-                }
-            }
-        )
+        broadcast_service.queue_seat_event({
+            "type": "library_booking_approved",
+            "seat_id": booking.seat.id,
+            "is_booked": True,
+            "student": booking.student.username
+        }, [(seat_map_stream.SEAT, booking.seat.id)])
 
         return Response({"detail": "Library booking approved. Others rejected and notified."})
 
@@ -252,8 +172,8 @@ class LibraryBookingViewSet(viewsets.ModelViewSet):
         responses={200: "Booking rejected", 400: "Already processed"}
     )
     @action(detail=True, methods=['post'], permission_classes=[IsAdmin])
+    @transaction.atomic
     def reject(self, request, pk=None):
-        import threading
         booking = self.get_object()
 
         if booking.status != 'pending':
@@ -273,33 +193,16 @@ class LibraryBookingViewSet(viewsets.ModelViewSet):
         booking.seat.is_booked = False
         booking.seat.save()
 
-        # Notify student via Email + SMS (threaded)
-        threading.Thread(target=send_rejection_email, args=(
-            booking.student.email,
-            booking.student.username,
-            "Library"
-        )).start()
-
-        if booking.student.phone_number:
-            threading.Thread(target=send_sms, args=(
-                booking.student.phone_number,
-                f"Hi {booking.student.username}, your library booking has been rejected."
-            )).start()
+        # Notify student via Email + SMS (delivered from the outbox)
+        notification_service.notify_booking(booking.student, 'booking_rejected', "Library")
 
         # WebSocket notify
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "live_seat_updates",
-            {
-                "type": "send_seat_update",
-                "data": {
-                    "type": "library_booking_rejected",
-                    "seat_id": booking.seat.id,
-                    "is_booked": False,
-                    "student": booking.student.username
-                }
-            }
-        )
+        broadcast_service.queue_seat_event({
+            "type": "library_booking_rejected",
+            "seat_id": booking.seat.id,
+            "is_booked": False,
+            "student": booking.student.username
+        }, [(seat_map_stream.SEAT, booking.seat.id)])
 
         return Response({
             "detail": "Library booking rejected and student notified."
@@ -328,107 +231,69 @@ class LibraryBookingViewSet(viewsets.ModelViewSet):
     )
     @action(detail=False, methods=['get'], permission_classes=[IsAdmin])
     def stats(self, request):
-        data = {
-            'total': LibraryBooking.objects.filter(status='approved').count(),
-            'approved': LibraryBooking.objects.filter(status='approved').count(),
-            'pending': LibraryBooking.objects.filter(status='pending').count(),
-            'rejected': LibraryBooking.objects.filter(status='rejected').count(),
-            'expired': LibraryBooking.objects.filter(status='expired').count(),
-        }
+        data = occupancy_counters.booking_stats('library')
         return Response(data)
 
     @swagger_auto_schema(
-        operation_description="Export library bookings to CSV",
+        operation_description="Export library bookings to CSV. ?output=gzip or xlsx for other formats",
         responses={200: "CSV file"}
     )
     def export_csv(self, request):
-        bookings = self.get_queryset()
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="library_bookings.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(
-            ['ID', 'Student', 'Seat', 'Status', 'Start Date', 'End Date', 'Approved By', 'Approved At', 'Remarks'])
-
-        for b in bookings:
-            writer.writerow([
-                b.id,
-                b.student.username,
-                b.seat.seat_number,
-                b.status,
-                b.start_date,
-                b.end_date,
-                b.approved_by.username if b.approved_by else '',
-                b.approved_at,
-                b.remarks or ''
-            ])
-
-        return response
+        try:
+            output = export_service.output_from(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return export_service.export_response(self.get_queryset().order_by('id'), [
+            Column('ID', 'id'),
+            Column('Student', 'student__username'),
+            Column('Seat', 'seat__seat_number'),
+            Column('Status', 'status'),
+            Column('Start Date', 'start_date'),
+            Column('End Date', 'end_date'),
+            Column('Approved By', 'approved_by__username'),
+            Column('Approved At', 'approved_at'),
+            Column('Remarks', 'remarks'),
+        ], 'library_bookings', output)
 
     @api_view(['GET'])
     @permission_classes([IsAdminUser])
     def library_dashboard_stats(request):
-        today = timezone.now().date()
-        last_week = today - timedelta(days=7)
-
-        total_seats = LibrarySeat.objects.count()
-        booked_seats = LibrarySeat.objects.filter(is_booked=True).count()
-
-        pending_seats = LibraryBooking.objects.filter(status='pending').values_list('seat_id',
-                                                                                    flat=True).distinct().count()
-        available_seats = total_seats - booked_seats - pending_seats
-
-        today_bookings = LibraryBooking.objects.filter(created_at__date=today).count()
-        weekly_bookings = LibraryBooking.objects.filter(created_at__date__gte=last_week).count()
+        counts = occupancy_counters.dashboard('library')
 
         return Response({
             "library": {
-                "total_seats": total_seats,
-                "booked": booked_seats,
-                "pending": pending_seats,
-                "available": available_seats
+                "total_seats": counts["total"],
+                "booked": counts["booked"],
+                "pending": counts["pending"],
+                "available": counts["available"]
             },
             "trends": {
-                "today_bookings": today_bookings,
-                "weekly_bookings": weekly_bookings
+                "today_bookings": counts["today_bookings"],
+                "weekly_bookings": counts["weekly_bookings"]
             }
         })
 
     @api_view(['GET'])
     @permission_classes([IsAdminUser])
     def export_library_bookings_csv(request):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="library_bookings.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow([
-            'Username', 'First Name', 'Middle Name', 'Last Name',
-            'Education',
-            'Phone', 'Address',
-            'Seat Number',
-            'Start Date',
-            'Status'
-        ])
-
-        bookings = LibraryBooking.objects.select_related('student', 'seat')
-        for b in bookings:
-            writer.writerow([
-                b.student.username,
-                b.student.first_name,
-                b.student.middle_name,
-                b.student.last_name,
-                # b.student.aadhar_number,
-                b.student.education,
-                b.student.phone_number,
-                b.student.address,
-                b.seat.seat_number,
-                b.start_date,
-                # b.end_date,
-                b.status.upper()
-            ])
-
-        return response
+        try:
+            output = export_service.output_from(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return export_service.export_response(LibraryBooking.objects.order_by('id'), [
+            Column('Username', 'student__username'),
+            Column('First Name', 'student__first_name'),
+            Column('Middle Name', 'student__middle_name'),
+            Column('Last Name', 'student__last_name'),
+            Column('Education', 'student__education'),
+            Column('Phone', 'student__phone_number'),
+            Column('Address', 'student__address'),
+            Column('Seat Number', 'seat__seat_number'),
+            Column('Start Date', 'start_date'),
+            Column('Status', 'status', export_service.upper),
+        ], 'library_bookings', output)
 
     @swagger_auto_schema(
         method='post',
@@ -602,7 +467,9 @@ class LibraryBookingViewSet(viewsets.ModelViewSet):
                         b.aadhaar_back_photo.url) if b.aadhaar_back_photo else None,
                     "profile_photo": request.build_absolute_uri(
                         student.profile_photo.url) if student.profile_photo else None,
-
+                    "aadhaar_front_derivatives": derivative_urls(b, 'aadhaar_front_photo', request),
+                    "aadhaar_back_derivatives": derivative_urls(b, 'aadhaar_back_photo', request),
+                    "profile_photo_derivatives": derivative_urls(student, 'profile_photo', request),
                 },
                 "start_date": b.start_date,
                 "purpose_of_joining": b.purpose_of_joining,
@@ -765,14 +632,12 @@ def student_library_booking_status(request):
 @permission_classes([permissions.IsAuthenticated])
 def download_library_invoice_pdf(request, invoice_id):
     try:
-        invoice = LibraryMonthlyInvoice.objects.get(id=invoice_id, booking__student=request.user)
+        invoice = LibraryMonthlyInvoice.objects.select_related('booking__student', 'booking__seat').get(
+            id=invoice_id, booking__student=request.user)
     except LibraryMonthlyInvoice.DoesNotExist:
         return Response({"detail": "Invoice not found."}, status=404)
 
-    pdf_buffer = generate_library_invoice_pdf(invoice)
-    response = HttpResponse(pdf_buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename=library_invoice_{invoice.invoice_id}.pdf'
-    return response
+    return invoice_pdf_cache.invoice_response(request, 'library', invoice, f'library_invoice_{invoice.invoice_id}.pdf')
 
 
 class MyLibraryInvoicesView(ListAPIView):
@@ -782,14 +647,15 @@ class MyLibraryInvoicesView(ListAPIView):
     filterset_class = LibraryInvoiceFilter
 
     def get_queryset(self):
-        return LibraryMonthlyInvoice.objects.filter(booking__student=self.request.user)
+        return LibraryMonthlyInvoice.objects.filter(booking__student=self.request.user) \
+            .select_related('booking__student', 'booking__seat')
 
 
 class AdminLibraryInvoiceViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = LibraryMonthlyInvoice.objects.select_related('booking__student', 'booking__seat').all()
     serializer_class = LibraryInvoiceAdminSerializer
     permission_classes = [IsAdminUser]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, StudentSearchFilter]
     filterset_fields = ['is_paid']
     search_fields = ['booking__student__username', 'booking__student__first_name', 'booking__student__last_name']
 
@@ -834,67 +700,41 @@ from .models import LibraryMonthlyInvoice
 
 
 def reset_expired_paid_flags():
-    today = date.today()
-    invoices = LibraryMonthlyInvoice.objects.filter(is_paid=True)
-
-    for invoice in invoices:
-        if today > (invoice.month + timedelta(days=30)):
-            invoice.is_paid = False
-            invoice.save()
+    from core.services.invoice_service import reset_expired_payments
+    return reset_expired_payments(('library',))['library']
 
 
 @swagger_auto_schema(
     method='post',
-    operation_description="Admin: Generate invoices for all approved library bookings for current month",
-    responses={200: "Invoices generated", 400: "No eligible bookings", 500: "Error occurred"}
+    operation_description="Admin: Generate invoices for all approved library bookings for current month. "
+                          "Pass dry_run=true to preview the invoices and totals without saving.",
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'dry_run': openapi.Schema(type=openapi.TYPE_BOOLEAN, description='Preview only (optional)')
+        }
+    ),
+    responses={200: "Invoices generated (or previewed)", 500: "Fee settings missing"}
 )
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 def generate_library_invoices_bulk(request):
-    from calendar import monthrange
     from datetime import date
-    today = date.today()
-    current_month = today.replace(day=1)
+    from core.services.invoice_service import LibraryInvoiceService
 
-    from .models import LibraryBooking, LibraryMonthlyInvoice, LibraryMonthlyFee
-    from core.utils.invoice_utils import generate_invoice_id
-    from hostel.models import HostelBooking
+    current_month = date.today().replace(day=1)
+    dry_run = str(request.data.get('dry_run', request.query_params.get('dry_run', ''))).lower() in ('1', 'true', 'yes')
 
-    approved_bookings = LibraryBooking.objects.filter(status='approved')
     fees = LibraryMonthlyFee.objects.last()
     if not fees:
         return Response({"error": "Library fee settings not configured."}, status=500)
 
-    count = 0
-    for booking in approved_bookings:
-        if LibraryMonthlyInvoice.objects.filter(booking=booking, month=current_month).exists():
-            continue
-
-        is_first_invoice = not LibraryMonthlyInvoice.objects.filter(booking=booking).exists()
-        has_hostel = HostelBooking.objects.filter(student=booking.student, status__in=['approved', 'pending']).exists()
-
-        if is_first_invoice:
-            day = booking.start_date.day
-            monthly_fee = 600 if day <= 15 else 300
-            deposit = 0 if has_hostel else fees.deposit_amount
-        else:
-            monthly_fee = fees.monthly_fee
-            deposit = 0
-
-        total = monthly_fee + deposit
-
-        LibraryMonthlyInvoice.objects.create(
-            booking=booking,
-            invoice_id=generate_invoice_id("LI", booking.id, current_month),
-            month=current_month,
-            amount=monthly_fee,
-            deposit=deposit,
-            total=total,
-            invoice_expired=False
-        )
-        count += 1
-
-    return Response({"message": f"{count} library invoices generated."})
+    result = LibraryInvoiceService.generate(fees, current_month, dry_run=dry_run)
+    if dry_run:
+        result["message"] = f"{result['totals']['count']} library invoices would be generated."
+    else:
+        result["message"] = f"{result['created']} library invoices generated."
+    return Response(result)
 
 
 # ========= SWITCH VIEWS (LIBRARY) =========
@@ -998,28 +838,16 @@ class LibraryAvailableSwitchRequestViewSet(viewsets.ModelViewSet):
         except Exception as e:
             print("Email failed:", e)
 
-        # ---- WebSocket Broadcast (After Commit) ----
-        def after_commit():
-            try:
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
-                    "live_seat_updates",
-                    {
-                        "type": "send_seat_update",
-                        "data": {
-                            "type": "library_seat_switched",
-                            "old_seat_id": from_seat.id,
-                            "new_seat_id": to_seat.id,
-                            "booking_id": booking.id,
-                            "student": booking.student.username,
-                            "status": "approved",
-                        },
-                    },
-                )
-            except Exception as e:
-                print("WebSocket broadcast failed:", e)
+        # ---- WebSocket Broadcast (sent after commit) ----
+        broadcast_service.queue_seat_event({
+            "type": "library_seat_switched",
+            "old_seat_id": from_seat.id,
+            "new_seat_id": to_seat.id,
+            "booking_id": booking.id,
+            "student": booking.student.username,
+            "status": "approved",
+        }, [(seat_map_stream.SEAT, from_seat.id), (seat_map_stream.SEAT, to_seat.id)])
 
-        transaction.on_commit(after_commit)
         return Response({"detail": "Seat switched successfully."})
 
     # ---------------------------
@@ -1238,29 +1066,16 @@ class LibraryMutualSwitchRequestViewSet(viewsets.ModelViewSet):
         # ---------------------------
         # WebSocket broadcast AFTER COMMIT
         # ---------------------------
-        def broadcast_after_commit():
-            try:
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
-                    "live_seat_updates",
-                    {
-                        "type": "send_seat_update",
-                        "data": {
-                            "type": "library_mutual_switch",
-                            "booking_a_id": booking_a.id,
-                            "booking_b_id": booking_b.id,
-                            "seat_a_id": seat_a.id,
-                            "seat_b_id": seat_b.id,
-                            "new_seat_a": booking_a.seat.id,
-                            "new_seat_b": booking_b.seat.id,
-                            "status": "approved"
-                        }
-                    }
-                )
-            except Exception as e:
-                print("WebSocket broadcast failed:", e)
-
-        transaction.on_commit(broadcast_after_commit)
+        broadcast_service.queue_seat_event({
+            "type": "library_mutual_switch",
+            "booking_a_id": booking_a.id,
+            "booking_b_id": booking_b.id,
+            "seat_a_id": seat_a.id,
+            "seat_b_id": seat_b.id,
+            "new_seat_a": booking_a.seat.id,
+            "new_seat_b": booking_b.seat.id,
+            "status": "approved"
+        }, [(seat_map_stream.SEAT, seat_a.id), (seat_map_stream.SEAT, seat_b.id)])
 
         return Response({"detail": "Mutual switch approved successfully and broadcast sent."})
 
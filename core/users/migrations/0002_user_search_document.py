@@ -0,0 +1,56 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:17
+
+from django.db import migrations, models
+
+# Frozen copies of users.models.SEARCH_FIELDS and build_search_document(); later changes to them do not alter this migration
+SEARCH_FIELDS = ('first_name', 'middle_name', 'last_name', 'username', 'email', 'phone_number', 'education')
+
+TRIGRAM_INDEX = 'users_user_search_document_trgm'
+
+
+def build_search_document(values):
+    words = ' '.join(str(value) for value in values if value).lower().split()
+    return ' ' + ' '.join(words) if words else ''
+
+
+def fill_search_document(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    batch = []
+    for user in User.objects.only('id', *SEARCH_FIELDS).iterator(chunk_size=1000):
+        user.search_document = build_search_document(getattr(user, field) for field in SEARCH_FIELDS)
+        batch.append(user)
+        if len(batch) == 1000:
+            User.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    User.objects.bulk_update(batch, ['search_document'])
+
+
+def create_trigram_index(apps, schema_editor):
+    # LIKE '%term%' on search_document is served by this index; SQLite scans instead
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} '
+                          f'ON users_user USING gin (search_document gin_trgm_ops)')
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KycDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('aadhaar_front', 'Aadhaar front'), ('aadhaar_back', 'Aadhaar back')], max_length=20)),
+                ('sha256', models.CharField(max_length=64)),
+                ('file', models.ImageField(upload_to='kyc/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kyc_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('student', 'kind', 'sha256')},
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.db import migrations
+
+# booking photo field -> (document kind, booking document FK); mirrors core.services.kyc_service
+BOOKING_FIELDS = {
+    'aadhaar_front_photo': ('aadhaar_front', 'aadhaar_front_document'),
+    'aadhaar_back_photo': ('aadhaar_back', 'aadhaar_back_document'),
+}
+
+
+def _sha256(name):
+    sha = hashlib.sha256()
+    with default_storage.open(name, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def link_existing_uploads(apps, schema_editor):
+    """
+    One KycDocument per distinct existing upload. Bookings holding identical
+    bytes are pointed at the first copy. The other copies are left on disk,
+    unreferenced; missing files are skipped.
+    """
+    KycDocument = apps.get_model('users', 'KycDocument')
+    digests = {}
+
+    for label in ('hostel.HostelBooking', 'library.LibraryBooking'):
+        Booking = apps.get_model(label)
+        for booking in Booking.objects.order_by('id').iterator(chunk_size=500):
+            changed = []
+            for field, (kind, document_field) in BOOKING_FIELDS.items():
+                name = getattr(booking, field).name
+                if not name:
+                    continue
+                if name not in digests:
+                    try:
+                        digests[name] = _sha256(name)
+                    except OSError:
+                        digests[name] = None
+                if digests[name] is None:
+                    continue
+                document, _ = KycDocument.objects.get_or_create(
+                    student_id=booking.student_id, kind=kind, sha256=digests[name], defaults={'file': name})
+                setattr(booking, document_field, document)
+                setattr(booking, field, document.file.name)
+                changed += [field, document_field]
+            if changed:
+                booking.save(update_fields=changed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_kycdocument'),
+        ('hostel', '0023_booking_aadhaar_documents'),
+        ('library', '0024_booking_aadhaar_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_existing_uploads, migrations.RunPython.noop),
+    ]
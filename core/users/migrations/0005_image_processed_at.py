@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_backfill_kyc_documents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_photo_processed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
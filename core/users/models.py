@@ -1,6 +1,18 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+# Columns folded into User.search_document for the admin student/invoice search
+SEARCH_FIELDS = ('first_name', 'middle_name', 'last_name', 'username', 'email', 'phone_number', 'education')
+
+
+def build_search_document(values):
+    """
+    Lower-cased, whitespace-normalised text of the searchable columns. It starts
+    with a space so ' <term>' matches the start of any word (prefix search).
+    """
+    words = ' '.join(str(value) for value in values if value).lower().split()
+    return ' ' + ' '.join(words) if words else ''
+
 
 class User(AbstractUser):
     ROLE_CHOICES = (
@@ -17,6 +29,43 @@ class User(AbstractUser):
     education = models.CharField(max_length=100, default='NA')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='student')
     profile_photo = models.ImageField(upload_to='profile_photos/', null=True, blank=True)
+    # Set by the image worker once the derivatives exist (core.services.image_pipeline)
+    profile_photo_processed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Maintained in save(); trigram-indexed on PostgreSQL (see core.services.search_service)
+    search_document = models.TextField(blank=True, default='', editable=False)
 
     def __str__(self):
         return f"{self.username} ({self.role})"
+
+    def save(self, *args, **kwargs):
+        self.search_document = build_search_document(getattr(self, field) for field in SEARCH_FIELDS)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(SEARCH_FIELDS):
+            kwargs['update_fields'] = {*update_fields, 'search_document'}
+        super().save(*args, **kwargs)
+
+
+class KycDocument(models.Model):
+    """
+    An identity document image, stored once per distinct upload and shared by
+    every booking that references it (core.services.kyc_service).
+    """
+    AADHAAR_FRONT = 'aadhaar_front'
+    AADHAAR_BACK = 'aadhaar_back'
+    KIND_CHOICES = [
+        (AADHAAR_FRONT, 'Aadhaar front'),
+        (AADHAAR_BACK, 'Aadhaar back'),
+    ]
+
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='kyc_documents')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # SHA-256 of the bytes as uploaded; the stored file is kyc/<aa>/<sha256>.<ext>
+    sha256 = models.CharField(max_length=64)
+    file = models.ImageField(upload_to='kyc/')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('student', 'kind', 'sha256')
+
+    def __str__(self):
+        return f"{self.student.username} {self.kind} {self.sha256[:12]}"
@@ -44,6 +44,7 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 
 class UserSerializer(serializers.ModelSerializer):
     profile_photo = serializers.SerializerMethodField()
+    profile_photo_derivatives = serializers.SerializerMethodField()
     status = serializers.SerializerMethodField()
     hostel_invoice_expired = serializers.SerializerMethodField()
     hostel_invoice_paid = serializers.SerializerMethodField()
@@ -55,7 +56,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'username', 'first_name', 'middle_name', 'last_name',
             'phone_number', 'address', 'education', 'email', 'role',
-            'profile_photo', 'status',
+            'profile_photo', 'profile_photo_derivatives', 'status',
             'hostel_invoice_expired', 'hostel_invoice_paid',
             'library_invoice_expired', 'library_invoice_paid',
         ]
@@ -66,25 +67,38 @@ class UserSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.profile_photo.url)
         return None
 
+    def get_profile_photo_derivatives(self, obj):
+        from core.utils.image_utils import derivative_urls
+
+        return derivative_urls(obj, 'profile_photo', self.context.get('request'))
+
     def get_status(self, obj):
         return "Active" if obj.is_active else "Inactive"
 
     def get_hostel_invoice_expired(self, obj):
+        if hasattr(obj, 'latest_hostel_invoice_expired'):  # annotated by student_service.enrich()
+            return obj.latest_hostel_invoice_expired
         from hostel.models import HostelMonthlyInvoice
         last_invoice = HostelMonthlyInvoice.objects.filter(booking__student=obj).order_by('-month').first()
         return last_invoice.invoice_expired if last_invoice else None
 
     def get_hostel_invoice_paid(self, obj):
+        if hasattr(obj, 'latest_hostel_invoice_paid'):  # annotated by student_service.enrich()
+            return obj.latest_hostel_invoice_paid
         from hostel.models import HostelMonthlyInvoice
         last_invoice = HostelMonthlyInvoice.objects.filter(booking__student=obj).order_by('-month').first()
         return last_invoice.is_paid if last_invoice else None
 
     def get_library_invoice_expired(self, obj):
+        if hasattr(obj, 'latest_library_invoice_expired'):  # annotated by student_service.enrich()
+            return obj.latest_library_invoice_expired
         from library.models import LibraryMonthlyInvoice
         last_invoice = LibraryMonthlyInvoice.objects.filter(booking__student=obj).order_by('-month').first()
         return last_invoice.invoice_expired if last_invoice else None
 
     def get_library_invoice_paid(self, obj):
+        if hasattr(obj, 'latest_library_invoice_paid'):  # annotated by student_service.enrich()
+            return obj.latest_library_invoice_paid
         from library.models import LibraryMonthlyInvoice
         last_invoice = LibraryMonthlyInvoice.objects.filter(booking__student=obj).order_by('-month').first()
         return last_invoice.is_paid if last_invoice else None
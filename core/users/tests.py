@@ -1,3 +1,120 @@
-from django.test import TestCase
+import tempfile
+from datetime import date
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from hostel.models import HostelBed, HostelBooking, HostelMonthlyInvoice, HostelRoom
+from library.models import LibraryBooking, LibraryMonthlyInvoice, LibrarySeat
+from users.models import User
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class StudentListTests(TestCase):
+    url = '/api/users/students/'
+
+    def setUp(self):
+        room = HostelRoom.objects.create(room_number='101', capacity=30)
+        photos = dict(aadhaar_front_photo=SimpleUploadedFile('front.jpg', b'x'),
+                      aadhaar_back_photo=SimpleUploadedFile('back.jpg', b'x'))
+        self.students = []
+        for i in range(12):
+            student = User.objects.create_user(username=f'student{i}', password='pass', role='student')
+            booking = HostelBooking.objects.create(student=student, status='approved', start_date=date.today(),
+                                                   bed=HostelBed.objects.create(room=room, bed_number=str(i)),
+                                                   **photos)
+            HostelMonthlyInvoice.objects.create(booking=booking, invoice_id=f'H{i}', month=date(2025, 1, 1),
+                                                amount=1500, total=1500, is_paid=True)
+            HostelMonthlyInvoice.objects.create(booking=booking, invoice_id=f'H{i}-2', month=date(2025, 2, 1),
+                                                amount=1500, total=1500, is_paid=i % 2 == 0)
+            self.students.append(student)
+        seat_booking = LibraryBooking.objects.create(student=self.students[0], status='pending',
+                                                     seat=LibrarySeat.objects.create(seat_number='A1'),
+                                                     start_date=date.today(), **photos)
+        LibraryMonthlyInvoice.objects.create(booking=seat_booking, invoice_id='L0', month=date(2025, 1, 1),
+                                             amount=600, total=600, invoice_expired=True)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='pass', role='admin'))
+
+    def test_full_list_is_one_query_per_page(self):
+        with self.settings(STUDENT_LIST_PAGE_SIZE=5), self.assertNumQueries(3):
+            response = self.client.get(self.url)
+
+        self.assertEqual(len(response.data), 12)
+        first, second = response.data[0], response.data[1]
+        self.assertEqual(first['hostel_booking_id'], HostelBooking.objects.get(student=self.students[0]).id)
+        self.assertEqual((first['hostel_invoice_paid'], second['hostel_invoice_paid']), (True, False))
+        self.assertEqual((first['library_invoice_expired'], second['library_invoice_expired']), (True, None))
+        self.assertIsNotNone(first['library_booking_id'])
+        self.assertIsNone(second['library_booking_id'])
+
+    def test_keyset_pages_walk_the_list(self):
+        seen, after = [], None
+        while True:
+            params = {'page_size': 5, **({'after': after} if after else {})}
+            with self.assertNumQueries(1):
+                response = self.client.get(self.url, params)
+            seen += [row['username'] for row in response.data['results']]
+            after = response.data['next_after']
+            if not response.data['has_more']:
+                break
+
+        self.assertEqual(seen, [student.username for student in self.students])
+        self.assertIsNone(after)
+
+    def test_invalid_page_size_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'page_size': 'lots'}).status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class StudentSearchTests(TestCase):
+    def setUp(self):
+        self.asha = User.objects.create_user(username='asha', password='pass', role='student', first_name='Asha',
+                                             last_name='Verma', email='asha@example.com', phone_number='9876500001')
+        self.rahul = User.objects.create_user(username='rahul.k', password='pass', role='student', first_name='Rahul',
+                                              last_name='Kashyap', email='rk@example.com', education='B.Sc')
+        self.prakash = User.objects.create_user(username='pkumar', password='pass', role='student',
+                                                first_name='Prakash', last_name='Rahulan', email='pk@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='pass', role='admin'))
+
+    def search(self, term, **params):
+        return self.client.get('/api/users/students/', {'search': term, **params}).data
+
+    def test_document_follows_profile_changes(self):
+        self.assertEqual(self.asha.search_document, ' asha verma asha asha@example.com 9876500001 na')
+        self.asha.last_name = 'Singh'
+        self.asha.save(update_fields=['last_name'])
+        self.asha.refresh_from_db()
+        self.assertIn(' singh', self.asha.search_document)
+
+    def test_results_are_ranked(self):
+        self.assertEqual([row['username'] for row in self.search('rahul')], ['rahul.k', 'pkumar'])
+        self.assertEqual([row['username'] for row in self.search('asha verma')], ['asha'])
+        self.assertEqual([row['username'] for row in self.search('765')], ['asha'])  # infix still matches
+        self.assertEqual([row['username'] for row in self.search(str(self.prakash.id))][0], 'pkumar')
+
+    def test_ranked_results_page_with_a_cursor(self):
+        first = self.search('rahul', page_size=1)
+        self.assertEqual([row['username'] for row in first['results']], ['rahul.k'])
+        second = self.search('rahul', page_size=1, after=first['next_after'])
+        self.assertEqual([row['username'] for row in second['results']], ['pkumar'])
+        self.assertFalse(second['has_more'])
+
+    def test_admin_invoice_search_uses_the_student_document(self):
+        room = HostelRoom.objects.create(room_number='101', capacity=10)
+        for i, student in enumerate([self.asha, self.rahul]):
+            booking = HostelBooking.objects.create(
+                student=student, status='approved', start_date=date.today(),
+                bed=HostelBed.objects.create(room=room, bed_number=str(i)),
+                aadhaar_front_photo=SimpleUploadedFile('front.jpg', b'x'),
+                aadhaar_back_photo=SimpleUploadedFile('back.jpg', b'x'),
+            )
+            HostelMonthlyInvoice.objects.create(booking=booking, invoice_id=f'H{i}', month=date(2025, 1, 1),
+                                                amount=1500, total=1500)
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='pass', is_staff=True))
+
+        response = self.client.get('/api/hostel/admin/hostel-invoices/', {'search': 'kash'})
+        self.assertEqual([row['invoice_id'] for row in response.data], ['H1'])
@@ -15,6 +15,7 @@ from django.contrib.auth import get_user_model
 from .serializers import UserSerializer
 from hostel.models import HostelBooking
 from library.models import LibraryBooking
+from core.services import search_service, student_service
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view, permission_classes,parser_classes
 from django.views.decorators.csrf import ensure_csrf_cookie
@@ -142,6 +143,8 @@ class SetNewPasswordView(APIView):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_logged_in_user(request):
+    from core.utils.image_utils import derivative_urls
+
     user = request.user
     serializer = UserSerializer(user, context={'request': request})
     user_data = serializer.data
@@ -149,6 +152,8 @@ def get_logged_in_user(request):
     # Aadhaar defaults
     aadhaar_front_photo = None
     aadhaar_back_photo = None
+    aadhaar_front_booking = None
+    aadhaar_back_booking = None
 
     # Hostel Booking
     hostel_booking = HostelBooking.objects.filter(student=user, status__in=['approved', 'pending']).last()
@@ -159,8 +164,10 @@ def get_logged_in_user(request):
         user_data['hostel_booking_status'] = hostel_booking.status
 
         if hostel_booking.aadhaar_front_photo:
+            aadhaar_front_booking = hostel_booking
             aadhaar_front_photo = request.build_absolute_uri(hostel_booking.aadhaar_front_photo.url)
         if hostel_booking.aadhaar_back_photo:
+            aadhaar_back_booking = hostel_booking
             aadhaar_back_photo = request.build_absolute_uri(hostel_booking.aadhaar_back_photo.url)
     else:
         user_data['hostel_booking_id'] = None
@@ -174,8 +181,10 @@ def get_logged_in_user(request):
         user_data['library_booking_status'] = library_booking.status
 
         if not aadhaar_front_photo and library_booking.aadhaar_front_photo:
+            aadhaar_front_booking = library_booking
             aadhaar_front_photo = request.build_absolute_uri(library_booking.aadhaar_front_photo.url)
         if not aadhaar_back_photo and library_booking.aadhaar_back_photo:
+            aadhaar_back_booking = library_booking
             aadhaar_back_photo = request.build_absolute_uri(library_booking.aadhaar_back_photo.url)
     else:
         user_data['library_booking_id'] = None
@@ -184,6 +193,10 @@ def get_logged_in_user(request):
     # Attach Aadhaar to response
     user_data['aadhaar_front_photo'] = aadhaar_front_photo
     user_data['aadhaar_back_photo'] = aadhaar_back_photo
+    user_data['aadhaar_front_photo_derivatives'] = derivative_urls(aadhaar_front_booking, 'aadhaar_front_photo',
+                                                                   request)
+    user_data['aadhaar_back_photo_derivatives'] = derivative_urls(aadhaar_back_booking, 'aadhaar_back_photo',
+                                                                  request)
 
     return Response(user_data)
 
@@ -273,14 +286,15 @@ def activate_user_by_id(request, user_id):
 
 
 from rest_framework import filters
-from django.db.models import Q
 
 @swagger_auto_schema(
     method='get',
     operation_description="Admin can get list of all student users (supports search and status filter)",
     manual_parameters=[
-        openapi.Parameter('search', openapi.IN_QUERY, description="Search by ID, name, phone, email, education", type=openapi.TYPE_STRING),
-        openapi.Parameter('status', openapi.IN_QUERY, description="Filter by status: active or inactive", type=openapi.TYPE_STRING)
+        openapi.Parameter('search', openapi.IN_QUERY, description="Search by ID, name, phone, email, education (best matches first)", type=openapi.TYPE_STRING),
+        openapi.Parameter('status', openapi.IN_QUERY, description="Filter by status: active or inactive", type=openapi.TYPE_STRING),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="Keyset page size (max 1000); returns a paged response", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('after', openapi.IN_QUERY, description="Cursor: next_after of the previous page", type=openapi.TYPE_STRING)
     ],
     responses={200: UserSerializer(many=True)}
 )
@@ -301,43 +315,26 @@ def list_all_students(request):
         students = students.filter(is_active=False)
 
     if search:
-        try:
-            search_id = int(search)
-            students = students.filter(
-                Q(id=search_id) |
-                Q(first_name__icontains=search) |
-                Q(middle_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(username__icontains=search) |
-                Q(email__icontains=search) |
-                Q(phone_number__icontains=search) |
-                Q(education__icontains=search)
-            )
-        except ValueError:
-            students = students.filter(
-                Q(first_name__icontains=search) |
-                Q(middle_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(username__icontains=search) |
-                Q(email__icontains=search) |
-                Q(phone_number__icontains=search) |
-                Q(education__icontains=search)
-            )
-
-    data = []
-    for student in students:
-        user_data = UserSerializer(student, context={'request': request}).data
-
-        # Hostel Booking ID
-        hostel_booking = HostelBooking.objects.filter(student=student, status__in=['approved', 'pending']).last()
-        user_data['hostel_booking_id'] = hostel_booking.id if hostel_booking else None
-
-        # Library Booking ID
-        library_booking = LibraryBooking.objects.filter(student=student, status__in=['approved', 'pending']).last()
-        user_data['library_booking_id'] = library_booking.id if library_booking else None
+        students = search_service.search(students, search)
 
-        data.append(user_data)
+    try:
+        page_size = student_service.page_size_from(request.query_params.get('page_size'))
+        after = student_service.parse_cursor(request.query_params.get('after'))
+    except ValueError:
+        return Response({'error': 'Invalid page_size or after.'}, status=400)
+
+    # Keyset pagination: ?after=<next_after of the previous page>
+    if 'after' in request.query_params or 'page_size' in request.query_params:
+        page, has_more = student_service.keyset_page(students, page_size, after)
+        return Response({
+            'results': student_service.serialize_page(page, request),
+            'next_after': student_service.cursor_for(students, page[-1]) if has_more else None,
+            'has_more': has_more,
+        })
 
+    data = []
+    for page in student_service.keyset_pages(students, page_size):
+        data.extend(student_service.serialize_page(page, request))
     return Response(data)
 
 